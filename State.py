@@ -1,6 +1,7 @@
 from __future__ import print_function
 import os.path
 import utils
+import grid
 import numpy as np
 import pickle
 import copy
@@ -22,17 +23,28 @@ class StaffMember:
     SEMESTER_AS_AI_INDEX = 4
     WEEKLY_OH_HOURS_INDEX = 5
     PREFERRED_CONTIGUOUS_HOURS_INDEX = 6
-    AVAILABILITIES_INDICES = range(7, 67) # 5 * 12 slots
+    AVAILABILITIES_START_INDEX = 7 # followed by one column per slot of the time grid
 
-    def __init__(self, data_row, weeks_left):
+    @staticmethod
+    def availabilities_indices(time_grid=grid.DEFAULT_GRID):
+        """
+        Args:
+            time_grid (grid.TimeGrid, optional): grid of the availabilities form. Defaults to grid.DEFAULT_GRID.
+
+        Returns:
+            range: indices of the availabilities in a row of the availabilities spreadsheet, one per slot
+        """
+        return range(StaffMember.AVAILABILITIES_START_INDEX, StaffMember.AVAILABILITIES_START_INDEX + time_grid.size)
+
+    def __init__(self, data_row, weeks_left, time_grid=grid.DEFAULT_GRID):
         """Initializes a new StaffMember object.
 
         Instance Attributes:
             email (string): The email address of the course staff member.
             weekly_oh_hours (int): The number of office hours the course staff member is expected to work per week.
             preferred_contiguous_hours (int): The number of contiguous hours the course staff member prefers to work.
-            availabilities (np.array): A 5x12 np array of the course staff member's availabilities.
-            assigned_hours (np.array): A 5x12 np array of the course staff member's
+            availabilities (np.array): A (# of days, # of slots per day) np array of the course staff member's availabilities.
+            assigned_hours (np.array): A (# of days, # of slots per day) np array of the course staff member's
             assigned hours. Assigned only after the algorithm is run. 
             staff member this semester.
 
@@ -48,14 +60,15 @@ class StaffMember:
             The indices of the row that correspond to the availabilities,
             preferred hours, appointed hours, etc. are specified as class variables.
             weeks_left (int): The number of weeks left in the semester, INCLUDING the week this state is made for.
+            time_grid (grid.TimeGrid, optional): grid of the availabilities form. Defaults to grid.DEFAULT_GRID.
         """
         self.email = data_row[StaffMember.EMAIL_ADDRESS_INDEX]
         self.weekly_oh_hours = int(data_row[StaffMember.WEEKLY_OH_HOURS_INDEX])
         self.preferred_contiguous_hours = int(data_row[StaffMember.PREFERRED_CONTIGUOUS_HOURS_INDEX])
 
         # Extract number from availabilities list and reshape
-        availabilities_list = [data_row[i] for i in StaffMember.AVAILABILITIES_INDICES]
-        self.availabilities = utils.create_5x12_np_array(availabilities_list)
+        availabilities_list = [data_row[i] for i in StaffMember.availabilities_indices(time_grid)]
+        self.availabilities = utils.create_grid_np_array(availabilities_list, time_grid)
 
         # To be filled by the algorithm after it's done running
         self.assigned_hours = None
@@ -67,12 +80,13 @@ class StaffMember:
         self.semesters_on_staff = int(data_row[StaffMember.SEMESTERS_ON_STAFF_INDEX])
         self.semesters_as_ai = int(data_row[StaffMember.SEMESTER_AS_AI_INDEX])
 
-    def update(self, data_row, weeks_left):
+    def update(self, data_row, weeks_left, time_grid=grid.DEFAULT_GRID):
         """Updates the information for a course staff.
 
         Args:
             new_row (list): A row from the availabilities spreadsheet.
             weeks_left (int): The number of weeks left in the semester, INCLUDING the week this state is made for.
+            time_grid (grid.TimeGrid, optional): grid of the availabilities form. Defaults to grid.DEFAULT_GRID.
         """
         if data_row[StaffMember.EMAIL_ADDRESS_INDEX] != self.email:
             raise Exception("Email addresses do not match")
@@ -93,23 +107,24 @@ class StaffMember:
                 self.hours_left += self.oh_hours_adjustments
 
         # Reshape availabilities list
-        availabilities_list = [data_row[i] for i in StaffMember.AVAILABILITIES_INDICES]
-        self.availabilities = utils.create_5x12_np_array(availabilities_list)
+        availabilities_list = [data_row[i] for i in StaffMember.availabilities_indices(time_grid)]
+        self.availabilities = utils.create_grid_np_array(availabilities_list, time_grid)
 
-    def set_assignment(self, assignment):
+    def set_assignment(self, assignment, slots_per_hour=1):
         """
-        Given an np_array of size 5x12, representing the assignment for this
+        Given an np_array of shape (# of days, # of slots per day), representing the assignment for this
         week, sets the assignment for this StaffMember and decreases their
         remaining hours. This should be run once per state after the algorithm
         is finished running.
 
         Args:
-            assignment (np.array): 5x12 np array representing this staff's assignment for the week.
+            assignment (np.array): (# of days, # of slots per day) np array representing this staff's assignment for the week.
+            slots_per_hour (int, optional): # of slots in an hour on the assignment's grid. Defaults to 1.
         """
         # if not self.assigned_hours is None:
         #     raise Exception("Assigned hours already set.")
         self.assigned_hours = assignment
-        self.hours_left -= np.sum(assignment)
+        self.hours_left -= np.sum(assignment) / slots_per_hour
     
     def adjust_oh_hours(self, adjustment):
         """
@@ -171,18 +186,21 @@ class State:
     e.g. the upcoming week for which the algorithm is run for.
     """
     
-    def __init__(self, prev, oh_demand, availabilities, class_name, semester, total_weeks, max_weekly_multiplier, weeks_skipped):
+    def __init__(self, prev, oh_demand, availabilities, class_name, semester, total_weeks, max_weekly_multiplier, weeks_skipped,
+                 time_grid=grid.DEFAULT_GRID):
         """Initializes a new state object
 
         Args:
             prev (string, optional): location to the previous serialized State structure (None if this is the first week). Defaults to None.
-            oh_demand (np array): (total weeks - weeks_skipped)x5x12 np array representing the demand for office hours for all weeks.
+            oh_demand (np array): (total weeks - weeks_skipped, # of days, # of slots per day) np array representing the demand for office hours for all weeks.
             availabilities_sheet (string): 
             intermediate_folder (string): 
             class_name (_type_): _description_
             semester (_type_): _description_
             total_weeks (_type_): _description_
             max_weekly_multiplier (_type_): _description_
+            time_grid (grid.TimeGrid, optional): grid of the availabilities form and demand sheet this week. Previous
+            states may be on other grids. Defaults to grid.DEFAULT_GRID.
 
         Instance Variables:
             prev_state (state): List of all previous State objects.
@@ -190,9 +208,9 @@ class State:
             weeks_remaining (int): The number of weeks remaining in the semester, including this week.
             state_df (pd.DataFrame): Dataframe with the following columns:
                 - Email address
-                - Availability (Np array of shape (5, 12))
+                - Availability (Np array of shape (# of days, # of slots per day))
                 - # of allotted hours remaining
-                - this_weeks_assignments (Np array of shape (# of staff, 5, 12) representing the assignments for this week)
+                - this_weeks_assignments (Np array of shape (# of staff, # of days, # of slots per day) representing the assignments for this week)
                     If assignments haven't been calculated yet, this will be None.
             non_day_ones (list): Email addresses of staff members who were not originally added to the algorithm for the first week.
             rows_parsed (int): The number of rows from the availabilities sheet values visited so far.
@@ -200,6 +218,8 @@ class State:
         Returns:
             state: state object with pertinent information filled in
         """
+        self.grid = time_grid
+
         # If prev is None, this is the first state object.
         if not prev:
             self.prev_state = None
@@ -252,12 +272,12 @@ class State:
 
             # If the email address is not in mappings, create a new student, mappings, and add to list
             if email not in self.course_staff_dict:
-                staff = StaffMember(student_list, weeks_remaining)
+                staff = StaffMember(student_list, weeks_remaining, self.grid)
                 self.course_staff_dict[email] = staff
                 self.bi_mappings[email] = len(self.course_staff_dict) - 1
             else:
                 # Update the corresponding student.
-                self.course_staff_dict[email].update(student_list, weeks_remaining)
+                self.course_staff_dict[email].update(student_list, weeks_remaining, self.grid)
 
             self.rows_parsed += 1 # TODO: not used, kept for history
     
@@ -265,7 +285,7 @@ class State:
         """Sets the assignments for this week, decreases the hours left for each staff member.
 
         Args:
-            assignments (np.array): Np array of shape (# of staff, 5, 12) representing the assignments for this week.
+            assignments (np.array): Np array of shape (# of staff, # of days, # of slots per day) representing the assignments for this week.
             Each row's index should match up with bi_mappings for which staff member it refers to
         """
         if assignments.shape[0] != len(self.course_staff_dict):
@@ -274,14 +294,14 @@ class State:
         for i in range(len(assignments)):
             assignment = assignments[i]
             staff_email = self.bi_mappings.inverse[i]
-            self.course_staff_dict[staff_email].set_assignment(assignment)
+            self.course_staff_dict[staff_email].set_assignment(assignment, self.grid.slots_per_hour)
 
     def get_day_one_assignments(self):
         """Returns all past assignments of day one staff members
 
         Returns:
-            np.array: Np array of shape (# of day one staff, # of previous weeks, 5, 12)
-                        representing the assignments for each previous week.
+            np.array: Np array of shape (# of day one staff, # of previous weeks, # of days, # of slots per day)
+                        representing the assignments for each previous week, laid out on this state's grid.
         """
         results = []
         current = self.prev_state
@@ -298,13 +318,14 @@ class State:
                 staff = current.course_staff_dict[staff_email]
 
                 assignments.append(staff.assigned_hours)
-            results.append(np.stack(np.array(assignments), axis=0))
+            # States saved before grids were configurable are on the default grid
+            results.append(grid.regrid(np.stack(np.array(assignments), axis=0), getattr(current, "grid", grid.DEFAULT_GRID), self.grid))
             current = current.prev_state
         results = np.array(results)
         if len(results) > 1:
             results = np.stack(np.array(results), axis=0)
-        if results.shape != (self.week_num - self.weeks_skipped - 1, self.day_ones, 5, 12):
-            raise ValueError("results shape does not match up with expected shape. {} != {}".format(results.shape, (self.week_num - self.weeks_skipped - 1, self.day_ones, 5, 12)))
+        if results.shape != (self.week_num - self.weeks_skipped - 1, self.day_ones, *self.grid.shape):
+            raise ValueError("results shape does not match up with expected shape. {} != {}".format(results.shape, (self.week_num - self.weeks_skipped - 1, self.day_ones, *self.grid.shape)))
         
         return np.swapaxes(results, 0, 1)
 
@@ -319,17 +340,19 @@ class State:
         """
         Returns:
             list: list of all inputs required for the algorithm:
-                - OH demand np array (np_array [# future weeks, 5, 12]):
+                - OH demand np array (np_array [# future weeks, # of days, # of slots per day]):
                     - Most up-to-date version of the OH demand spreadsheet output for all weeks in the future INCLUDING the week this state is made for.
-                - Prev_assignments: (np_array[# of day one staff, # of past states, 5, 12]):
-                - Availabilities (np_array[# all staff, 5, 12]):
+                - Prev_assignments: (np_array[# of day one staff, # of past states, # of days, # of slots per day]):
+                - Availabilities (np_array[# all staff, # of days, # of slots per day]):
                 - Max_contiguous_hours (np_array[# all staff]):
                 - Target_total_future_hours (np_array[# all staff]):
                 - weekly_target_hours (np_array[# all staff])
                 - preferred_contiguous_hours(np_array[# all staff]): 
                 - changed_hours_weightings(np_array[# of day one staff]):
                 - Non_day_one_indices:(np_array[# of non-day-one staff])
+            Hours (and contiguous hours) are given in slots of this state's grid, which is what the algorithm counts in.
         """
+        slots_per_hour = self.grid.slots_per_hour
 
         future_oh_demand = self.oh_demand.take(list(range(self.week_num - 1, self.week_num + self.weeks_remaining - 1)), axis=0)
 
@@ -352,9 +375,9 @@ class State:
 
         for email in self.bi_mappings:
             index = self.bi_mappings[email]
-            max_contiguous_hours[index] = self.course_staff_dict[email].weekly_oh_hours * self.max_weekly_multiplier
-            preferred_contiguous_hours[index] = self.course_staff_dict[email].preferred_contiguous_hours
-            weekly_target_hours[index] = self.course_staff_dict[email].weekly_oh_hours
+            max_contiguous_hours[index] = self.course_staff_dict[email].weekly_oh_hours * self.max_weekly_multiplier * slots_per_hour
+            preferred_contiguous_hours[index] = self.course_staff_dict[email].preferred_contiguous_hours * slots_per_hour
+            weekly_target_hours[index] = self.course_staff_dict[email].weekly_oh_hours * slots_per_hour
 
         if len(self.course_staff_dict) > 1:
             max_contiguous_hours = np.stack(max_contiguous_hours)
@@ -373,13 +396,15 @@ class State:
         target_total_future_hours = np.array([None] * len(self.course_staff_dict))
         for email in self.course_staff_dict:
             index = self.bi_mappings[email]
-            target_total_future_hours[index] = self.course_staff_dict[email].hours_left
+            target_total_future_hours[index] = self.course_staff_dict[email].hours_left * slots_per_hour
         
         if self.prev_state:
             changed_hours_weightings = np.array([None] * self.day_ones)
             for i in range(self.day_ones):
                 email = self.bi_mappings.inverse[i]
-                changed_hours_weightings[i] = self.course_staff_dict[email].calculate_availabilities_difference(self.prev_state.course_staff_dict[email].availabilities)
+                prev_availabilities = grid.regrid(self.prev_state.course_staff_dict[email].availabilities,
+                                                  getattr(self.prev_state, "grid", grid.DEFAULT_GRID), self.grid, fill=5)
+                changed_hours_weightings[i] = self.course_staff_dict[email].calculate_availabilities_difference(prev_availabilities)
             if len(changed_hours_weightings) > 1:
                 changed_hours_weightings = np.stack(changed_hours_weightings)
         else:
@@ -428,7 +453,7 @@ class State:
         object_name = '{}/{}.pkl'.format(prefix, self.week_num)
 
         # Initialize a Google Cloud Storage client
-        storage_client = storage.Client(project=project_id)
+        storage_client = utils.storage_client(project_id)
         bucket = storage_client.get_bucket(bucket_name)
 
         try:
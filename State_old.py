@@ -55,7 +55,7 @@ class StaffMember:
 
         # Extract number from availabilities list and reshape
         availabilities_list = [data_row[i] for i in StaffMember.AVAILABILITIES_INDICES]
-        self.availabilities = utils.create_5x12_np_array(availabilities_list)
+        self.availabilities = utils.create_grid_np_array(availabilities_list)
 
         # To be filled by the algorithm after it's done running
         self.assigned_hours = None
@@ -87,7 +87,7 @@ class StaffMember:
 
         # Reshape availabilities list
         availabilities_list = [data_row[i] for i in StaffMember.AVAILABILITIES_INDICES]
-        self.availabilities = utils.create_5x12_np_array(availabilities_list)
+        self.availabilities = utils.create_grid_np_array(availabilities_list)
 
     def set_assignment(self, assignment):
         """
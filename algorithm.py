@@ -1,7 +1,14 @@
 from cvxpy import *
 import numpy as np
 import cvxpy as cp
+import scipy.sparse as sp
 from time import perf_counter
+from collections import OrderedDict
+import hashlib
+import json
+import cvxpy.lin_ops.lin_utils as lu
+import problem_cache
+import solvers
 
 # Defining weights
 U_3_1 = 400
@@ -9,208 +16,953 @@ U_3_2 = 50
 U_3_3 = 700
 U_3_4 = 50
 U_3_5 = 100
+U_3_6 = 25
 
 # Weight fxn used in term 3.5 (consistent weekly hours)
-lambda_func = lambda x: np.exp(-0.2 * x)
+DECAY_RATE = 0.2
+lambda_func = lambda x: np.exp(-DECAY_RATE * x)
 
 # Mapping between rating and displeasure used in term 3.4 (minimize displeasure)
-RATE_TO_DISPLEASURE_MAPPING = {1: 0, 2: 2, 3: 8, 4: 16, 5: 1e8}
+RATE_TO_DISPLEASURE_MAPPING = {1: 0, 2: 2, 3: 8, 4: 16}
 
+# Names of the module-level weights above, which objective_weights reads
+WEIGHT_NAMES = ("U_3_1", "U_3_2", "U_3_3", "U_3_4", "U_3_5", "U_3_6", "DECAY_RATE")
 
+# Rating of a slot a staff member is unavailable for. Those slots get no variables (2.6), so they have no displeasure.
+UNAVAILABLE_RATING = 5
 
-def var_to_np(decision_var):
-    """Converts decision variable (np array of cp.Variable objects) into np array of integers
+# Version of the model ScheduleTemplate builds. Bump it whenever its variables, constraints or objective change, so that
+# templates and schedules cached on disk by an older version aren't reused (see problem_cache)
+FORMULATION_VERSION = 2
+
+# Number of problem templates kept in memory for reuse (see get_template)
+TEMPLATE_CACHE_SIZE = 8
+
+# Where each run's metrics are saved, next to assignments.npy (see save_metrics)
+METRICS_PATH = "metrics.json"
+
+
+
+def selection_matrix(indices, num_variables):
+    """Builds the sparse 0/1 matrix S such that (S @ A)[r] = A[indices[r]].
 
     Args:
-        decision_var (np.ndarray): np array of cp.Variable objects
+        indices (np.ndarray): (# of rows, ) index of the variable each row picks out, or -1 for a row of zeros
+        num_variables (int): length of the variable vector A
 
     Returns:
-        np.ndarray of decision variable results
-    """
-    get_value = lambda var: var.value
-    vfunc = np.vectorize(get_value)
-    return vfunc(decision_var)
-
-def run_algorithm(inputs):
-    input_oh_demand = inputs[0]                         # (# of future weeks, 5, 12)
-    input_previous_weeks_assignments = inputs[1]        # (# of day one staff, # of past weeks, 5, 12)
-    input_staff_availabilities = inputs[2]              # (# of all staff, 5, 12)
-    input_max_contig = inputs[3]                        # (# of all staff, )
-    input_target_total_future_hours = inputs[4]         # (# of all staff, )
-    input_target_weekly_hours = inputs[5]               # (# of all staff, )
-    input_preferred_contiguous_hours = inputs[6]        # (# of all staff, )
-    input_changed_hours_weightings = inputs[7]          # (# of day one staff, )
-    input_non_day_one_indices = inputs[8]               # (# of non day one staff, )
-
-    print(input_previous_weeks_assignments.shape)
-    m = input_max_contig.shape[0]
-    m_non_day_ones = input_non_day_one_indices.shape[0] # WARNING: assumes non-day one staff are 
-                                                        # added to the end of each prev_assignments array
-    m_day_ones = m - m_non_day_ones
-
-    n = input_oh_demand.shape[0]
-    
-    try:
-        p = input_previous_weeks_assignments.shape[1] # TODO: change later, but we probably don't want to perform look-behind for all prev weeks, fixed look behind sliding window keeps computational complexity down with minimal resulting tradeoff
-    except IndexError as e:
-        p = None
-        print("No previous weeks. Removing past consistency constraint.")
+        sp.csr_matrix: (# of rows, num_variables) selection matrix
+    """
+    rows = np.flatnonzero(indices >= 0)
+    return sp.csr_matrix((np.ones(rows.size), (rows, indices[rows])), shape=(indices.size, num_variables))
 
-    print("Setting up algorithm...")
-    # Define the decision variable
-    A = np.empty(shape = (m, n, 5, 12), dtype = object)
-    for i in range(m):
-        for j in range(n):
-            for k in range(5):
-                for l in range(12):
-                    A[i, j, k, l] = cp.Variable(boolean=True)
-                    
-    # ---------------- Hard Constraints (CP constraints) ----------------
-    constraints = []
-
-    # 2.1: Staff time slot existence (At least 1 staff member per NONZERO time slot)
-    X_2_1 = np.sum(A, axis = 0)
-
-    for week_i in range(n):
-        for day_i in range(5):
-            for hour_i in range(12):
-                if input_oh_demand[week_i, day_i, hour_i] != 0:
-                    constraints.append(X_2_1[week_i, day_i, hour_i] >= 1)
-
-    # 2.2: Maximum Contiguous Hours (TODO: OFF FOR NOW)
-    # for staff_i in range(m):
-    #     for week_i in range(n):
-    #         for day_i in range(5):
-    #             window_size = (input_max_contig[staff_i] + 1)
-    #             for start in range(12 - window_size + 1):
-    #                 total = 0
-    #                 for i in range(window_size):
-    #                     total += A[staff_i, week_i, day_i, start + i]
-    #                 constraints.append(total <= input_max_contig[staff_i])
-
-    # 2.3 (TESTING) no timeslot should have > 3 number of absences
-    X_2_3 = np.sum(A, axis=0)
-
-    for week_i in range(n):
-        for day_i in range(5):
-            for hour_i in range(12):
-                constraints.append(input_oh_demand[week_i, day_i, hour_i] - X_2_3[week_i, day_i, hour_i] <= 3)
-
-    # 2.4 (TEMP/TESTING) no one should be doing >3+ their target weekly hours
-    X_2_4 = A.sum((2, 3))
-    T = input_target_weekly_hours[:, None].repeat(n, axis=1)
-
-    for staff_i in range(m):
-        for week_i in range(n):
-            constraints.append(X_2_4[staff_i, week_i] - T[staff_i, week_i] <= 1)
-
-    # 2.5 (TEMP/TESTING) no assignments during times of 0 demand
-    X_2_5 = A.sum(0) 
-    for week_i in range(n):
-        for day_i in range(5):
-            for hour_i in range(12):
-                if input_oh_demand[week_i, day_i, hour_i] == 0:
-                    constraints.append(X_2_5[week_i, day_i, hour_i] == 0)
-
-
-    # 2.6 (TEMP/TESTING) ensure no one gets assigned to a slot they are unavailable for TODO
-    
-
-    # ---------------- Soft Constraints (CP objective) ----------------
-
-    # 3.1: Minimize Maximum-Weekly-Hour
-    X = A.sum((2, 3)) # shape: (# of staff, # of remaining weeks)
-    T = input_target_weekly_hours[:, None].repeat(n, axis=1)
-    X_minus_T = X - T
-    T_minus_X = T - X
-
-    # Apply maximum on each variable with 0
-    term_3_1 = 0
-    for staff_i in range(m):
-        for week_i in range(n):
-            term_3_1 += cp.maximum(X_minus_T[staff_i, week_i], 0)
-            term_3_1 += cp.maximum(T_minus_X[staff_i, week_i], 0)
-
-
-    # 3.2 (w/o QC): Minimize Total Future Hour Violations Per Staff
-    X = A.sum((1, 2, 3)) # shape: (num staff, )
-    term_3_2 = 0
-    for staff_i in range(m):
-        term_3_2 += cp.maximum(X[staff_i] - input_target_total_future_hours[staff_i], 0)
-
-    # 3.3 (w/o QC): Minimize Total # of violations where we've assigned too few people in a slot
-    X = A.sum(0)
-
-    term_3_3 = 0
-    for week_i in range(n):
-        for day_i in range(5):
-            for hour_i in range(12):
-                term_3_3 += cp.maximum(input_oh_demand[week_i, day_i, hour_i] - X[week_i, day_i, hour_i], 0)
-                term_3_3 += cp.maximum(X[week_i, day_i, hour_i] - input_oh_demand[week_i, day_i, hour_i], 0)
-
-
-
-    # 3.4: Scheduling Assignment Displeasure
-
-    staff_availabilities_extended = input_staff_availabilities[:, None, :, :].repeat(n, axis=1)
-
-    apply_mapping = np.vectorize(lambda val: RATE_TO_DISPLEASURE_MAPPING[val])
-    mapped_staff_availabilities_extended = apply_mapping(staff_availabilities_extended)
-
-    multiplied = A * mapped_staff_availabilities_extended
-    term_3_4 = np.sum(multiplied)
-
-
-    # 3.5: Consistent Weekly Hours (w/o MIQP)
-    current_week = A[:, 0, :, :] # shape: (# of staff, 5, 12)
-
-    # Assuming input_previous_weeks_assignments[0] is the first week the OH scheduler ran
-    term_3_5 = 0
-    # Match current week with the past
-    if p:
-        prev_weeks_weights = list(reversed(list(map(lambda_func, np.arange(1, p + 1)))))
+def incidence_matrix(groups, num_groups, weights=None):
+    """Builds the sparse 0/1 matrix G such that (G @ A)[g] is the sum of all A[k] with groups[k] == g.
 
-        for prev_i in range(p):
-            
-            for staff_i in range(m_day_ones):
-                # if a staff member doesn't work for a week, then skip them for that week
-                if input_previous_weeks_assignments[staff_i, prev_i].sum() == 0:
-                    continue
+    Args:
+        groups (np.ndarray): (# of variables, ) group each variable belongs to
+        num_groups (int): number of groups
+        weights (np.ndarray, optional): (# of variables, ) weight of each variable in its group's sum. Defaults to None (all 1).
 
-                for day_i in range(5):
-                    for hour_i in range(12):
-                        term_3_5 += cp.maximum(input_previous_weeks_assignments[staff_i, prev_i, day_i, hour_i] - \
-                                            current_week[staff_i, day_i, hour_i], 0) * \
-                                            prev_weeks_weights[prev_i] * \
-                                            (1 - input_changed_hours_weightings[staff_i])
-                                           
+    Returns:
+        sp.csr_matrix: (num_groups, # of variables) incidence matrix
+    """
+    weights = np.ones(groups.size) if weights is None else weights
+    return sp.csr_matrix((weights, (groups, np.arange(groups.size))), shape=(num_groups, groups.size))
 
-    # Match current week with future weeks
-    future_weeks_weights = list(map(lambda_func, np.arange(1, n + 1)))
-    for future_i in range(1, n):
-        
-        for staff_i in range(m_day_ones):
-            for day_i in range(5):
-                for hour_i in range(12):
-                    term_3_5 += cp.maximum(current_week[staff_i, day_i, hour_i] - A[staff_i, future_i, day_i, hour_i], 0) * future_weeks_weights[future_i]
+def objective_weights(weights=None):
+    """
+    Args:
+        weights (dict, optional): value of some of the weights in WEIGHT_NAMES. Defaults to None.
 
+    Returns:
+        dict: value of every weight in WEIGHT_NAMES: the given ones, and the module-level ones for the rest
+    """
+    return {**{name: globals()[name] for name in WEIGHT_NAMES}, **(weights or {})}
 
-    obj = cp.Minimize(U_3_1 * term_3_1 + U_3_2 * term_3_2 + U_3_3 * term_3_3 + U_3_4 * term_3_4 + U_3_5 * term_3_5)
+def lap(times, phase, start):
+    """Records the seconds since start as the time of a phase.
 
+    Args:
+        times (dict): phase times to record in
+        phase (string): name of the phase
+        start (float): perf_counter() at the start of the phase
 
-    # Optimization Problem
-    print(f"Number of variables: {m * n * 5 * 12}")
-    print(f"Number of constraints: {len(constraints)}")
+    Returns:
+        float: perf_counter() now, the start of the next phase
+    """
+    now = perf_counter()
+    times[phase] = now - start
+    return now
 
-    print("Running algorithm...")
-    start = perf_counter()
-    prob = Problem(obj, constraints)
-    prob.solve(verbose=False)
-    print(f"Algorithm status: {prob.status}. Objective value: {prob.value}")
-    print(f"Time elapsed: {perf_counter() - start}")
+def print_problem_size(prob, solver=None):
+    """Prints the size of the optimization problem, both as written here and as handed to the solver
+    after cvxpy canonicalization (which adds its own auxiliary variables and rows for every nonlinear atom).
+
+    Args:
+        prob (cp.Problem): problem to report on
+        solver (string, optional): solver to canonicalize for. Defaults to None (cvxpy's choice).
 
-    all_assignments = var_to_np(A)
+    Returns:
+        dict: number of variables (integer and continuous), constraints, and the solver's variables, auxiliary
+        variables (added by canonicalization), constraints and constraint matrix nonzeros
+    """
+    num_variables = sum(var.size for var in prob.variables())
+    num_integer = sum(var.size for var in prob.variables() if var.attributes["boolean"] or var.attributes["integer"])
+    num_constraints = sum(constraint.size for constraint in prob.constraints)
+    print(f"Number of variables: {num_variables} ({num_integer} integer, {num_variables - num_integer} continuous)")
+    print(f"Number of constraints: {num_constraints}")
+
+    data, _, _ = prob.get_problem_data(solver=solver)
+    # Some solvers' data keeps the equality (A) and inequality (G) rows apart
+    matrices = [data[name] for name in ("A", "G") if data.get(name) is not None]
+    solver_variables = data["c"].size
+    solver_constraints = sum(matrix.shape[0] for matrix in matrices)
+    nonzeros = sum(matrix.nnz for matrix in matrices)
+    print(f"Solver problem size: {solver_variables} variables, {solver_constraints} constraints, {nonzeros} nonzeros")
+    return {
+        "variables": num_variables,
+        "integer_variables": num_integer,
+        "constraints": num_constraints,
+        "solver_variables": solver_variables,
+        "auxiliary_variables": solver_variables - num_variables,
+        "solver_constraints": solver_constraints,
+        "nonzeros": nonzeros,
+    }
+
+def shift_previous_solution(previous_solution, m, n, grid_shape):
+    """Turns the assignments saved by last week's run into a starting point for this week's run.
+    Last week's future weeks move up by one week, weeks past its end repeat its last week, and
+    staff members who joined since then start with no assignments.
+
+    Args:
+        previous_solution (np.ndarray): (# of staff last week, # of weeks scheduled last week, # of days, # of slots per day)
+        contents of assignments.npy
+        m (int): number of staff this week
+        n (int): number of weeks scheduled this week
+        grid_shape (tuple): (# of days, # of slots per day) of this week's time grid
+
+    Returns:
+        np.ndarray: (m, n, # of slots per week) starting assignments, or None if previous_solution can't have come
+        from last week's run
+    """
+    previous = np.asarray(previous_solution, dtype=float)
+    if previous.ndim != 4 or previous.shape[0] > m or previous.shape[2:] != tuple(grid_shape) or previous.shape[1] == 0:
+        return None
+
+    shifted = previous[:, 1:] if previous.shape[1] > 1 else previous
+    if shifted.shape[1] < n:
+        shifted = np.concatenate([shifted, shifted[:, -1:].repeat(n - shifted.shape[1], axis=1)], axis=1)
+
+    start = np.zeros((m, n, previous.shape[2] * previous.shape[3]))
+    start[:shifted.shape[0]] = shifted[:, :n].reshape(shifted.shape[0], n, -1)
+    return start
+
+def subset_inputs(inputs, staff):
+    """Restricts the algorithm inputs to some of the staff members, keeping day one staff before the others.
+
+    Args:
+        inputs (list): output of State.get_algo_inputs()
+        staff (np.ndarray): sorted indices of the staff members to keep
+
+    Returns:
+        list: algorithm inputs for just those staff members, in the same order
+    """
+    m = inputs[3].shape[0]
+    m_day_ones = m - inputs[8].shape[0]
+    day_ones = staff[staff < m_day_ones]
+
+    previous = np.asarray(inputs[1])
+    if previous.ndim > 1:
+        previous = previous[day_ones]
+    return [inputs[0],
+            previous,
+            np.asarray(inputs[2])[staff],
+            np.asarray(inputs[3])[staff],
+            np.asarray(inputs[4])[staff],
+            np.asarray(inputs[5])[staff],
+            np.asarray(inputs[6])[staff],
+            np.asarray(inputs[7])[day_ones],
+            np.arange(day_ones.size, staff.size)]
+
+def save_assignments(data, values):
+    """Saves a solution to assignments.npy.
+
+    Args:
+        data (AlgoData): data the solution is for
+        values (np.ndarray): (# of cells, ) 0/1 value of each assignment variable
+
+    Returns:
+        np.ndarray: (# of all staff, # of days, # of slots per day) assignments for the upcoming week
+    """
+    all_assignments = data.to_dense(values)
 
     np.save("assignments.npy", all_assignments)
 
     return all_assignments[:, 0, :, :]
+
+def save_metrics(metrics):
+    """Saves the metrics of a run to METRICS_PATH as JSON.
+
+    Args:
+        metrics (dict): metrics of the run. NumPy scalars are saved as Python numbers.
+    """
+    with open(METRICS_PATH, "w") as f:
+        json.dump(metrics, f, indent=2, default=lambda value: value.item())
+
+class AlgoData:
+    """
+    Inputs of the scheduling problem, as returned by State.get_algo_inputs(), split into the parts that
+    decide the structure of the problem (which variables and slacks exist) and the data that only
+    changes its coefficients.
+    """
+
+    def __init__(self, inputs, horizon_weeks=None, merge_tolerance=None, fixed_coverage=None, relax=False):
+        """Parses the algorithm inputs.
+
+        Instance Attributes:
+            m, m_day_ones, n, p (int): # of staff, # of day one staff, # of scheduled weeks, # of past weeks
+            grid_shape (tuple): (# of days, # of slots per day) of the time grid the inputs are laid out on (see grid.TimeGrid)
+            slots (int): S, the # of slots per week
+            n_tail (int): # of weeks past the horizon (0 when every remaining week is scheduled)
+            week_of (np.array): (# of weeks before merging, ) scheduled week each week was merged into
+            week_representatives (np.array): (n, ) first week merged into each scheduled week
+            week_multiplicity (np.array): (n, ) number of weeks merged into each scheduled week
+            demand (np.array): (n * S, ) OH demand for each scheduled week and slot, averaged over merged weeks
+            coverage (np.array): (n * S, ) number of staff outside the inputs held fixed in each scheduled week and slot,
+            averaged over merged weeks
+            week_demand, week_coverage (np.array): (# of weeks before merging, S) demand and coverage of each week
+            tail_demand (np.array): (n_tail, S) OH demand for each week past the horizon
+            target_weekly_hours, target_total_future_hours (np.array): (m, ) hour targets
+            staff_availabilities (np.array): (m, S) availability ratings
+            max_contig, preferred_contig (np.array): (m, ) maximum and preferred number of consecutive slots
+            previous (np.array): (m_day_ones, p, S) past assignments of day one staff
+            changed_hours_weightings (np.array): (m_day_ones, ) availability change scores
+            cells (np.array): flat (staff, week, slot) indices that get an assignment variable
+            cell_staff, cell_week, cell_slot (np.array): staff, week and slot of each cell
+            cell_index (np.array): (m, n, S) index of each cell's variable, -1 if it was pruned
+            supply (np.array): (n * S, ) number of staff available for each slot
+            past_rows, past_current (np.array): flat (day one staff, past week, slot) indices compared by 3.5
+            and the cell of the same staff and slot this week (-1 if pruned)
+            future_rows, future_current, future_future, future_rows_week (np.array): flat (day one staff, later week - 1, slot)
+            indices compared by 3.5, the cell of the same staff and slot this week and in the later week (-1 if pruned),
+            and the later week
+
+        Args:
+            inputs (list): output of State.get_algo_inputs()
+            horizon_weeks (int, optional): number of upcoming weeks to schedule slot by slot. Defaults to None (all).
+            merge_tolerance (float, optional): merge weeks after the upcoming one whose demand has the same nonzero
+            slots and differs by at most this much in every slot. This is an approximation, even at 0: merged weeks are
+            forced to share one schedule, so the optimum of the merged problem can be worse than the full problem's.
+            Defaults to None (don't merge).
+            fixed_coverage (np.ndarray, optional): (# of weeks before merging, # of days, # of slots per day) number of
+            staff members left out of the inputs whose assignments are held fixed, in each scheduled week and slot. Slot
+            constraints and 3.3 count them towards each slot's staff (see delta.py). Defaults to None (no one).
+            relax (bool, optional): relax the 2.1/2.3 minimum of slots that are short on available staff to what the
+            available staff can cover ("presolve_relax" in config.json). Defaults to False.
+        """
+        input_oh_demand = inputs[0]                         # (# of future weeks, # of days, # of slots per day)
+        input_previous_weeks_assignments = inputs[1]        # (# of day one staff, # of past weeks, # of days, # of slots per day)
+        input_staff_availabilities = inputs[2]              # (# of all staff, # of days, # of slots per day)
+        input_max_contig = inputs[3]                        # (# of all staff, )
+        input_target_total_future_hours = inputs[4]         # (# of all staff, )
+        input_target_weekly_hours = inputs[5]               # (# of all staff, )
+        input_preferred_contiguous_hours = inputs[6]        # (# of all staff, )
+        input_changed_hours_weightings = inputs[7]          # (# of day one staff, )
+        input_non_day_one_indices = inputs[8]               # (# of non day one staff, )
+
+        m = input_max_contig.shape[0]
+        m_non_day_ones = input_non_day_one_indices.shape[0] # WARNING: assumes non-day one staff are 
+                                                            # added to the end of each prev_assignments array
+        m_day_ones = m - m_non_day_ones
+
+        n = input_oh_demand.shape[0]
+
+        # Every hour quantity in the inputs is in slots of this grid
+        self.grid_shape = tuple(input_oh_demand.shape[1:])
+        S = self.slots = int(np.prod(self.grid_shape))
+
+        try:
+            p = input_previous_weeks_assignments.shape[1] # TODO: change later, but we probably don't want to perform look-behind for all prev weeks, fixed look behind sliding window keeps computational complexity down with minimal resulting tradeoff
+        except IndexError as e:
+            p = 0
+            print("No previous weeks. Removing past consistency constraint.")
+
+        # Rolling horizon: only the next horizon_weeks weeks are scheduled slot by slot. The weeks after that
+        # are represented by the total number of hours each staff member works in them.
+        n_tail = 0
+        if horizon_weeks and horizon_weeks < n:
+            n_tail = n - horizon_weeks
+            n = horizon_weeks
+            print(f"Scheduling the next {n} weeks. Aggregating the remaining {n_tail}.")
+
+        # State.get_algo_inputs builds some of these from lists of python objects, so they may come in with dtype=object
+        demand = np.asarray(input_oh_demand[:n], dtype=float).reshape(n, S)
+        self.tail_demand = np.asarray(input_oh_demand[n:], dtype=float).reshape(n_tail, S)
+
+        # The demand sheet mostly repeats the same weekly pattern. Weeks after the upcoming one with (nearly) the same
+        # demand are merged into one scheduled week that counts once per merged week, and get the same schedule. This
+        # shrinks the model at the cost of optimality, as the merged weeks can't be scheduled differently.
+        self.week_of = np.arange(n)
+        representatives = list(range(n))
+        if merge_tolerance is not None:
+            representatives = [0]
+            for week in range(1, n):
+                for merged, representative in enumerate(representatives[1:], 1):
+                    if np.array_equal(demand[week] > 0, demand[representative] > 0) and \
+                       np.abs(demand[week] - demand[representative]).max() <= merge_tolerance:
+                        self.week_of[week] = merged
+                        break
+                else:
+                    self.week_of[week] = len(representatives)
+                    representatives.append(week)
+            if len(representatives) < n:
+                print(f"Merging {n} scheduled weeks into {len(representatives)} weeks with distinct demand.")
+        self.week_representatives = np.array(representatives)
+        self.week_multiplicity = np.bincount(self.week_of)
+        n = len(representatives)
+
+        self.m, self.m_day_ones, self.n, self.p, self.n_tail = m, m_day_ones, n, p, n_tail
+        self.relax = relax
+
+        # Merged weeks get their average demand in the objective. Their slot minimums are those of the merged
+        # week that needs the most staff (see required_staff).
+        self.week_demand = demand
+        self.demand = np.stack([demand[self.week_of == week].mean(axis=0) for week in range(n)]).reshape(n * S)
+        coverage = np.zeros((self.week_of.size, S)) if fixed_coverage is None else np.asarray(fixed_coverage, dtype=float).reshape(self.week_of.size, S)
+        self.week_coverage = coverage
+        self.coverage = np.stack([coverage[self.week_of == week].mean(axis=0) for week in range(n)]).reshape(n * S)
+        self.target_weekly_hours = np.asarray(input_target_weekly_hours, dtype=float)
+        self.target_total_future_hours = np.asarray(input_target_total_future_hours, dtype=float)
+        self.staff_availabilities = np.asarray(input_staff_availabilities).reshape(m, S)
+        self.previous = np.asarray(input_previous_weeks_assignments, dtype=float).reshape(m_day_ones, p, S)
+        self.changed_hours_weightings = np.asarray(input_changed_hours_weightings, dtype=float).reshape(m_day_ones)
+        self.max_contig = np.asarray(input_max_contig, dtype=int)
+        self.preferred_contig = np.asarray(input_preferred_contiguous_hours, dtype=int)
+
+        # Only create variables for (staff, week, slot) cells that could actually be assigned: the slot has
+        # nonzero demand (see 2.5) and the staff member didn't rate it 5 - Not Possible.
+        active = (self.demand.reshape(n, S)[None, :, :] > 0) & (self.staff_availabilities[:, None, :] < UNAVAILABLE_RATING) # shape: (# of staff, # of scheduled weeks, S)
+        self.cells = np.flatnonzero(active)
+        self.cell_staff, cell_week_slot = np.divmod(self.cells, n * S)
+        self.cell_week, self.cell_slot = np.divmod(cell_week_slot, S)
+
+        # Maps (staff, week, slot) to the index of its variable, or -1 if it was pruned
+        cell_index = np.full(active.size, -1)
+        cell_index[self.cells] = np.arange(self.cells.size)
+        self.cell_index = cell_index.reshape(m, n, S)
+
+        self.supply = active.sum(axis=0).reshape(n * S)
+
+        # Pairs of cells compared by 3.5. max(prev - current, 0) is 0 wherever prev is 0, so past rows only exist
+        # for (day one staff, past week, slot) worked in the past. max(current - future, 0) is 0 wherever current
+        # is pruned, so future rows only exist for (day one staff, later week, slot) whose current slot is a cell.
+        current_week = self.cell_index[:m_day_ones, 0, :] # shape: (# of day one staff, S)
+        self.past_rows = np.flatnonzero(self.previous > 0)
+        self.past_current = np.broadcast_to(current_week[:, None, :], self.previous.shape).ravel()[self.past_rows]
+
+        future_weeks = self.cell_index[:m_day_ones, 1:, :] # shape: (# of day one staff, # of scheduled weeks - 1, S)
+        current = np.broadcast_to(current_week[:, None, :], future_weeks.shape).ravel()
+        self.future_rows = np.flatnonzero(current >= 0)
+        self.future_current = current[self.future_rows]
+        self.future_future = future_weeks.ravel()[self.future_rows]
+        self.future_rows_week = np.broadcast_to(np.arange(1, n)[None, :, None], future_weeks.shape).ravel()[self.future_rows]
+
+    def _week_minimums(self):
+        """
+        Returns:
+            (np.array, np.array): (# of weeks before merging, S) 2.1/2.3 minimum number of staff in each week and
+            slot, and the number of staff available for it, counting the fixed coverage
+        """
+        supply = self.supply.reshape(self.n, self.slots)[self.week_of]
+        return np.where(self.week_demand != 0, np.maximum(self.week_demand - 3, 1), 0), supply + self.week_coverage
+
+    def understaffed_slots(self):
+        """
+        Returns:
+            np.array: flat (scheduled week, slot) indices of the slots with a week whose 2.1/2.3 minimum is more than
+            its available staff can cover
+        """
+        required, capacity = self._week_minimums()
+        weeks, slots = np.nonzero(required > capacity)
+        return np.unique(self.week_of[weeks] * self.slots + slots)
+
+    def required_staff(self):
+        """
+        Raises:
+            ValueError: Some slots are short on available staff and relax is off
+
+        Returns:
+            np.array: (n * S, ) minimum number of staff in each slot under 2.1 and 2.3, on top of the fixed coverage.
+            Merged weeks share a schedule, so it has to meet the minimum of every week merged into it. With relax,
+            slots that are short on available staff only need what the available staff can cover.
+        """
+        required, capacity = self._week_minimums()
+        if (required > capacity).any():
+            if not self.relax:
+                raise ValueError(f"{self.understaffed_slots().size} slots with demand don't have enough available staff to "
+                                 "meet 2.1/2.3. Set presolve_relax in config.json to relax them.")
+            required = np.minimum(required, capacity)
+        required = np.maximum(required - self.week_coverage, 0)
+        merged = np.zeros((self.n, self.slots))
+        np.maximum.at(merged, self.week_of, required)
+        return merged.ravel()
+
+    def tail_capacity(self):
+        """
+        Returns:
+            np.array: (m, ) most hours each staff member can work past the horizon under 2.4 and their availability
+        """
+        tail_available = ((self.tail_demand[None, :, :] > 0) & (self.staff_availabilities[:, None, :] < UNAVAILABLE_RATING)).sum(axis=2)
+        return np.minimum(tail_available, self.target_weekly_hours[:, None] + 1).sum(axis=1)
+
+    def displeasure(self, weights=None):
+        """
+        Args:
+            weights (dict, optional): objective weights to use instead of the module-level ones (see
+            objective_weights). Defaults to None.
+
+        Returns:
+            np.array: (# of cells, ) 3.4 cost of each cell, times U_3_4
+        """
+        # Only available ratings are mapped: unavailable slots never become cells
+        apply_mapping = np.vectorize(lambda val: RATE_TO_DISPLEASURE_MAPPING[val], otypes=[float])
+        return objective_weights(weights)["U_3_4"] * apply_mapping(self.staff_availabilities[self.cell_staff, self.cell_slot]) * self.week_multiplicity[self.cell_week]
+
+    def past_weights(self, weights=None):
+        """
+        Args:
+            weights (dict, optional): objective weights to use instead of the module-level ones (see
+            objective_weights). Defaults to None.
+
+        Returns:
+            np.array: (# of past rows, ) 3.5 weight of each past row, times U_3_5
+        """
+        weights = objective_weights(weights)
+        prev_weeks_weights = np.exp(-weights["DECAY_RATE"] * np.arange(self.p, 0, -1))
+        # if a staff member doesn't work for a week, then skip them for that week
+        # (rows only exist for slots worked in the past, so every row's week was worked)
+        row_weights = prev_weeks_weights[None, :] * (1 - self.changed_hours_weightings)[:, None]  # shape: (# of day one staff, p)
+        row_weights = row_weights[:, :, None].repeat(self.slots, axis=2)
+        return weights["U_3_5"] * np.maximum(row_weights.ravel()[self.past_rows], 0)
+
+    def past_coefficients(self, weights=None):
+        """The past assignments are known 0/1 data, so max(prev - current, 0) = prev * (1 - current), and the
+        look-behind part of 3.5 is the linear function constant - weights @ A of the assignment variables.
+
+        Args:
+            weights (dict, optional): objective weights to use instead of the module-level ones (see
+            objective_weights). Defaults to None.
+
+        Returns:
+            (np.array, float): (# of cells, ) weight of each cell, and the constant (both times U_3_5)
+        """
+        row_weights = self.past_weights(weights)
+        has_current = self.past_current >= 0
+        cell_weights = np.bincount(self.past_current[has_current], weights=row_weights[has_current], minlength=self.cells.size)
+        return cell_weights, row_weights.sum()
+
+    def future_weights(self, weights=None):
+        """
+        Args:
+            weights (dict, optional): objective weights to use instead of the module-level ones (see
+            objective_weights). Defaults to None.
+
+        Returns:
+            np.array: (# of future rows, ) 3.5 weight of each future row, times U_3_5
+        """
+        weights = objective_weights(weights)
+        future_weeks_weights = np.exp(-weights["DECAY_RATE"] * np.arange(1, self.week_of.size + 1))
+        # A merged week stands in for every week merged into it
+        future_weeks_weights = np.bincount(self.week_of, weights=future_weeks_weights)
+        return weights["U_3_5"] * future_weeks_weights[self.future_rows_week]
+
+    def window_matrix(self, window_sizes):
+        """Builds the sparse 0/1 matrix W such that (W @ A)[r] is the number of assignments in a window of
+        consecutive slots within one day. Windows run over every staff member, scheduled week, day and starting slot.
+        A window can only have all its slots assigned if none of them were pruned, so only those windows are included.
+
+        Args:
+            window_sizes (np.array): (m, ) window length for each staff member. Lengths over a day get no windows.
+
+        Returns:
+            (sp.csr_matrix, np.array, np.array): (# of windows, # of cells) matrix, and the staff member and week of each window
+        """
+        day_slots = self.grid_shape[1]
+        cell_index = self.cell_index.reshape(self.m, self.n, *self.grid_shape)
+        # Number of cells among the first h slots of each day, so that window counts are differences of two entries
+        counts = np.cumsum(np.pad(cell_index >= 0, ((0, 0), (0, 0), (0, 0), (1, 0))), axis=3)
+
+        rows, cols, row_staff, row_week = [], [], [], []
+        num_windows = 0
+        for size in np.unique(window_sizes[(window_sizes >= 1) & (window_sizes <= day_slots)]):
+            staff = np.flatnonzero(window_sizes == size)
+            full = counts[staff, :, :, size:] - counts[staff, :, :, :-size] == size # shape: (# of staff, n, # of days, day_slots - size + 1)
+            window_staff, window_week, window_day, window_start = np.nonzero(full)
+            for offset in range(size):
+                rows.append(num_windows + np.arange(window_staff.size))
+                cols.append(cell_index[staff[window_staff], window_week, window_day, window_start + offset])
+            row_staff.append(staff[window_staff])
+            row_week.append(window_week)
+            num_windows += window_staff.size
+
+        rows, cols = np.concatenate(rows + [np.zeros(0, dtype=int)]), np.concatenate(cols + [np.zeros(0, dtype=int)])
+        matrix = sp.csr_matrix((np.ones(rows.size), (rows, cols)), shape=(num_windows, self.cells.size))
+        return matrix, np.concatenate(row_staff + [np.zeros(0, dtype=int)]), np.concatenate(row_week + [np.zeros(0, dtype=int)])
+
+    def structure_key(self):
+        """
+        Returns:
+            string: hash of everything that decides the structure of the problem. Two AlgoData objects
+            with the same key can be solved with the same ScheduleTemplate.
+        """
+        key = hashlib.sha1()
+        key.update(np.array([self.m, self.m_day_ones, self.n, self.n_tail, *self.grid_shape]).tobytes())
+        key.update(self.week_of.tobytes())
+        key.update(np.packbits(self.demand > 0).tobytes())
+        key.update(np.packbits(self.coverage > 0).tobytes())
+        key.update(np.packbits(self.staff_availabilities < UNAVAILABLE_RATING).tobytes())
+        key.update(self.max_contig.tobytes())
+        key.update(self.preferred_contig.tobytes())
+        return key.hexdigest()
+
+    def data_key(self, solver=None, solver_options=None):
+        """
+        Args:
+            solver (string, optional): solver the problem is solved with. Defaults to None.
+            solver_options (dict, optional): options it is solved with. Only the gap changes an optimal schedule.
+            Defaults to None.
+
+        Returns:
+            string: hash of the structure, every input the parameters are set from, the weights, the solver, the
+            gap, FORMULATION_VERSION and the cvxpy version. Two AlgoData objects with the same key have the same
+            optimal schedule.
+        """
+        key = hashlib.sha1(self.structure_key().encode())
+        for values in (self.week_demand, self.week_coverage, self.tail_demand, self.target_weekly_hours, self.target_total_future_hours,
+                       self.staff_availabilities, self.previous, self.changed_hours_weightings, self.relax):
+            key.update(np.ascontiguousarray(values, dtype=float).tobytes())
+        weights = [U_3_1, U_3_2, U_3_3, U_3_4, U_3_5, U_3_6, DECAY_RATE, sorted(RATE_TO_DISPLEASURE_MAPPING.items())]
+        key.update(json.dumps([weights, solver, (solver_options or {}).get("gap"), FORMULATION_VERSION, cp.__version__]).encode())
+        return key.hexdigest()
+
+    def to_dense(self, values):
+        """Scatters one value per cell back into the dense assignment array.
+
+        Args:
+            values (np.array): (# of cells, ) values of the assignment variables
+
+        Returns:
+            np.array: (m, # of weeks before merging, # of days, # of slots per day) array, zero for pruned cells. Merged weeks get
+            the schedule of the week they were merged into.
+        """
+        dense = np.zeros(self.m * self.n * self.slots)
+        dense[self.cells] = values
+        return dense.reshape(self.m, self.n, *self.grid_shape)[:, self.week_of]
+
+
+class ScheduleTemplate:
+    """
+    The scheduling MILP for one problem structure. The demand, hour targets, availability ratings and
+    weights enter through cp.Parameters, so the same template can be solved again with new data
+    without cvxpy canonicalizing the problem again.
+    """
+
+    def __init__(self, data, solver=None, relax_slots=False, relax_integrality=False):
+        """Builds the problem for the structure of the given data and canonicalizes it for the given solver.
+
+        Instance Attributes:
+            A (cp.Variable): (# of cells, ) boolean assignment variables, one per AlgoData cell
+            H (cp.Variable): (m, ) integer hours worked past the horizon (None without a horizon)
+            constraints (list): hard constraints
+            prob (cp.Problem): the full problem
+            terms (dict): objective terms, keyed "3.1" through "3.6"
+            size (dict): size of the problem (see print_problem_size)
+            phase_times (dict): seconds spent creating variables, building the constraints and the objective,
+            setting the parameters and canonicalizing
+            setup_time (float): seconds spent building and canonicalizing the problem
+
+        Args:
+            data (AlgoData): data whose structure the template is built for
+            solver (string, optional): solver the problem will be solved with. Defaults to None (cvxpy's choice).
+            relax_slots (bool, optional): leave out 2.1, 2.3 and 3.3 and price each assignment by its slot
+            (slot_price) instead. Defaults to False.
+            relax_integrality (bool, optional): make A and H continuous, with A between 0 and 1, for the LP
+            relaxation of the problem (see rounding.py). Defaults to False.
+        """
+        start = phase_start = perf_counter()
+        self.phase_times = {}
+        self.relax_slots = relax_slots
+        m, m_day_ones, n, p, n_tail = data.m, data.m_day_ones, data.n, data.p, data.n_tail
+        num_cells = data.cells.size
+        demand = data.demand
+
+        # Define the decision variable. A[k] is the assignment of cell_staff[k] to cell_slot[k] in cell_week[k]
+        A = cp.Variable(num_cells, boolean=not relax_integrality)
+        self.A = A
+        self.H = None
+
+        X_slot = incidence_matrix(data.cell_week * data.slots + data.cell_slot, n * data.slots) @ A # shape: (# of scheduled weeks * S, )
+        X_week = incidence_matrix(data.cell_staff * n + data.cell_week, m * n) @ A  # shape: (# of staff * # of scheduled weeks, )
+        self.T = cp.Parameter(m * n)                                                 # weekly target hours, repeated for each week
+        phase_start = lap(self.phase_times, "variables", phase_start)
+
+        # ---------------- Hard Constraints (CP constraints) ----------------
+        constraints = [A >= 0, A <= 1] if relax_integrality else []
+
+        # 2.1: Staff time slot existence (At least 1 staff member per NONZERO time slot). Staff held fixed already
+        # cover some slots.
+        self.nonzero_slots = np.flatnonzero((demand != 0) & (data.supply > 0)) if not relax_slots else np.array([], dtype=int)
+        uncovered_slots = self.nonzero_slots[data.coverage[self.nonzero_slots] == 0]
+        if uncovered_slots.size:
+            constraints.append(X_slot[uncovered_slots] >= 1)
+
+        # 2.2: Maximum Contiguous Hours. Every max_contig + 1 consecutive slots in a day hold at most max_contig assignments.
+        windows, window_staff, _ = data.window_matrix(data.max_contig + 1)
+        if windows.shape[0]:
+            constraints.append(windows @ A <= data.max_contig[window_staff])
+
+        # 2.3 (TESTING) no timeslot should have > 3 number of absences
+        self.min_staff = cp.Parameter(self.nonzero_slots.size)
+        if self.nonzero_slots.size:
+            constraints.append(X_slot[self.nonzero_slots] >= self.min_staff)
+
+        # 2.4 (TEMP/TESTING) no one should be doing >3+ their target weekly hours
+        constraints.append(X_week - self.T <= 1)
+
+        # Weeks past the horizon: each staff member's total hours (H) is bounded by what 2.4 and their
+        # availability allow in those weeks
+        if n_tail:
+            self.H = cp.Variable(m, integer=not relax_integrality) # shape: (# of staff, )
+            self.tail_capacity = cp.Parameter(m, nonneg=True)
+            constraints += [self.H >= 0, self.H <= self.tail_capacity]
+
+        # 2.5 (TEMP/TESTING) no assignments during times of 0 demand
+        # Enforced by construction: zero demand slots have no variables.
+
+
+        # 2.6 ensure no one gets assigned to a slot they are unavailable for
+        # Enforced by construction: unavailable slots have no variables, rather than a prohibitive 3.4 cost.
+
+        phase_start = lap(self.phase_times, "constraints", phase_start)
+
+        # ---------------- Soft Constraints (CP objective) ----------------
+        # Each absolute deviation |X - T| is modeled with a single slack D and the block D >= X - T, D >= T - X,
+        # and each one-sided violation max(X - T, 0) with a nonnegative slack and the block D >= X - T.
+        # Term weights are parameters too, so they can be tuned without rebuilding the problem.
+        soft_constraints = []
+        self.U = cp.Parameter(4, nonneg=True) # U_3_1, U_3_2, U_3_3, U_3_6. U_3_4 and U_3_5 are folded into the 3.4/3.5 coefficients
+
+        # 3.1: Minimize Maximum-Weekly-Hour
+        D_3_1 = cp.Variable(m * n) # shape: (# of staff * # of scheduled weeks, )
+        soft_constraints += [D_3_1 >= X_week - self.T, D_3_1 >= self.T - X_week]
+        term_3_1 = D_3_1 @ np.tile(data.week_multiplicity, m) # merged weeks count once per week merged into them
+
+        # Weeks past the horizon only have a total, so compare it against their combined target
+        if n_tail:
+            self.tail_target = cp.Parameter(m)
+            D_3_1_tail = cp.Variable(m)
+            soft_constraints += [D_3_1_tail >= self.H - self.tail_target, D_3_1_tail >= self.tail_target - self.H]
+            term_3_1 += cp.sum(D_3_1_tail)
+
+        # 3.2 (w/o QC): Minimize Total Future Hour Violations Per Staff
+        X = incidence_matrix(data.cell_staff, m, data.week_multiplicity[data.cell_week]) @ A # shape: (num staff, )
+        if n_tail:
+            X = X + self.H
+        self.target_total_future_hours = cp.Parameter(m)
+        D_3_2 = cp.Variable(m, nonneg=True)
+        soft_constraints.append(D_3_2 >= X - self.target_total_future_hours)
+        term_3_2 = cp.sum(D_3_2)
+
+        # 3.3 (w/o QC): Minimize Total # of violations where we've assigned too few people in a slot
+        # (zero demand slots have no variables, so they never contribute)
+        self.demand_slots = np.flatnonzero(demand != 0) if not relax_slots else np.array([], dtype=int)
+        term_3_3 = 0
+        if self.demand_slots.size:
+            self.slot_demand = cp.Parameter(self.demand_slots.size)
+            D_3_3 = cp.Variable(self.demand_slots.size)
+            soft_constraints += [D_3_3 >= self.slot_demand - X_slot[self.demand_slots], D_3_3 >= X_slot[self.demand_slots] - self.slot_demand]
+            term_3_3 = D_3_3 @ data.week_multiplicity[self.demand_slots // data.slots]
+
+        # 3.4: Scheduling Assignment Displeasure (times U_3_4)
+        self.displeasure = cp.Parameter(num_cells, nonneg=True)
+        term_3_4 = self.displeasure @ A
+
+
+        # 3.5: Consistent Weekly Hours (w/o MIQP) (weights times U_3_5)
+        # Assuming input_previous_weeks_assignments[0] is the first week the OH scheduler ran
+        term_3_5 = 0
+        # Match current week with the past. This is linear in the current week (see AlgoData.past_coefficients),
+        # so it needs no slacks, and the number of past weeks only changes the coefficients.
+        self.past_cell_weights = cp.Parameter(num_cells, nonneg=True)
+        self.past_constant = cp.Parameter(nonneg=True)
+        term_3_5 += self.past_constant - self.past_cell_weights @ A
+
+        # Match current week with future weeks
+        if data.future_rows.size:
+            self.future_weights = cp.Parameter(data.future_rows.size, nonneg=True)
+
+            D_3_5_future = cp.Variable(data.future_rows.size, nonneg=True)
+            soft_constraints.append(D_3_5_future >= selection_matrix(data.future_current, num_cells) @ A - \
+                                                    selection_matrix(data.future_future, num_cells) @ A)
+            term_3_5 += self.future_weights @ D_3_5_future
+
+        # 3.6: Preferred Contiguous Hours. Every slot of a block past the preferred length costs U_3_6, i.e. every
+        # preferred_contig + 1 consecutive slots that are all assigned.
+        term_3_6 = 0
+        blocks, block_staff, block_week = data.window_matrix(data.preferred_contig + 1)
+        if blocks.shape[0]:
+            D_3_6 = cp.Variable(blocks.shape[0], nonneg=True)
+            soft_constraints.append(D_3_6 >= blocks @ A - data.preferred_contig[block_staff])
+            term_3_6 = D_3_6 @ data.week_multiplicity[block_week]
+
+
+        self.terms = {
+            "3.1": self.U[0] * term_3_1,
+            "3.2": self.U[1] * term_3_2,
+            "3.3": self.U[2] * term_3_3,
+            "3.4": term_3_4,
+            "3.5": term_3_5,
+            "3.6": self.U[3] * term_3_6,
+        }
+
+        # Lagrangian relaxation (see decomposition.py): the slot coverage constraints and 3.3 are left out, and
+        # each assignment pays the price of its slot instead. Without them the problem separates by staff member.
+        if relax_slots:
+            self.slot_price = cp.Parameter(num_cells)
+            self.terms["prices"] = self.slot_price @ A
+        obj = cp.Minimize(cp.sum([self.terms[term] for term in self.terms]))
+
+
+        # Optimization Problem
+        self.constraints = constraints
+        self.prob = Problem(obj, constraints + soft_constraints)
+        phase_start = lap(self.phase_times, "objective", phase_start)
+
+        self.set_parameters(data)
+        phase_start = lap(self.phase_times, "parameters", phase_start)
+        self.size = print_problem_size(self.prob, solver)
+        lap(self.phase_times, "canonicalization", phase_start)
+        self.setup_time = perf_counter() - start
+
+    def set_parameters(self, data, weights=None):
+        """Sets every parameter of the problem from data, which must have the structure this template was built for.
+
+        Args:
+            data (AlgoData): data to solve the problem for
+            weights (dict, optional): objective weights to use instead of the module-level ones (see
+            objective_weights). Defaults to None.
+        """
+        weights = objective_weights(weights)
+        m, n = data.m, data.n
+        self.T.value = data.target_weekly_hours.repeat(n)
+
+        if not self.relax_slots:
+            # Slots that are short on available staff can't meet 2.1/2.3. With data.relax, they only need what the
+            # available staff can cover, and otherwise required_staff raises.
+            required = data.required_staff()
+            understaffed = data.understaffed_slots()
+            if understaffed.size:
+                print(f"WARNING: {understaffed.size} slots with demand don't have enough available staff. Relaxing 2.1/2.3 for them.")
+            self.min_staff.value = required[self.nonzero_slots]
+        else:
+            self.slot_price.value = np.zeros(data.cells.size)
+
+        if data.n_tail:
+            self.tail_capacity.value = data.tail_capacity()
+            self.tail_target.value = data.n_tail * data.target_weekly_hours
+
+        self.U.value = np.array([weights[name] for name in ("U_3_1", "U_3_2", "U_3_3", "U_3_6")], dtype=float)
+        self.target_total_future_hours.value = data.target_total_future_hours
+        if self.demand_slots.size:
+            self.slot_demand.value = (data.demand - data.coverage)[self.demand_slots]
+
+        self.displeasure.value = data.displeasure(weights)
+
+        self.past_cell_weights.value, self.past_constant.value = data.past_coefficients(weights)
+
+        if data.future_rows.size:
+            self.future_weights.value = data.future_weights(weights)
+
+    def __getstate__(self):
+        # cvxpy numbers its variables, parameters and constraints from a per-process counter
+        return {**self.__dict__, "id_count": lu.ID_COUNTER.count}
+
+    def __setstate__(self, state):
+        # Move this process's counter past every id in the loaded template, so that objects created after it
+        # never share an id with one of its objects
+        lu.ID_COUNTER.count = int(np.maximum(lu.ID_COUNTER.count, state.pop("id_count")))
+        self.__dict__.update(state)
+
+
+# Problem templates built in this process, keyed by AlgoData.structure_key() and solver, least recently used first
+_template_cache = OrderedDict()
+template_cache_stats = {"hits": 0, "misses": 0, "seconds_saved": 0.0}
+
+def get_template(data, solver=None, use_disk_cache=False):
+    """Returns a problem template with its parameters set to data, reusing a previously built template
+    with the same structure if there is one. Canonicalization is the bulk of cvxpy's setup time and only
+    happens once per template.
+
+    Args:
+        data (AlgoData): data to solve the problem for
+        solver (string, optional): solver a new template is canonicalized for, or "auto"/None (see
+        solvers.resolve_solver). Defaults to None.
+        use_disk_cache (bool, optional): also look for the template in the on-disk problem cache, and store newly
+        built templates there, so that later runs skip canonicalization too (see problem_cache). Defaults to False.
+
+    Returns:
+        ScheduleTemplate: template ready to solve
+    """
+    # A template is canonicalized for one solver, so one built for another can't be reused
+    solver = solvers.resolve_solver(solver)
+    key = (data.structure_key(), solver)
+    # A template pickled by another version of the model or of cvxpy can't be reused
+    disk_key = problem_cache.make_key(key, solver, FORMULATION_VERSION, cp.__version__)
+    start = perf_counter()
+    template = _template_cache.get(key)
+    source = "memory"
+    if template is None and use_disk_cache:
+        template = problem_cache.load("template", disk_key)
+        source = "disk"
+    if template is None:
+        template_cache_stats["misses"] += 1
+        template = ScheduleTemplate(data, solver)
+        _template_cache[key] = template
+        if len(_template_cache) > TEMPLATE_CACHE_SIZE:
+            _template_cache.popitem(last=False)
+        print(f"Built new problem template in {template.setup_time:.3f}s")
+        if use_disk_cache:
+            problem_cache.store("template", disk_key, template)
+    else:
+        _template_cache[key] = template
+        _template_cache.move_to_end(key)
+        if len(_template_cache) > TEMPLATE_CACHE_SIZE:
+            _template_cache.popitem(last=False)
+        template.set_parameters(data)
+        template_cache_stats["hits"] += 1
+        template_cache_stats["seconds_saved"] += template.setup_time - (perf_counter() - start)
+        print(f"Reusing problem template from {source} ({template_cache_stats['hits']} hits, "
+              f"{template_cache_stats['misses']} misses, {template_cache_stats['seconds_saved']:.3f}s saved so far)")
+    return template
+
+def run_algorithm(inputs, horizon_weeks=None, previous_solution=None, solver=None, solver_options=None, relax=False,
+                  merge_tolerance=None):
+    """Runs the scheduling MILP for the upcoming week.
+
+    Runs are cached on disk (see problem_cache): the problem template of each structure, so that a rerun goes
+    straight to the solver, and each optimal schedule, so that a rerun on exactly the same inputs doesn't solve at all.
+
+    Args:
+        inputs (list): output of State.get_algo_inputs()
+        horizon_weeks (int, optional): number of upcoming weeks to schedule slot by slot. Weeks past the
+        horizon are only represented by each staff member's total hours over them. Defaults to None
+        (schedule every remaining week).
+        previous_solution (np.ndarray, optional): assignments.npy from last week's run, used as a MIP start
+        for solvers that accept one. Ignored if it isn't feasible anymore. Defaults to None.
+        solver (string, optional): MILP solver to use (see solvers.SOLVER_OPTIONS). Defaults to None (most preferred installed).
+        solver_options (dict, optional): "gap", "threads" and/or "time_limit" for the solver. Defaults to None.
+        relax (bool, optional): relax the 2.1/2.3 minimum of slots that are short on available staff (see AlgoData). Defaults to False.
+        merge_tolerance (float, optional): schedule weeks after the upcoming one with the same demand, give or
+        take this much per slot, as one week with one schedule (see AlgoData). A smaller but restricted model, so
+        the schedule may be worse than without merging. Defaults to None (don't merge).
+
+    Returns:
+        np.ndarray: (# of all staff, # of days, # of slots per day) assignments for the upcoming week. The assignments for every
+        scheduled week, shape (# of all staff, # of scheduled weeks, # of days, # of slots per day), are saved to assignments.npy, and
+        the size of the problem, time spent in each phase, solver statistics and objective terms to METRICS_PATH.
+    """
+    data = AlgoData(inputs, horizon_weeks, merge_tolerance, relax=relax)
+    m, n = data.m, data.n
+
+    print("Setting up algorithm...")
+    print(f"Creating {data.cells.size} of {m * n * data.slots} assignment variables ({m * n * data.slots - data.cells.size} pruned)")
+    if not data.cells.size:
+        print("No staff member is available for any slot with demand. Nothing to schedule.")
+        return np.zeros((m, *data.grid_shape))
+
+    solver = solvers.resolve_solver(solver)
+    metrics = {
+        "engine": "milp",
+        "status": None,
+        "objective": None,
+        "staff": m,
+        "weeks": data.week_of.size,
+        "scheduled_weeks": n,
+        "cells": data.cells.size,
+        "template_reused": False,
+        "cache": None,
+        "size": None,
+        "phase_times": None,
+        "solver_stats": None,
+        "gap": None,
+        "terms": None,
+    }
+
+    # A run on exactly the same inputs, weights and solver has already been solved to optimality
+    start = perf_counter()
+    solution_key = data.data_key(solver, solver_options)
+    cached = problem_cache.load("solution", solution_key)
+    if cached is not None:
+        print(f"Reusing cached optimal schedule {solution_key[:8]}. Objective value: {cached['objective']}")
+        assignments = save_assignments(data, cached["A"])
+        metrics.update(status=cached["status"], objective=cached["objective"], cache="solution", size=cached["size"],
+                       gap=cached.get("gap"), terms=cached["terms"], phase_times={"cache": perf_counter() - start})
+        save_metrics(metrics)
+        return assignments
+
+    misses, disk_hits, start = template_cache_stats["misses"], problem_cache.cache_stats["hits"], perf_counter()
+    template = get_template(data, solver, use_disk_cache=True)
+    # A reused template only had its parameters set this run
+    template_reused = template_cache_stats["misses"] == misses
+    phase_times = {"parameters": perf_counter() - start} if template_reused else dict(template.phase_times)
+    A, H = template.A, template.H
+
+    # Seed the solver with last week's solution if it still satisfies the hard constraints
+    warm_start = False
+    if previous_solution is not None:
+        initial = shift_previous_solution(previous_solution, m, data.week_of.size, data.grid_shape)
+        if initial is None:
+            print("Previous solution doesn't match this week's staff. Solving from scratch.")
+        else:
+            initial = initial[:, data.week_representatives]
+            A.value = initial.ravel()[data.cells]
+            if H is not None:
+                H.value = np.minimum(template.tail_target.value, template.tail_capacity.value)
+            dropped = initial.sum() - A.value.sum()
+            warm_start = all(constraint.value() for constraint in template.constraints)
+            if warm_start:
+                print(f"Warm starting from previous solution ({dropped:.0f} assignments no longer available dropped).")
+            else:
+                print("Previous solution is infeasible after demand/availability changes. Solving from scratch.")
+
+    print(f"Running algorithm with {solver}...")
+    prob = template.prob
+    elapsed = solvers.solve(prob, solver, solver_options, warm_start)
+    print(f"Algorithm status: {prob.status}. Objective value: {prob.value}")
+    print(f"Time elapsed: {elapsed}")
+    phase_times["solve"] = elapsed
+
+    metrics.update(status=prob.status, objective=prob.value, template_reused=template_reused, size=template.size,
+                   cache="template" if problem_cache.cache_stats["hits"] > disk_hits else None,
+                   phase_times=phase_times, solver_stats=solvers.solver_stats(prob))
+    # The relative gap of the schedule to the solver's bound: at most the "gap" option if it's optimal, and whatever
+    # the solver got to if it ran out of time
+    metrics["gap"] = metrics["solver_stats"]["gap"]
+    if A.value is None:
+        save_metrics(metrics)
+        raise RuntimeError(f"Algorithm did not find a schedule. Status: {prob.status}")
+
+    start = perf_counter()
+    metrics["terms"] = {term: float(expression.value) for term, expression in template.terms.items()}
+    values = np.rint(A.value)
+    assignments = save_assignments(data, values)
+    phase_times["extraction"] = perf_counter() - start
+    # Only optimal schedules are the schedule of their inputs. One cut short by the time limit isn't.
+    if prob.status == cp.OPTIMAL:
+        problem_cache.store("solution", solution_key, {"A": values, "status": prob.status, "objective": prob.value,
+                                                       "terms": metrics["terms"], "size": template.size, "gap": metrics["gap"]})
+    print("Phase times: " + ", ".join(f"{phase} {seconds:.3f}s" for phase, seconds in phase_times.items()))
+    save_metrics(metrics)
+
+    return assignments
@@ -0,0 +1,212 @@
+import argparse
+import contextlib
+import glob
+import json
+import os
+import time
+import traceback
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from multiprocessing import get_context
+from time import perf_counter
+import config_read
+import runner
+import validation
+
+# Seconds each course's solve may take, for courses whose config doesn't set solver_options["time_limit"]
+DEFAULT_TIME_BUDGET = 1800
+
+# Where the results of every course are written: one directory per course, and a summary of the batch
+DEFAULT_OUTPUT_DIR = "batch_output"
+SUMMARY_FILE = "batch_results.json"
+
+
+def read_course_configs(config_dir):
+    """
+    Args:
+        config_dir (string): directory with one config.json-style file per course
+
+    Raises:
+        ValueError: The directory has no .json files
+
+    Returns:
+        dict: path of each course's config, keyed by the file name without .json
+    """
+    paths = sorted(glob.glob(os.path.join(config_dir, "*.json")))
+    if not paths:
+        raise ValueError(f"No course configs (.json files) found in {config_dir}")
+    return {os.path.splitext(os.path.basename(path))[0]: path for path in paths}
+
+def budgeted_config(config, time_budget):
+    """
+    Args:
+        config (dict): output of config_read.read_config
+        time_budget (float): seconds the solve may take, unless the config sets its own time limit
+
+    Returns:
+        (dict, float): copy of config whose solver time limit is its budget, and the budget
+    """
+    solver_options = dict(config["solver_options"])
+    solver_options.setdefault("time_limit", time_budget)
+    return {**config, "solver_options": solver_options}, solver_options["time_limit"]
+
+def _fetch_course(config_path):
+    """Reads and validates a course's config, then reads its sheets and latest state. Runs on a thread, as it
+    mostly waits on the Sheets and Cloud Storage APIs.
+
+    Args:
+        config_path (string): path of the course's config
+
+    Returns:
+        (dict, tuple): the config, and the output of runner.fetch_inputs
+    """
+    config = config_read.read_config(config_path)
+    validation.validate_config(config)
+    return config, runner.fetch_inputs(config)
+
+def solve_course(course_dir, config, state, demand, what_if=False):
+    """Solves one course in its own directory, so that its assignments.npy (and the warm start the next run takes
+    from it), metrics.json and exports don't collide with other courses'. Its output, and the traceback if it
+    fails, go to run.log there. Meant to run in a worker process, as it changes the working directory.
+
+    Args:
+        course_dir (string): absolute path of the course's output directory
+        config (dict): the course's config, with its time budget as its solver time limit
+        state (State.State): the upcoming week's state
+        demand (np.ndarray): OH demand for every week
+        what_if (bool, optional): only schedule the staff members who changed since the last run in course_dir
+        again (see runner.main). Defaults to False.
+
+    Returns:
+        (float, string): solve time, and the engine's status from metrics.json (None if it wrote none this run)
+    """
+    os.makedirs(course_dir, exist_ok=True)
+    os.chdir(course_dir)
+    started = time.time()
+    start = perf_counter()
+    with open("run.log", "w") as log, contextlib.redirect_stdout(log):
+        try:
+            runner.solve(config, state, demand, runner.load_previous_state() if what_if else None)
+        except Exception:
+            traceback.print_exc(file=log)
+            raise
+    elapsed = perf_counter() - start
+    return elapsed, read_metrics(course_dir, started).get("status")
+
+def read_metrics(course_dir, since):
+    """
+    Args:
+        course_dir (string): a course's output directory
+        since (float): time (time.time()) the run started
+
+    Returns:
+        dict: the metrics.json in course_dir if it was written since, or {} if the run wrote none. A metrics.json
+        from an earlier run isn't this run's.
+    """
+    path = os.path.join(course_dir, "metrics.json")
+    try:
+        if os.path.getmtime(path) < since:
+            return {}
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+def error_summary(e):
+    """
+    Args:
+        e (Exception): error of a course
+
+    Returns:
+        string: its type and the first line of its message
+    """
+    return "".join(traceback.format_exception_only(type(e), e)).strip().splitlines()[0]
+
+def run_batch(config_dir, output_dir=DEFAULT_OUTPUT_DIR, workers=None, fetch_workers=None, time_budget=DEFAULT_TIME_BUDGET):
+    """Runs runner.main for every course in a directory of configs in one go. Courses' inputs are fetched
+    concurrently on a thread pool, and each course is solved as soon as its inputs arrive, on a pool of at most
+    workers processes. A course that fails to fetch or solve is recorded and doesn't stop the others, so the whole
+    batch takes about as long as its slowest course when there are enough workers.
+
+    Each course's solve is budgeted through its solver time limit: the solver returns its best schedule when it runs
+    out. Courses whose solve took longer than their budget are flagged in the summary.
+
+    Args:
+        config_dir (string): directory with one config.json-style file per course (see read_course_configs)
+        output_dir (string, optional): where each course's results go, in a directory named after its config. The
+        summary of the batch is saved there as SUMMARY_FILE. Defaults to DEFAULT_OUTPUT_DIR.
+        workers (int, optional): number of solver processes. Defaults to None (# of CPUs).
+        fetch_workers (int, optional): number of fetching threads. Defaults to None (one per course).
+        time_budget (float, optional): seconds each solve may take, for courses whose config doesn't set
+        solver_options["time_limit"]. Defaults to DEFAULT_TIME_BUDGET.
+
+    Returns:
+        pd.DataFrame: one row per course with its status ("solved", "fetch failed", "solve failed" or "finished"
+        when every week has already been run), the engine's status, fetch and solve time, budget, whether it went
+        over budget, its output directory and the first line of its error, if any (solve errors are in full in
+        the course's run.log)
+    """
+    courses = read_course_configs(config_dir)
+    output_dir = os.path.abspath(output_dir)
+    os.makedirs(output_dir, exist_ok=True)
+    workers = min(workers or os.cpu_count() or 1, len(courses))
+    print(f"Running {len(courses)} courses on {workers} workers...")
+
+    results = {course: {"course": course, "status": None, "engine_status": None, "fetch_time": None, "solve_time": None,
+                        "time_budget": None, "over_budget": None, "output_dir": os.path.join(output_dir, course), "error": None}
+               for course in courses}
+    start = perf_counter()
+    # Spawned workers don't inherit the fetching threads or the Google clients they hold
+    with ThreadPoolExecutor(max_workers=fetch_workers or len(courses)) as fetcher, \
+         ProcessPoolExecutor(max_workers=workers, mp_context=get_context("spawn")) as solver_pool:
+        fetches = {fetcher.submit(_fetch_course, path): course for course, path in courses.items()}
+        solves = {}
+        for future in as_completed(fetches):
+            course = fetches[future]
+            result = results[course]
+            result["fetch_time"] = perf_counter() - start
+            try:
+                config, fetched = future.result()
+            except Exception as e:
+                print(f"{course}: fetching inputs failed: {e}")
+                result.update(status="fetch failed", error=error_summary(e))
+                continue
+            if fetched is None:
+                print(f"{course}: every week has already been run")
+                result["status"] = "finished"
+                continue
+            config, result["time_budget"] = budgeted_config(config, time_budget)
+            print(f"{course}: inputs fetched, solving with a budget of {result['time_budget']:.0f}s")
+            solves[solver_pool.submit(solve_course, result["output_dir"], config, *fetched)] = course
+
+        for future in as_completed(solves):
+            course = solves[future]
+            result = results[course]
+            try:
+                result["solve_time"], result["engine_status"] = future.result()
+            except Exception as e:
+                print(f"{course}: solving failed: {e}")
+                result.update(status="solve failed", error=error_summary(e))
+                continue
+            result.update(status="solved", over_budget=result["solve_time"] > result["time_budget"])
+            print(f"{course}: {result['engine_status']} in {result['solve_time']:.2f}s")
+
+    print(f"Batch finished in {perf_counter() - start:.2f}s")
+    with open(os.path.join(output_dir, SUMMARY_FILE), "w") as f:
+        json.dump(list(results.values()), f, indent=2)
+    return pd.DataFrame(data=list(results.values()))
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Run the scheduler for every course config in a directory.")
+    parser.add_argument("config_dir", help="directory with one config.json-style file per course")
+    parser.add_argument("--output-dir", default=DEFAULT_OUTPUT_DIR, help=f"where results go (default: {DEFAULT_OUTPUT_DIR})")
+    parser.add_argument("--workers", type=int, default=None, help="number of solver processes (default: # of CPUs)")
+    parser.add_argument("--fetch-workers", type=int, default=None, help="number of fetching threads (default: one per course)")
+    parser.add_argument("--time-budget", type=float, default=DEFAULT_TIME_BUDGET,
+                        help=f"seconds per solve for courses without a solver time limit (default: {DEFAULT_TIME_BUDGET})")
+    args = parser.parse_args()
+
+    results = run_batch(args.config_dir, args.output_dir, args.workers, args.fetch_workers, args.time_budget)
+    print(results.to_string(index=False))
+    if results["status"].isin(["fetch failed", "solve failed"]).any():
+        raise SystemExit("Some courses failed.")
@@ -0,0 +1,328 @@
+import argparse
+import contextlib
+import json
+import os
+import resource
+import tempfile
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+from scipy.optimize import linprog
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from time import perf_counter
+import engines
+import grid
+import problem_cache
+
+# Synthetic problems the suite runs on. weeks is the number of future weeks, past_weeks the look-behind depth of 3.5
+# and density the fraction of slots each staff member is available for. Scenarios are on grid.DEFAULT_GRID unless
+# they give the arguments of another grid.TimeGrid.
+SCENARIOS = {
+    "tiny":       {"staff": 20,   "weeks": 1,  "past_weeks": 1, "density": 0.5},
+    "small":      {"staff": 50,   "weeks": 4,  "past_weeks": 2, "density": 0.5},
+    "sparse":     {"staff": 100,  "weeks": 4,  "past_weeks": 2, "density": 0.2},
+    "dense":      {"staff": 100,  "weeks": 4,  "past_weeks": 2, "density": 0.8},
+    "lookbehind": {"staff": 100,  "weeks": 4,  "past_weeks": 8, "density": 0.5},
+    "long":       {"staff": 100,  "weeks": 16, "past_weeks": 2, "density": 0.5},
+    "horizon":    {"staff": 100,  "weeks": 16, "past_weeks": 2, "density": 0.5, "horizon_weeks": 4},
+    "medium":     {"staff": 300,  "weeks": 8,  "past_weeks": 2, "density": 0.5},
+    "large":      {"staff": 1000, "weeks": 8,  "past_weeks": 4, "density": 0.5},
+    "xlarge":     {"staff": 1000, "weeks": 16, "past_weeks": 4, "density": 0.5},
+    "finals":     {"staff": 100,  "weeks": 4,  "past_weeks": 2, "density": 0.5,
+                   "grid": {"days": 7, "slot_minutes": 30, "slots_per_day": 24}},
+}
+
+# Scenarios run by each suite
+SUITES = {
+    "quick": ["tiny", "small", "sparse", "dense", "lookbehind"],
+    "scaling": ["small", "long", "horizon", "finals", "medium", "large"],
+    "full": list(SCENARIOS),
+}
+
+# Where baselines are stored, keyed "scenario/engine", with the calibration time of the machine they were recorded on
+# under CALIBRATION_KEY.
+#
+# Baselines are recorded on one machine and checked on others. Statuses and objective values only depend on the
+# inputs, the engines and the pinned solver stack, so they have to match (objectives to OBJECTIVE_TOLERANCE). Times
+# are scaled by how long calibrate() takes here relative to the baseline machine before they are compared. Peak memory
+# is mostly the interpreter and its libraries, which differ in size between platforms, so it gets a generous tolerance.
+BASELINES_PATH = "benchmark_baselines.json"
+CALIBRATION_KEY = "calibration"
+
+# How much more time and memory than its baseline a run can take before it is flagged, as (relative, absolute)
+# increase: whichever is larger. The absolute part keeps timer and allocator noise on small scenarios from being flagged.
+RESOURCE_TOLERANCE = {"time": (0.5, 1.0), "peak_memory_mb": (0.5, 50)}
+
+# Relative difference in objective value from its baseline that is put down to floating point rounding
+OBJECTIVE_TOLERANCE = 1e-6
+
+# Solver options of every run, unless given
+DEFAULT_SOLVER_OPTIONS = {"gap": 1e-4, "time_limit": 600}
+
+# Seed of the engines that take one (see engines.ENGINE_OPTIONS), unless given, so that their objective values can
+# be compared against their baselines
+BENCHMARK_SEED = 0
+
+
+def synthetic_inputs(staff, weeks, past_weeks, density, new_staff=0.05, seed=0, time_grid=grid.DEFAULT_GRID):
+    """Generates algorithm inputs shaped like State.get_algo_inputs(), without any sheets or saved states.
+
+    Staff have weekly targets of 1 to 5 hours, rate the slots they are available for 1 to 4 with lower ratings more
+    likely, and worked about their target in random available slots of each past week. Demand is highest in the
+    afternoon and adds up to about the staff's weekly hours.
+
+    Args:
+        staff (int): # of staff
+        weeks (int): # of future weeks, including the upcoming one
+        past_weeks (int): # of past weeks of assignments
+        density (float): fraction of slots each staff member is available for
+        new_staff (float, optional): fraction of staff who joined this week (not day one staff). Defaults to 0.05.
+        seed (int, optional): random seed. Defaults to 0.
+        time_grid (grid.TimeGrid, optional): grid of the week. Defaults to grid.DEFAULT_GRID.
+
+    Returns:
+        list: algorithm inputs (see State.get_algo_inputs)
+    """
+    rng = np.random.default_rng(seed)
+    m_day_ones = staff - int(staff * new_staff)
+    S, day_slots = time_grid.size, time_grid.slots_per_day
+
+    # Hour quantities are in slots of the grid, as in State.get_algo_inputs
+    weekly_target_hours = rng.choice([1, 2, 2, 3, 3, 4, 5], size=staff) * time_grid.slots_per_hour
+    max_contiguous_hours = weekly_target_hours * 2
+    preferred_contiguous_hours = rng.integers(1, 4, size=staff) * time_grid.slots_per_hour
+
+    available = rng.random((staff, S)) < density
+    availabilities = np.where(available, rng.choice([1, 1, 2, 2, 3, 4], size=(staff, S)), 5).reshape(staff, *time_grid.shape)
+
+    # Afternoon-heavy demand, scaled so the weekly demand is about the staff's weekly hours
+    profile = np.tile(np.interp(np.linspace(0, 11, day_slots), [0, 5, 8, 11], [0.5, 1.5, 1.2, 0.3]), len(time_grid.days))
+    has_demand = rng.random((weeks, S)) < 0.6
+    mean = weekly_target_hours.sum() * profile / (profile.sum() * 0.6)
+    demand = (rng.poisson(mean, size=(weeks, S)) * has_demand).reshape(weeks, *time_grid.shape)
+
+    # Each past week, every day one staff member worked about their target in random available slots
+    scores = rng.random((m_day_ones, past_weeks, S)) * available[:m_day_ones, None, :]
+    rank = np.argsort(np.argsort(-scores, axis=2), axis=2)
+    previous = ((rank < weekly_target_hours[:m_day_ones, None, None]) & (scores > 0)).astype(int).reshape(m_day_ones, past_weeks, *time_grid.shape)
+
+    return [
+        demand,
+        previous,
+        availabilities,
+        max_contiguous_hours,
+        weekly_target_hours * weeks,
+        weekly_target_hours,
+        preferred_contiguous_hours,
+        rng.random(m_day_ones) * 0.5,
+        np.arange(m_day_ones, staff),
+    ]
+
+def _run_case(scenario, engine, solver, solver_options, engine_options):
+    """Runs one engine on one scenario in a scratch directory. Meant to run in its own process, so that its peak
+    memory is its own and nothing is cached from earlier cases.
+
+    Args:
+        scenario (string): key of SCENARIOS
+        engine (string): key of engines.ENGINES
+        solver (string): MILP solver
+        solver_options (dict): see solvers.solve_kwargs
+        engine_options (dict): options of the engine (see engines.ENGINE_OPTIONS). Randomized engines get
+        BENCHMARK_SEED unless it sets a seed.
+
+    Returns:
+        dict: status, objective value, total time, peak memory and the phase times from the engine's metrics
+    """
+    if "seed" in engines.ENGINE_OPTIONS[engine]:
+        engine_options = {"seed": BENCHMARK_SEED, **engine_options}
+    params = dict(SCENARIOS[scenario])
+    horizon_weeks = params.pop("horizon_weeks", None)
+    time_grid = grid.TimeGrid.from_config(params.pop("grid", {}))
+    inputs = synthetic_inputs(**params, time_grid=time_grid)
+
+    result = {"status": None, "objective": None, "time": None, "peak_memory_mb": None}
+    # Time the full pipeline, without writing templates and schedules to the on-disk cache
+    problem_cache.configure(None)
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as scratch:
+        # Engines save assignments.npy and metrics.json to the working directory
+        os.chdir(scratch)
+        try:
+            start = perf_counter()
+            try:
+                with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+                    engines.ENGINES[engine](inputs, horizon_weeks, None, solver, solver_options, **engine_options)
+            except Exception as e:
+                result["status"] = f"error: {e}"
+            result["time"] = perf_counter() - start
+            if os.path.exists("metrics.json"):
+                with open("metrics.json") as f:
+                    metrics = json.load(f)
+                result["status"] = result["status"] or metrics["status"]
+                result["objective"] = metrics["objective"]
+                result.update({f"time_{phase}": seconds for phase, seconds in metrics["phase_times"].items()})
+        finally:
+            os.chdir(cwd)
+
+    # ru_maxrss is in kilobytes on Linux. Engines with a worker pool peak in their workers, which RUSAGE_CHILDREN
+    # covers once they have exited.
+    result["peak_memory_mb"] = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+                                   resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss) / 1024
+    return result
+
+def run_benchmark(scenarios, engine_names=("milp", ), solver=None, solver_options=None, engine_options=None):
+    """Runs every engine on every scenario, each in a fresh process.
+
+    Args:
+        scenarios (list): keys of SCENARIOS
+        engine_names (list, optional): keys of engines.ENGINES. Defaults to ("milp", ).
+        solver (string, optional): MILP solver (see solvers.SOLVER_OPTIONS). Defaults to None (most preferred installed).
+        solver_options (dict, optional): see solvers.solve_kwargs. Defaults to DEFAULT_SOLVER_OPTIONS.
+        engine_options (dict, optional): options of each engine, keyed by engine. Defaults to None.
+
+    Returns:
+        pd.DataFrame: one row per scenario and engine with the scenario's parameters, status, objective value,
+        total time, peak memory (MB) and time of each phase the engine reports
+    """
+    solver_options = DEFAULT_SOLVER_OPTIONS if solver_options is None else solver_options
+    rows = []
+    for scenario in scenarios:
+        for engine in engine_names:
+            print(f"Running {engine} on {scenario}...")
+            with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as executor:
+                result = executor.submit(_run_case, scenario, engine, solver, solver_options,
+                                         (engine_options or {}).get(engine, {})).result()
+            print(f"{scenario}/{engine}: {result['status']}, objective {result['objective']}, "
+                  f"{result['time']:.2f}s, {result['peak_memory_mb']:.0f} MB")
+            rows.append({"scenario": scenario, "engine": engine, **SCENARIOS[scenario], **result})
+    return pd.DataFrame(data=rows)
+
+def calibrate(repeats=5):
+    """Times a fixed workload that doesn't depend on the engines: a dense matrix product and a sparse LP solved with
+    HiGHS, what the engines spend most of their time in. Its ratio between two machines scales baseline times from one
+    to the other.
+
+    Args:
+        repeats (int, optional): number of runs. Defaults to 5.
+
+    Returns:
+        float: seconds of the fastest run
+    """
+    rng = np.random.default_rng(BENCHMARK_SEED)
+    matrix = rng.random((500, 500))
+    A = sp.random(1500, 3000, density=0.005, random_state=rng, format="csr")
+    b, c = rng.random(1500) * 10, -rng.random(3000)
+    best = np.inf
+    for _ in range(repeats):
+        start = perf_counter()
+        matrix @ matrix
+        linprog(c, A_ub=A, b_ub=b, bounds=(0, 1), method="highs")
+        best = min(best, perf_counter() - start)
+    return best
+
+def compare_baselines(results, baselines, calibration=None):
+    """Flags runs whose status or objective value differs from their baseline, or that take more time or memory than
+    their baseline by more than RESOURCE_TOLERANCE.
+
+    Args:
+        results (pd.DataFrame): output of run_benchmark
+        baselines (dict): baseline status, objective, time and peak memory of each run, keyed "scenario/engine"
+        calibration (float, optional): calibrate() on this machine, which baseline times are scaled by relative to
+        the baselines' own. Defaults to None (don't scale).
+
+    Returns:
+        pd.DataFrame: results with a "regression" column listing what changed, "" if nothing, None without a baseline
+    """
+    scale = 1.0
+    if calibration is not None and baselines.get(CALIBRATION_KEY):
+        scale = calibration / baselines[CALIBRATION_KEY]
+    regressions = []
+    for row in results.itertuples(index=False):
+        baseline = baselines.get(f"{row.scenario}/{row.engine}")
+        if baseline is None:
+            regressions.append(None)
+            continue
+        changed = []
+        if "status" in baseline and row.status != baseline["status"]:
+            changed.append(f"status {row.status} vs {baseline['status']}")
+        if baseline.get("objective") is not None:
+            if row.objective is None or pd.isna(row.objective):
+                changed.append("no objective")
+            elif abs(row.objective - baseline["objective"]) > OBJECTIVE_TOLERANCE * max(abs(baseline["objective"]), 1):
+                changed.append(f"objective {row.objective:.10g} vs {baseline['objective']:.10g}")
+        for measure, (relative, absolute) in RESOURCE_TOLERANCE.items():
+            value, reference = getattr(row, measure), baseline.get(measure)
+            if reference is None:
+                continue
+            if measure == "time":
+                reference *= scale
+            if value is None or pd.isna(value):
+                changed.append(f"no {measure}")
+            elif value > reference + max(relative * abs(reference), absolute):
+                changed.append(f"{measure} {value:.4g} vs {reference:.4g}")
+        regressions.append(", ".join(changed))
+    return results.assign(regression=regressions)
+
+def load_baselines(path=BASELINES_PATH):
+    """
+    Args:
+        path (string, optional): baselines file. Defaults to BASELINES_PATH.
+
+    Returns:
+        dict: stored baselines (see compare_baselines), empty if there are none
+    """
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+def save_baselines(results, calibration, path=BASELINES_PATH):
+    """Stores the status, objective value, time and peak memory of each run as its baseline, keeping the baselines of
+    runs that aren't in results, with their times scaled to this machine.
+
+    Args:
+        results (pd.DataFrame): output of run_benchmark
+        calibration (float): calibrate() on this machine
+        path (string, optional): baselines file. Defaults to BASELINES_PATH.
+    """
+    baselines = load_baselines(path)
+    if baselines.get(CALIBRATION_KEY):
+        scale = calibration / baselines[CALIBRATION_KEY]
+        for key, baseline in baselines.items():
+            if key != CALIBRATION_KEY and baseline.get("time") is not None:
+                baseline["time"] *= scale
+    baselines[CALIBRATION_KEY] = calibration
+    for row in results.itertuples(index=False):
+        baselines[f"{row.scenario}/{row.engine}"] = {
+            "status": row.status,
+            **{measure: None if pd.isna(getattr(row, measure)) else float(getattr(row, measure))
+               for measure in ("objective", *RESOURCE_TOLERANCE)},
+        }
+    with open(path, "w") as f:
+        json.dump(baselines, f, indent=2, sort_keys=True)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark the scheduling engines on synthetic inputs, fully offline.")
+    parser.add_argument("--suite", default="quick", choices=list(SUITES), help="scenarios to run (default: quick)")
+    parser.add_argument("--scenarios", nargs="+", choices=list(SCENARIOS), help="run these scenarios instead of a suite")
+    parser.add_argument("--engines", nargs="+", default=["milp"], choices=list(engines.ENGINES), help="engines to run (default: milp)")
+    parser.add_argument("--solver", default=None, help="MILP solver (default: most preferred installed)")
+    parser.add_argument("--time-limit", type=float, default=DEFAULT_SOLVER_OPTIONS["time_limit"], help="solver time limit in seconds")
+    parser.add_argument("--baselines", default=BASELINES_PATH, help=f"baselines file (default: {BASELINES_PATH})")
+    parser.add_argument("--update-baselines", action="store_true", help="store this run's results as the new baselines")
+    args = parser.parse_args()
+
+    baselines_path = os.path.abspath(args.baselines)
+    results = run_benchmark(args.scenarios or SUITES[args.suite], args.engines, args.solver,
+                            {**DEFAULT_SOLVER_OPTIONS, "time_limit": args.time_limit})
+    calibration = calibrate()
+    print(f"Calibration: {calibration:.3f}s")
+    results = compare_baselines(results, load_baselines(baselines_path), calibration)
+    print(results.to_string(index=False))
+
+    if args.update_baselines:
+        save_baselines(results, calibration, baselines_path)
+        print(f"Saved baselines to {baselines_path}")
+    elif results["regression"].fillna("").str.len().any():
+        raise SystemExit("Regressions found against the baselines.")
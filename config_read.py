@@ -25,6 +25,23 @@ def read_config(config):
             "calendar_event_name" (str): name of the calendar event that will be created
             "calendar_event_location" (str): name of the calendar event location that will be created
             "calendar_event_description" (str): description of the calendar event that will be created
+            "horizon_weeks" (int): number of upcoming weeks to schedule slot by slot. Later weeks are only
+            scheduled as total hours per staff member. 0 schedules every remaining week. default: 0
+            "solver" (str): MILP solver to use (see solvers.SOLVER_OPTIONS), or "auto" for the best installed one. default: "auto"
+            "solver_options" (dict): any of "gap" (relative MIP gap), "threads" and "time_limit" (seconds). default: {}
+            "engine" (str): how to solve the problem (see engines.ENGINES). default: "milp"
+            "engine_options" (dict): options for the engine (see engines.ENGINE_OPTIONS). default: {}
+            "presolve_relax" (bool): let slots with fewer available staff than their minimum through presolve and
+            relax them to the available staff, instead of stopping. default: false
+            "grid" (dict): time grid of the availabilities form, demand sheet and calendar events: any of "days" (from
+            Monday), "start" (e.g. "9:00 AM"), "slot_minutes" and "slots_per_day" (see grid.TimeGrid). default: {}
+            (Monday to Friday, 12 hourly slots from 9:00 AM)
+            "cache_dir" (str): directory of the on-disk cache of problem templates and optimal schedules (see
+            problem_cache), relative to the working directory. "" turns the cache off. default: ".problem_cache"
+            "cache_size_mb" (float): size cap of the cache in MB. Least recently used entries are evicted past it. default: 2048
+            "deadline" (float): seconds the engine may take in all. Past it, the best schedule so far is used, or the
+            fallback engines are tried if there is none (see engines.run_with_deadline). 0 means no deadline. default: 0
+            "fallback_engines" (list): engines to try in order when the engine finds no schedule before the deadline. default: ["rounding", "flow"]
         }
     """
     f = open(config)
@@ -33,10 +50,33 @@ def read_config(config):
 
     if "weekly_hour_multiplier" not in data:
         data["weekly_hour_multiplier"] = 2
+    if "horizon_weeks" not in data:
+        data["horizon_weeks"] = 0
+    if "solver" not in data:
+        data["solver"] = "auto"
+    if "solver_options" not in data:
+        data["solver_options"] = {}
+    if "engine" not in data:
+        data["engine"] = "milp"
+    if "engine_options" not in data:
+        data["engine_options"] = {}
+    if "presolve_relax" not in data:
+        data["presolve_relax"] = False
+    if "grid" not in data:
+        data["grid"] = {}
+    if "cache_dir" not in data:
+        data["cache_dir"] = ".problem_cache"
+    if "cache_size_mb" not in data:
+        data["cache_size_mb"] = 2048
+    if "deadline" not in data:
+        data["deadline"] = 0
+    if "fallback_engines" not in data:
+        data["fallback_engines"] = ["rounding", "flow"]
     
     data["weeks"] = int(data["weeks"])
     data["weekly_hour_multiplier"] = int(data["weekly_hour_multiplier"])
     data["weeks_skipped"] = int(data["weeks_skipped"])
+    data["horizon_weeks"] = int(data["horizon_weeks"])
 
     return data
 
@@ -0,0 +1,246 @@
+import os
+import sys
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from time import perf_counter
+import algorithm
+import heuristics
+import solvers
+
+# Maximum number of subgradient iterations
+DEFAULT_ITERATIONS = 30
+
+# Initial scale of the Polyak step. It is halved whenever the lower bound hasn't improved for STALL_ITERATIONS iterations.
+INITIAL_STEP_SCALE = 2.0
+STALL_ITERATIONS = 3
+
+# Relative gap between the best schedule and the lower bound at which to stop, unless solver_options has a "gap"
+DEFAULT_GAP = 1e-3
+
+# State of a worker process: the inputs, and the data and relaxed template of each chunk of staff it has solved
+_worker = {}
+
+
+def _init_worker(inputs, horizon_weeks, solver, solver_options, chunks, quiet=True):
+    """Stores what every subproblem needs in the worker process, so that each task only carries prices.
+
+    Args:
+        inputs (list): output of State.get_algo_inputs()
+        horizon_weeks (int): see algorithm.run_algorithm
+        solver (string): MILP solver for the subproblems
+        solver_options (dict): see solvers.solve_kwargs
+        chunks (list): sorted staff indices of each subproblem
+        quiet (bool, optional): silence the per-template output of the worker. Defaults to True.
+    """
+    if quiet:
+        sys.stdout = open(os.devnull, "w")
+    _worker.update(inputs=inputs, horizon_weeks=horizon_weeks, solver=solver, solver_options=solver_options,
+                   chunks=chunks, templates={})
+
+def _solve_chunk(chunk_id, slot_prices):
+    """Solves the relaxed problem of one chunk of staff. The template is built the first time a chunk is seen
+    and reused (and warm started) in later iterations.
+
+    Args:
+        chunk_id (int): index of the chunk in _worker["chunks"]
+        slot_prices (np.ndarray): (n * # of slots per week, ) price of an assignment in each slot
+
+    Raises:
+        RuntimeError: The solver did not find a solution
+
+    Returns:
+        (int, np.ndarray, float): chunk_id, value of each of the chunk's cells, and the relaxed objective value. The
+        values and objective value are None if the deadline in the solver options passed before the chunk was solved.
+    """
+    if solvers.past_deadline(_worker["solver_options"]):
+        return chunk_id, None, None
+    if chunk_id not in _worker["templates"]:
+        data = algorithm.AlgoData(algorithm.subset_inputs(_worker["inputs"], _worker["chunks"][chunk_id]), _worker["horizon_weeks"])
+        template = algorithm.ScheduleTemplate(data, _worker["solver"], relax_slots=True) if data.cells.size else None
+        _worker["templates"][chunk_id] = (data, template)
+    data, template = _worker["templates"][chunk_id]
+
+    if template is None:
+        # Nothing to assign: only the hour targets contribute
+        terms = heuristics.objective_terms(data, np.zeros(0))
+        return chunk_id, np.zeros(0), terms["3.1"] + terms["3.2"] + terms["3.5"]
+
+    template.slot_price.value = slot_prices[data.cell_week * data.slots + data.cell_slot]
+    solvers.solve(template.prob, _worker["solver"], _worker["solver_options"], warm_start=template.A.value is not None)
+    if template.A.value is None:
+        raise RuntimeError(f"Subproblem {chunk_id} did not solve. Status: {template.prob.status}")
+    return chunk_id, np.rint(template.A.value), template.prob.value
+
+def slot_master(data, slot_prices):
+    """Solves the slot side of the relaxation: for each slot, the number of staff Y between its 2.1/2.3 minimum and
+    its supply that minimizes its 3.3 term minus its price times Y.
+
+    Args:
+        data (algorithm.AlgoData): full problem data
+        slot_prices (np.ndarray): (n * # of slots per week, ) price of an assignment in each slot
+
+    Returns:
+        (np.ndarray, float): (n * # of slots per week, ) best Y for each slot (0 for slots without demand), and the total value
+    """
+    demand_slots = np.flatnonzero(data.demand != 0)
+    low, high = data.required_staff()[demand_slots], data.supply[demand_slots]
+    demand, prices = data.demand[demand_slots], slot_prices[demand_slots]
+
+    # The cost is piecewise linear in Y with its breakpoint at the demand, so the best Y is a bound or the demand
+    candidates = np.stack([low, np.clip(demand, low, high), high]) # shape: (3, # of slots with demand)
+    cost = algorithm.U_3_3 * np.abs(demand - candidates) - prices * candidates
+    best = np.argmin(cost, axis=0)
+
+    Y = np.zeros(data.n * data.slots)
+    Y[demand_slots] = candidates[best, np.arange(demand_slots.size)]
+    return Y, cost[best, np.arange(demand_slots.size)].sum()
+
+def run_decomposition(inputs, horizon_weeks=None, previous_solution=None, solver=None, solver_options=None, relax=False,
+                      iterations=DEFAULT_ITERATIONS, workers=None, chunk_size=None):
+    """Schedules the upcoming weeks by Lagrangian relaxation of the slot coupling constraints.
+
+    Staff members only interact through the slot constraints 2.1/2.3 and term 3.3. Those are moved into a
+    per-slot master problem, tied to the staff side by a price per slot. The staff side then separates into one
+    small MILP per chunk of staff, which are solved in parallel on a process pool. Prices are updated with
+    subgradient steps, and each iteration's staff solutions are repaired into a schedule with heuristics.repair.
+    The best schedule found is returned along with how far it can be from optimal.
+
+    Args:
+        inputs (list): output of State.get_algo_inputs()
+        horizon_weeks (int, optional): see algorithm.run_algorithm. Defaults to None.
+        previous_solution (np.ndarray, optional): unused, accepted for compatibility with algorithm.run_algorithm. Defaults to None.
+        solver (string, optional): MILP solver for the subproblems (see solvers.SOLVER_OPTIONS). Defaults to None (most preferred installed).
+        solver_options (dict, optional): options for the subproblem solves. "gap" is also the gap at which to stop, and
+            the iterations stop once the "deadline" has passed. Defaults to None.
+        relax (bool, optional): see algorithm.run_algorithm. Defaults to False.
+        iterations (int, optional): maximum number of subgradient iterations. Defaults to DEFAULT_ITERATIONS.
+        workers (int, optional): number of worker processes. 1 solves in this process. Defaults to None (# of CPUs).
+        chunk_size (int, optional): number of staff members per subproblem. Defaults to None (spread evenly over the workers).
+
+    Raises:
+        RuntimeError: No iteration could be repaired into a schedule that satisfies the hard constraints
+
+    Returns:
+        np.ndarray: (# of all staff, # of days, # of slots per day) assignments for the upcoming week. The assignments for every
+        scheduled week, shape (# of all staff, # of scheduled weeks, # of days, # of slots per day), are saved to assignments.npy, and
+        the run's metrics to algorithm.METRICS_PATH.
+    """
+    data = algorithm.AlgoData(inputs, horizon_weeks, relax=relax)
+    m, n = data.m, data.n
+
+    print("Setting up decomposition...")
+    if not data.cells.size:
+        print("No staff member is available for any slot with demand. Nothing to schedule.")
+        return np.zeros((m, *data.grid_shape))
+
+    solver = solvers.resolve_solver(solver)
+    solver_options = solver_options or {}
+    workers = workers or os.cpu_count() or 1
+    chunk_size = chunk_size or int(np.ceil(m / workers))
+    chunks = [np.arange(start, min(start + chunk_size, m)) for start in range(0, m, chunk_size)]
+    # Cells are ordered by staff in both the full and the chunk problems, so each chunk's cells are in order here
+    positions = [np.flatnonzero((data.cell_staff >= chunk[0]) & (data.cell_staff <= chunk[-1])) for chunk in chunks]
+    print(f"Splitting {m} staff into {len(chunks)} subproblems on {workers} workers")
+
+    gap_tolerance = solver_options.get("gap", DEFAULT_GAP)
+    init_args = (inputs, horizon_weeks, solver, solver_options, chunks)
+    if workers > 1:
+        executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=init_args)
+        solve_chunks = lambda prices: executor.map(_solve_chunk, range(len(chunks)), repeat(prices))
+    else:
+        executor = None
+        _init_worker(*init_args, quiet=False)
+        solve_chunks = lambda prices: map(_solve_chunk, range(len(chunks)), repeat(prices))
+
+    slot_prices = np.zeros(n * data.slots)
+    slot = data.cell_week * data.slots + data.cell_slot
+    best_values, best_value, best_bound, gap = None, np.inf, -np.inf, None
+    step_scale, stall = INITIAL_STEP_SCALE, 0
+    # Seconds over all iterations spent solving the subproblems, the slot master, and repairing and improving schedules
+    phase_times = {"subproblems": 0.0, "master": 0.0, "repair": 0.0}
+    start = perf_counter()
+    try:
+        for iteration in range(iterations):
+            phase_start = perf_counter()
+            values = np.zeros(data.cells.size)
+            bound = 0
+            results = list(solve_chunks(slot_prices))
+            phase_times["subproblems"] += perf_counter() - phase_start
+            if any(chunk_values is None for _, chunk_values, _ in results):
+                # Some chunks were skipped, so the iteration has neither a schedule nor a bound
+                print(f"Iteration {iteration}: deadline reached")
+                break
+            for chunk_id, chunk_values, chunk_value in results:
+                values[positions[chunk_id]] = chunk_values
+                bound += chunk_value
+            phase_start = perf_counter()
+            Y, master_value = slot_master(data, slot_prices)
+            bound += master_value
+            phase_times["master"] += perf_counter() - phase_start
+
+            if bound > best_bound:
+                best_bound, stall = bound, 0
+            else:
+                stall += 1
+                if stall >= STALL_ITERATIONS:
+                    step_scale, stall = step_scale / 2, 0
+
+            phase_start = perf_counter()
+            repaired, feasible = heuristics.repair(data, values)
+            if feasible:
+                repaired = heuristics.improve(data, repaired)
+                value = heuristics.objective_value(data, repaired)
+                if value < best_value:
+                    best_values, best_value = repaired, value
+            phase_times["repair"] += perf_counter() - phase_start
+
+            # There is no gap until a repair has found a schedule
+            if np.isfinite(best_value):
+                gap = (best_value - best_bound) / max(abs(best_value), 1)
+            print(f"Iteration {iteration}: lower bound {best_bound:.2f}, best schedule {best_value:.2f}, "
+                  f"gap {'n/a' if gap is None else f'{gap:.2%}'}")
+            if gap is not None and gap <= gap_tolerance:
+                break
+            if solvers.past_deadline(solver_options):
+                print("Deadline reached")
+                break
+
+            # Subgradient of the dual: how far each slot's assigned staff is from the master's count
+            subgradient = np.bincount(slot, weights=values, minlength=n * data.slots) - Y
+            norm = subgradient @ subgradient
+            if norm == 0:
+                break
+            target = best_value if np.isfinite(best_value) else bound + abs(bound) * 0.1 + 1
+            slot_prices = slot_prices + step_scale * (target - bound) / norm * subgradient
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    print(f"Time elapsed: {perf_counter() - start}")
+    metrics = {
+        "engine": "decomposition",
+        "status": "infeasible" if best_values is None else "feasible",
+        "objective": None if best_values is None else best_value,
+        "staff": m,
+        "weeks": data.week_of.size,
+        "scheduled_weeks": n,
+        "cells": data.cells.size,
+        "size": {"subproblems": len(chunks), "workers": workers},
+        "phase_times": phase_times,
+        "iterations": iteration + 1,
+        "lower_bound": best_bound,
+        "gap": None if gap is None else float(gap),
+        "terms": None,
+    }
+    if best_values is None:
+        algorithm.save_metrics(metrics)
+        raise RuntimeError("Decomposition did not find a schedule that satisfies the hard constraints.")
+    print(f"Decomposition objective value: {best_value} (lower bound {best_bound}, gap {gap:.2%})")
+
+    phase_start = perf_counter()
+    metrics["terms"] = heuristics.objective_terms(data, best_values)
+    assignments = algorithm.save_assignments(data, best_values)
+    phase_times["extraction"] = perf_counter() - phase_start
+    algorithm.save_metrics(metrics)
+    return assignments
@@ -0,0 +1,165 @@
+import numpy as np
+from time import perf_counter
+import algorithm
+import heuristics
+import solvers
+
+
+def diff_states(previous, current):
+    """Finds the staff members whose form responses changed between two states of the same week, e.g. the state the
+    last run was made from and one made from the sheets after a few staff members resubmitted the availability form.
+
+    Args:
+        previous (State.State): state the last run was made from
+        current (State.State): state of the same week made from newer sheets
+
+    Raises:
+        ValueError: The states are for different weeks, or a staff member has different indices in them
+
+    Returns:
+        dict: emails of the staff members whose "availabilities", "weekly_oh_hours" or "preferred_contiguous_hours"
+        changed, emails of "new" staff members, and whether the "demand" changed
+    """
+    if previous.week_num != current.week_num:
+        raise ValueError(f"Can't compare the state of week {previous.week_num} with the state of week {current.week_num}")
+
+    changes = {"availabilities": [], "weekly_oh_hours": [], "preferred_contiguous_hours": [], "new": []}
+    for email, staff in current.course_staff_dict.items():
+        if email not in previous.course_staff_dict:
+            changes["new"].append(email)
+            continue
+        if previous.bi_mappings[email] != current.bi_mappings[email]:
+            raise ValueError(f"{email} has index {previous.bi_mappings[email]} in the previous state and {current.bi_mappings[email]} now")
+        old = previous.course_staff_dict[email]
+        if not np.array_equal(old.availabilities, staff.availabilities):
+            changes["availabilities"].append(email)
+        if old.weekly_oh_hours != staff.weekly_oh_hours:
+            changes["weekly_oh_hours"].append(email)
+        if old.preferred_contiguous_hours != staff.preferred_contiguous_hours:
+            changes["preferred_contiguous_hours"].append(email)
+    changes["demand"] = not np.array_equal(previous.oh_demand, current.oh_demand)
+    return changes
+
+def affected_staff(changes, state):
+    """
+    Args:
+        changes (dict): output of diff_states
+        state (State.State): the newer state
+
+    Returns:
+        np.ndarray: sorted indices of the staff members to schedule again. A demand change affects everyone.
+    """
+    if changes["demand"]:
+        return np.arange(len(state.course_staff_dict))
+    emails = set(changes["availabilities"] + changes["weekly_oh_hours"] + changes["preferred_contiguous_hours"] + changes["new"])
+    return np.array(sorted(state.bi_mappings[email] for email in emails), dtype=int)
+
+def run_delta(previous_state, state, previous_solution, solver=None, solver_options=None, relax=False):
+    """Schedules the upcoming weeks again after a few staff members changed their form responses, without solving the
+    whole problem again. Only the staff members who changed (see diff_states) are scheduled again, over every slot
+    they can be assigned to. Everyone else is held fixed at their assignments from the last run, and counts towards
+    each slot's staff (see algorithm.AlgoData), so the MILP only has the changed staff members' variables.
+
+    Args:
+        previous_state (State.State): state the last run was made from
+        state (State.State): state of the same week made from newer sheets
+        previous_solution (np.ndarray): assignments.npy of the last run
+        solver (string, optional): MILP solver to use (see solvers.SOLVER_OPTIONS). Defaults to None (most preferred installed).
+        solver_options (dict, optional): "gap", "threads" and/or "time_limit" for the solver. Defaults to None.
+        relax (bool, optional): see algorithm.run_algorithm. Defaults to False.
+
+    Raises:
+        ValueError: previous_solution isn't from a run on previous_state
+        RuntimeError: The changed staff members could not be scheduled, or can't meet 2.1/2.3 in some slots with
+        everyone else held fixed and relax is off
+
+    Returns:
+        np.ndarray: (# of all staff, # of days, # of slots per day) assignments for the upcoming week. The assignments for every
+        scheduled week are saved to assignments.npy, and the run's metrics, including how much of the problem was
+        solved again, to algorithm.METRICS_PATH.
+    """
+    phase_times = {}
+    phase_start = perf_counter()
+    changes = diff_states(previous_state, state)
+    inputs = state.get_algo_inputs()
+
+    # Schedule the same weeks as the last run
+    previous_solution = np.asarray(previous_solution, dtype=float)
+    weeks = previous_solution.shape[1] if previous_solution.ndim == 4 else 0
+    data = algorithm.AlgoData(inputs, weeks)
+    m, m_previous = data.m, len(previous_state.course_staff_dict)
+    if previous_solution.shape != (m_previous, data.week_of.size, *data.grid_shape) or data.week_of.size != weeks:
+        raise ValueError(f"assignments.npy has shape {previous_solution.shape}, which isn't a run on the previous state's "
+                         f"{m_previous} staff and {data.week_of.size} scheduled weeks")
+    current = np.zeros((m, weeks, data.slots))
+    current[:m_previous] = previous_solution.reshape(m_previous, weeks, data.slots)
+
+    affected = affected_staff(changes, state)
+    held = np.setdiff1d(np.arange(m), affected)
+    print(f"Changed since the last run: {len(changes['availabilities'])} availabilities, {len(changes['weekly_oh_hours'])} weekly hours, "
+          f"{len(changes['preferred_contiguous_hours'])} contiguous hours, {len(changes['new'])} new staff"
+          + (", demand" if changes["demand"] else ""))
+    phase_start = algorithm.lap(phase_times, "diff", phase_start)
+
+    status, size, solver_stats, resolved_cells = "optimal", None, None, 0
+    if affected.size:
+        sub = algorithm.AlgoData(algorithm.subset_inputs(inputs, affected), weeks,
+                                 fixed_coverage=current[held].sum(axis=0).reshape(weeks, *data.grid_shape), relax=relax)
+        # Staff held fixed can't move to the slots the changed staff members leave short
+        understaffed = sub.understaffed_slots()
+        if understaffed.size and not relax:
+            raise RuntimeError(f"The changed staff members can't meet 2.1/2.3 in {understaffed.size} slots with everyone else "
+                               "held fixed. Schedule everyone again, or set presolve_relax to relax those slots.")
+        resolved_cells = sub.cells.size
+        if resolved_cells:
+            solver = solvers.resolve_solver(solver)
+            template = algorithm.get_template(sub, solver)
+            phase_start = algorithm.lap(phase_times, "setup", phase_start)
+
+            # Seed the solver with the changed staff members' last assignments if they are still feasible
+            initial = current[affected][:, sub.week_representatives]
+            template.A.value = initial.ravel()[sub.cells]
+            if template.H is not None:
+                template.H.value = np.minimum(template.tail_target.value, template.tail_capacity.value)
+            warm_start = all(constraint.value() for constraint in template.constraints)
+
+            print(f"Running algorithm with {solver} for {affected.size} staff members...")
+            prob = template.prob
+            phase_times["solve"] = solvers.solve(prob, solver, solver_options, warm_start)
+            print(f"Algorithm status: {prob.status}. Objective value: {prob.value}")
+            if template.A.value is None:
+                raise RuntimeError(f"Algorithm did not find a schedule for the changed staff members. Status: {prob.status}")
+            status, size, solver_stats = prob.status, template.size, solvers.solver_stats(prob)
+            current[affected] = sub.to_dense(np.rint(template.A.value)).reshape(affected.size, weeks, data.slots)
+        else:
+            current[affected] = 0
+            phase_start = algorithm.lap(phase_times, "setup", phase_start)
+    else:
+        print("No staff member changed. Keeping the last run's schedule.")
+
+    phase_start = perf_counter()
+    values = current.ravel()[data.cells]
+    terms = heuristics.objective_terms(data, values)
+    fraction = resolved_cells / data.cells.size if data.cells.size else 0
+    print(f"Re-solved {affected.size} of {m} staff members, {resolved_cells} of {data.cells.size} assignment variables ({fraction:.1%})")
+    metrics = {
+        "engine": "delta",
+        "status": status,
+        "objective": float(np.sum(list(terms.values()))),
+        "staff": m,
+        "weeks": weeks,
+        "scheduled_weeks": data.n,
+        "cells": data.cells.size,
+        "changes": changes,
+        "resolved_staff": affected.size,
+        "resolved_cells": resolved_cells,
+        "resolved_fraction": fraction,
+        "size": size,
+        "phase_times": phase_times,
+        "solver_stats": solver_stats,
+        "terms": terms,
+    }
+    assignments = algorithm.save_assignments(data, values)
+    algorithm.lap(phase_times, "extraction", phase_start)
+    algorithm.save_metrics(metrics)
+    return assignments
@@ -0,0 +1,120 @@
+import json
+import os
+from time import perf_counter
+import algorithm
+import decomposition
+import flow
+import hierarchical
+import rounding
+import solvers
+
+# Ways of solving the scheduling problem, selected by "engine" in config.json. Every engine takes the algorithm
+# inputs, horizon_weeks, previous_solution, solver, solver_options and relax, followed by its own options, and
+# returns the upcoming week's assignments after saving every scheduled week to assignments.npy.
+ENGINES = {
+    "milp": algorithm.run_algorithm,
+    "decomposition": decomposition.run_decomposition,
+    "flow": flow.run_flow,
+    "rounding": rounding.run_rounding,
+    "hierarchical": hierarchical.run_hierarchical,
+}
+
+# Options each engine accepts from "engine_options" in config.json, with their smallest allowed value
+ENGINE_OPTIONS = {
+    "milp": {"merge_tolerance": 0},
+    "decomposition": {"iterations": 1, "workers": 1, "chunk_size": 1},
+    "flow": {},
+    "rounding": {"samples": 0, "workers": 1, "seed": 0},
+    "hierarchical": {"workers": 1},
+}
+
+# Share of the time left before the deadline that each engine of a fallback chain leaves to the engines after it
+FALLBACK_RESERVE = 0.2
+
+
+def run_engine(inputs, config, previous_solution=None):
+    """Runs the engine selected in config.json. With a "deadline", runs it as an anytime solve (see run_with_deadline).
+
+    Args:
+        inputs (list): output of State.get_algo_inputs()
+        config (dict): output of config_read.read_config
+        previous_solution (np.ndarray, optional): contents of last week's assignments.npy. Defaults to None.
+
+    Returns:
+        np.ndarray: (# of all staff, # of days, # of slots per day) assignments for the upcoming week
+    """
+    if config["deadline"]:
+        return run_with_deadline(inputs, config, previous_solution)
+    engine = ENGINES[config["engine"]]
+    return engine(inputs,
+                  config["horizon_weeks"],
+                  previous_solution,
+                  config["solver"],
+                  config["solver_options"],
+                  config["presolve_relax"],
+                  **config["engine_options"])
+
+def run_with_deadline(inputs, config, previous_solution=None):
+    """Runs the engine selected in config.json, and the engines of "fallback_engines" after it until one of them finds
+    a schedule, all within config["deadline"] seconds. Each engine gets the time left before the deadline, less
+    FALLBACK_RESERVE of it for the engines after it, as solver_options["deadline"]. Engines that solve more than once
+    stop between their iterations, weeks or samples once it has passed, and each of their solves is limited to the
+    time left (see solvers.solve_kwargs), so a MILP that runs out of time returns its best schedule so far and its
+    gap. Only an engine that finds no schedule at all in its time (or fails) falls back to the next, which run with
+    their default options. Building a problem can't be interrupted, so the deadline can be overrun by that and by
+    solvers.MIN_TIME_LIMIT of a solve started at the deadline.
+
+    Args:
+        inputs (list): output of State.get_algo_inputs()
+        config (dict): output of config_read.read_config, with a nonzero "deadline"
+        previous_solution (np.ndarray, optional): contents of last week's assignments.npy. Defaults to None.
+
+    Raises:
+        RuntimeError: No engine of the chain found a schedule
+
+    Returns:
+        np.ndarray: (# of all staff, # of days, # of slots per day) assignments for the upcoming week. The metrics
+        of the engine that found it are saved to algorithm.METRICS_PATH, with its gap (None if it has no bound) and
+        the engines tried before it under "deadline".
+    """
+    start = perf_counter()
+    deadline = start + config["deadline"]
+    chain = [config["engine"]] + [engine for engine in config["fallback_engines"] if engine != config["engine"]]
+    attempts = []
+    for position, engine in enumerate(chain):
+        remaining = deadline - perf_counter()
+        time_limit = remaining if position == len(chain) - 1 else remaining * (1 - FALLBACK_RESERVE)
+        time_limit = max(time_limit, solvers.MIN_TIME_LIMIT)
+        solver_options = {**config["solver_options"], "deadline": perf_counter() + time_limit}
+        engine_options = config["engine_options"] if position == 0 else {}
+        print(f"Running the {engine} engine with {remaining:.0f}s left before the deadline...")
+
+        attempt = {"engine": engine, "time_limit": time_limit, "time": None, "error": None}
+        attempts.append(attempt)
+        attempt_start = perf_counter()
+        # A failed engine may leave its metrics behind
+        if os.path.exists(algorithm.METRICS_PATH):
+            os.remove(algorithm.METRICS_PATH)
+        try:
+            assignments = ENGINES[engine](inputs, config["horizon_weeks"], previous_solution if position == 0 else None,
+                                          config["solver"], solver_options, config["presolve_relax"], **engine_options)
+        except Exception as e:
+            attempt.update(time=perf_counter() - attempt_start, error=str(e).splitlines()[0] if str(e) else type(e).__name__)
+            print(f"The {engine} engine found no schedule: {attempt['error']}")
+            continue
+        attempt["time"] = perf_counter() - attempt_start
+        break
+    else:
+        raise RuntimeError(f"No engine found a schedule before the deadline. Tried {', '.join(chain)}.")
+
+    # Engines that return early (nothing to schedule) don't save metrics
+    metrics = {"engine": engine, "status": None, "objective": None}
+    if os.path.exists(algorithm.METRICS_PATH):
+        with open(algorithm.METRICS_PATH) as f:
+            metrics = json.load(f)
+    metrics["gap"] = metrics.get("gap")
+    metrics["deadline"] = {"seconds": config["deadline"], "elapsed": perf_counter() - start, "attempts": attempts}
+    gap = "unknown" if metrics["gap"] is None else f"{metrics['gap']:.2%}"
+    print(f"Schedule found by the {engine} engine ({metrics['status']}, gap {gap}) in {perf_counter() - start:.2f}s")
+    algorithm.save_metrics(metrics)
+    return assignments
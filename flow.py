@@ -0,0 +1,213 @@
+import numpy as np
+import scipy.sparse as sp
+from scipy.optimize import linprog
+from time import perf_counter
+import algorithm
+import heuristics
+import solvers
+
+# Capacity of arcs whose flow is only limited by the rest of the network
+UNBOUNDED = np.inf
+
+
+class _Network:
+    """Arcs of a flow network, added a batch at a time. Nodes are numbered by the caller."""
+
+    def __init__(self, nodes):
+        self.nodes = nodes
+        self.demand = np.zeros(nodes)
+        self.batches = []
+        self.arcs = 0
+
+    def add_arcs(self, u, v, capacity, cost):
+        """Adds one arc per element of the (broadcast) arguments, skipping arcs that can't carry flow.
+
+        Args:
+            u, v (np.ndarray): tail and head nodes
+            capacity (np.ndarray): capacities, or UNBOUNDED
+            cost (np.ndarray): costs per unit of flow
+
+        Returns:
+            np.ndarray: index of each added arc, or -1 for a skipped one
+        """
+        u, v, capacity, cost = np.broadcast_arrays(u, v, np.asarray(capacity, dtype=float), cost)
+        keep = capacity > 0
+        index = np.full(u.shape, -1)
+        index[keep] = self.arcs + np.arange(np.count_nonzero(keep))
+        self.arcs += np.count_nonzero(keep)
+        self.batches.append((u[keep], v[keep], capacity[keep], cost[keep]))
+        return index
+
+    def arrays(self):
+        """
+        Returns:
+            (sp.csr_array, np.ndarray, np.ndarray): (# of nodes, # of arcs) incidence matrix, with -1 at each arc's tail
+            and 1 at its head, and the arcs' capacities and costs
+        """
+        u, v, capacity, cost = (np.concatenate(column) for column in zip(*self.batches))
+        arcs = np.arange(u.size)
+        incidence = sp.csr_array((np.concatenate([-np.ones(u.size), np.ones(v.size)]),
+                                  (np.concatenate([u, v]), np.concatenate([arcs, arcs]))), shape=(self.nodes, u.size))
+        return incidence, capacity, cost
+
+def build_network(data):
+    """Builds the min-cost flow network of the scheduling problem without terms 3.5 and 3.6 and constraint 2.2.
+    Hours flow from each staff member, through the weeks they work, into the slots they are assigned to. Every
+    other term is a convex piecewise linear function of a single flow, so it is modeled with one arc per linear piece:
+
+    - source -> staff: 3.2, free up to the staff member's total target hours, U_3_2 per hour past it
+    - staff -> (staff, week): 3.1, -U_3_1 per hour up to the weekly target, U_3_1 for the one hour 2.4 allows past it
+    - staff -> (staff, tail): 3.1 for the weeks past the horizon, capped by their capacity
+    - (staff, week) -> slot: 3.4, one arc of capacity 1 per cell
+    - slot -> sink: 3.3, -U_3_3 per staff member up to the demand, U_3_3 per staff member past it. The
+      2.1/2.3 minimum is a lower bound on the flow, sent through node demands.
+
+    The arcs are built a kind at a time from arrays, since there is one per cell.
+
+    Args:
+        data (algorithm.AlgoData): data to build the network for
+
+    Returns:
+        (sp.csr_array, np.ndarray, np.ndarray, np.ndarray, np.ndarray, int): incidence matrix, capacities and costs
+        of the arcs (see _Network.arrays), demand of each node (inflow minus outflow), index of each cell's arc,
+        and the constant to add to the network's cost to get the objective
+    """
+    m, n = data.m, data.n
+    slots = n * data.slots
+    # Nodes: source, sink, staff, (staff, week), (staff, tail), slot
+    source, sink = 0, 1
+    staff = 2 + np.arange(m)
+    week = 2 + m + np.arange(m * n).reshape(m, n)
+    tail = 2 + m + m * n + np.arange(m)
+    slot = 2 + 2 * m + m * n + np.arange(slots)
+    network = _Network(2 + 2 * m + m * n + slots)
+
+    # Close the network into a circulation, so that every unit of flow is optional
+    network.add_arcs(sink, source, UNBOUNDED, 0)
+
+    target_weekly_hours = np.rint(data.target_weekly_hours).astype(int)
+    target_total_future_hours = np.rint(data.target_total_future_hours).astype(int)
+    # 3.2: max(X + H - total, 0). A negative total makes every hour cost U_3_2, plus a constant.
+    network.add_arcs(source, staff, np.maximum(target_total_future_hours, 0), 0)
+    network.add_arcs(source, staff, UNBOUNDED, algorithm.U_3_2)
+    constant = algorithm.U_3_2 * np.maximum(-target_total_future_hours, 0).sum()
+
+    # 3.1: |X_week - T| = T - X_week up to T, with 2.4 allowing one more hour
+    network.add_arcs(staff[:, None], week, target_weekly_hours[:, None], -algorithm.U_3_1)
+    network.add_arcs(staff[:, None], week, 1, algorithm.U_3_1)
+    constant += algorithm.U_3_1 * n * target_weekly_hours.sum()
+
+    if data.n_tail:
+        tail_capacity = np.rint(data.tail_capacity()).astype(int)
+        tail_target = data.n_tail * target_weekly_hours
+        network.add_arcs(staff, tail, np.minimum(tail_target, tail_capacity), -algorithm.U_3_1)
+        network.add_arcs(staff, tail, tail_capacity - tail_target, algorithm.U_3_1)
+        network.add_arcs(tail, sink, UNBOUNDED, 0)
+        constant += algorithm.U_3_1 * tail_target.sum()
+
+    # 3.4: one arc per cell
+    displeasure = np.rint(data.displeasure()).astype(int)
+    cell_arcs = network.add_arcs(week[data.cell_staff, data.cell_week], slot[data.cell_week * data.slots + data.cell_slot],
+                                 1, displeasure)
+
+    # 3.3: |d - Y| = d - Y up to d, with the 2.1/2.3 minimum forced through. Slots without cells can't get any
+    # staff, so they only add their constant.
+    demand = np.rint(data.demand).astype(int)
+    required = data.required_staff()
+    constant += algorithm.U_3_3 * demand.sum()
+    served = np.flatnonzero((demand != 0) & (data.supply > 0))
+    network.demand[slot[served]] = required[served]
+    network.demand[sink] = -required[served].sum()
+    constant -= algorithm.U_3_3 * required[served].sum()
+    network.add_arcs(slot[served], sink, demand[served] - required[served], -algorithm.U_3_3)
+    network.add_arcs(slot[served], sink, UNBOUNDED, algorithm.U_3_3)
+
+    incidence, capacity, cost = network.arrays()
+    return incidence, capacity, cost, network.demand, cell_arcs, int(constant)
+
+def run_flow(inputs, horizon_weeks=None, previous_solution=None, solver=None, solver_options=None, relax=False):
+    """Schedules the upcoming weeks as a min-cost flow, leaving out the consistency term 3.5 and the contiguity
+    constraint 2.2 and term 3.6. The flow is optimal for every other term and satisfies every other hard constraint,
+    and is found in polynomial time without a MILP solver, which makes it a quick preview or a fallback for rosters
+    the MILP is too slow on. Blocks longer than 2.2 allows are then cut with heuristics.repair.
+
+    Args:
+        inputs (list): output of State.get_algo_inputs()
+        horizon_weeks (int, optional): see algorithm.run_algorithm. Defaults to None.
+        previous_solution (np.ndarray, optional): unused, accepted for compatibility with algorithm.run_algorithm. Defaults to None.
+        solver (string, optional): unused. Defaults to None.
+        solver_options (dict, optional): only its "deadline" is used, to limit the solve to the time left. Defaults to None.
+        relax (bool, optional): see algorithm.run_algorithm. Defaults to False.
+
+    Raises:
+        RuntimeError: No flow satisfies the hard constraints, or cutting its long blocks leaves one that doesn't
+
+    Returns:
+        np.ndarray: (# of all staff, # of days, # of slots per day) assignments for the upcoming week. The assignments for every
+        scheduled week, shape (# of all staff, # of scheduled weeks, # of days, # of slots per day), are saved to assignments.npy, and
+        the run's metrics to algorithm.METRICS_PATH.
+    """
+    data = algorithm.AlgoData(inputs, horizon_weeks, relax=relax)
+    m, n = data.m, data.n
+
+    print("Setting up flow network...")
+    if not data.cells.size:
+        print("No staff member is available for any slot with demand. Nothing to schedule.")
+        return np.zeros((m, *data.grid_shape))
+
+    phase_times = {}
+    start = phase_start = perf_counter()
+    incidence, capacity, cost, demand, cell_arcs, constant = build_network(data)
+    phase_start = algorithm.lap(phase_times, "network", phase_start)
+    print(f"Flow network: {incidence.shape[0]} nodes, {incidence.shape[1]} arcs")
+    metrics = {
+        "engine": "flow",
+        "status": "infeasible",
+        "objective": None,
+        "staff": m,
+        "weeks": data.week_of.size,
+        "scheduled_weeks": n,
+        "cells": data.cells.size,
+        "size": {"nodes": incidence.shape[0], "arcs": incidence.shape[1]},
+        "phase_times": phase_times,
+        "terms": None,
+    }
+    # The incidence matrix of a network is totally unimodular, so the simplex method's vertex solution is integral.
+    # HiGHS' presolve takes several times as long as the simplex method on these LPs.
+    options = {"presolve": False}
+    remaining = solvers.time_left(solver_options)
+    if remaining is not None:
+        options["time_limit"] = max(remaining, solvers.MIN_TIME_LIMIT)
+    result = linprog(cost, A_eq=incidence, b_eq=demand, bounds=np.column_stack([np.zeros(capacity.size), capacity]),
+                     method="highs-ds", options=options)
+    if result.status != 0:
+        algorithm.lap(phase_times, "solve", phase_start)
+        algorithm.save_metrics(metrics)
+        raise RuntimeError(f"Flow engine did not find a schedule: {result.message}")
+    phase_start = algorithm.lap(phase_times, "solve", phase_start)
+    print(f"Time elapsed: {perf_counter() - start}")
+    cost = int(np.rint(result.fun))
+
+    values = np.rint(result.x[cell_arcs])
+
+    # 2.2 isn't a network constraint, so blocks that are too long are cut afterwards
+    repaired, feasible = heuristics.repair(data, values)
+    if not feasible:
+        algorithm.lap(phase_times, "repair", phase_start)
+        metrics["flow_objective"] = cost + constant
+        algorithm.save_metrics(metrics)
+        raise RuntimeError("Flow engine did not find a schedule: cutting its blocks to satisfy 2.2 broke the other hard constraints.")
+    if not np.array_equal(repaired, values):
+        print(f"Repaired {int(np.abs(repaired - values).sum())} assignments to satisfy 2.2")
+        values = heuristics.improve(data, repaired)
+    phase_start = algorithm.lap(phase_times, "repair", phase_start)
+    terms = heuristics.objective_terms(data, values)
+    print(f"Flow objective value (without 3.5 and 3.6): {cost + constant}. Objective value: {np.sum(list(terms.values()))} "
+          f"(3.5: {terms['3.5']}, 3.6: {terms['3.6']})")
+
+    assignments = algorithm.save_assignments(data, values)
+    algorithm.lap(phase_times, "extraction", phase_start)
+    metrics.update(status="feasible", objective=float(np.sum(list(terms.values()))),
+                   flow_objective=cost + constant, terms=terms)
+    algorithm.save_metrics(metrics)
+    return assignments
@@ -0,0 +1,137 @@
+import datetime
+import numpy as np
+
+# Days a week can have, in order. A grid's days are the first few of these.
+WEEKDAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+
+
+class TimeGrid:
+    """
+    The slots of a week that OH can be scheduled in: the first few days of the week, each split into equally long
+    slots starting at the same time of day. Availabilities, demand and assignments are (# of days, # of slots per day)
+    arrays laid out on this grid, and flatten day by day into (# of slots per week, ) arrays.
+
+    Staff targets are given in hours, so a slot must evenly divide an hour. The algorithm counts in slots: every hour
+    quantity in its inputs is in slots of the grid (see State.get_algo_inputs).
+    """
+
+    def __init__(self, days=5, start="9:00 AM", slot_minutes=60, slots_per_day=12):
+        """
+        Args:
+            days (int, optional): number of days in the week, starting on Monday. Defaults to 5.
+            start (str, optional): start of the first slot of each day, e.g. "9:00 AM". Defaults to "9:00 AM".
+            slot_minutes (int, optional): length of a slot in minutes. Must divide 60. Defaults to 60.
+            slots_per_day (int, optional): number of slots in each day. Defaults to 12.
+
+        Raises:
+            ValueError: The grid isn't a valid grid
+        """
+        if not 1 <= days <= len(WEEKDAYS):
+            raise ValueError(f"A week must have 1 to {len(WEEKDAYS)} days, not {days}")
+        if slot_minutes < 1 or 60 % slot_minutes:
+            raise ValueError(f"Slots must evenly divide an hour, not be {slot_minutes} minutes long")
+        start_time = datetime.datetime.strptime(start, "%I:%M %p").time()
+        if slots_per_day < 1 or start_time.hour * 60 + start_time.minute + slot_minutes * slots_per_day > 24 * 60:
+            raise ValueError(f"{slots_per_day} slots of {slot_minutes} minutes from {start} don't fit in a day")
+
+        self.days = WEEKDAYS[:days]
+        self.start = start_time
+        self.slot_minutes = slot_minutes
+        self.slots_per_day = slots_per_day
+
+    @classmethod
+    def from_config(cls, config):
+        """
+        Args:
+            config (dict): "grid" of config.json, with any of the arguments of TimeGrid
+
+        Returns:
+            TimeGrid: the grid
+        """
+        return cls(**config)
+
+    @property
+    def shape(self):
+        """(# of days, # of slots per day) shape of a week on this grid"""
+        return (len(self.days), self.slots_per_day)
+
+    @property
+    def size(self):
+        """# of slots per week"""
+        return len(self.days) * self.slots_per_day
+
+    @property
+    def slots_per_hour(self):
+        """# of slots in an hour, which converts hour targets to slots"""
+        return 60 // self.slot_minutes
+
+    def slot_start(self, date, slot):
+        """
+        Args:
+            date (datetime.date): date of the slot's day
+            slot (int): slot index into the day. slots_per_day is the end of the day's last slot.
+
+        Returns:
+            datetime.datetime: when the slot starts
+        """
+        return datetime.datetime.combine(date, self.start) + datetime.timedelta(minutes=int(self.slot_minutes * slot))
+
+    def time_label(self, slot):
+        """
+        Args:
+            slot (int): slot index into a day. slots_per_day is the end of the day's last slot.
+
+        Returns:
+            string: start time of the slot as it is written in the sheets, e.g. "9:00 AM"
+        """
+        return self.slot_start(datetime.date.min, slot).strftime("%I:%M %p").lstrip("0")
+
+    def slot_name(self, slot):
+        """
+        Args:
+            slot (int): slot index into the flattened week
+
+        Returns:
+            string: readable name of the slot, e.g. "Monday 9:00 AM"
+        """
+        day, time = divmod(slot, self.slots_per_day)
+        return f"{self.days[day]} {self.time_label(time)}"
+
+    def __eq__(self, other):
+        return isinstance(other, TimeGrid) and (self.days, self.start, self.slot_minutes, self.slots_per_day) == \
+            (other.days, other.start, other.slot_minutes, other.slots_per_day)
+
+    def __repr__(self):
+        return f"TimeGrid(days={len(self.days)}, start={self.time_label(0)!r}, slot_minutes={self.slot_minutes}, slots_per_day={self.slots_per_day})"
+
+
+# The 5 day x 12 hour grid of the availabilities form and demand sheet: Monday to Friday, 9:00 AM to 9:00 PM
+DEFAULT_GRID = TimeGrid()
+
+def regrid(values, source, target, fill=0):
+    """Lays out arrays on one grid on another, e.g. past assignments on the grid of a later week. Each slot of target
+    takes the value of the slot of source that covers its start time on the same day. Slots no slot of source covers
+    (days or times source doesn't have) get fill.
+
+    Args:
+        values (np.ndarray): (..., # of days, # of slots per day) array on source
+        source (TimeGrid): grid of values
+        target (TimeGrid): grid to lay values out on
+        fill (optional): value of slots source doesn't cover. Defaults to 0.
+
+    Returns:
+        np.ndarray: (..., # of days, # of slots per day) array on target
+    """
+    values = np.asarray(values)
+    if source == target:
+        return values
+
+    # Minutes since midnight each target slot starts at, and the source slot of the same day covering it
+    minutes = target.start.hour * 60 + target.start.minute + target.slot_minutes * np.arange(target.slots_per_day)
+    covering = (minutes - source.start.hour * 60 - source.start.minute) // source.slot_minutes
+    covered = (covering >= 0) & (covering < source.slots_per_day)
+    days = min(len(source.days), len(target.days))
+
+    regridded = np.full(values.shape[:-2] + target.shape, fill, dtype=values.dtype)
+    regridded[..., :days, covered] = values[..., :days, covering[covered]]
+    return regridded
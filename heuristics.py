@@ -0,0 +1,245 @@
+import numpy as np
+import algorithm
+
+def tail_hours(data, staff_hours, weights=None):
+    """Picks each staff member's hours past the horizon (H in algorithm.ScheduleTemplate) that minimize their
+    share of 3.1 and 3.2, given the hours they work in the scheduled weeks.
+
+    Args:
+        data (algorithm.AlgoData): data the solution is for
+        staff_hours (np.ndarray): (m, ) hours each staff member works in the scheduled weeks
+        weights (dict, optional): objective weights to use instead of those in algorithm.py (see
+        algorithm.objective_weights). Defaults to None.
+
+    Returns:
+        np.ndarray: (m, ) hours past the horizon, all zero without a horizon
+    """
+    if not data.n_tail:
+        return np.zeros(data.m)
+
+    capacity = data.tail_capacity()
+    tail_target = data.n_tail * data.target_weekly_hours
+    # Both terms are piecewise linear in H, so the best integer H is next to one of their breakpoints or a bound
+    breakpoints = np.stack([tail_target, data.target_total_future_hours - staff_hours])
+    candidates = np.concatenate([np.floor(breakpoints), np.ceil(breakpoints), np.zeros((1, data.m)), capacity[None, :]])
+    candidates = np.clip(candidates, 0, capacity[None, :]) # shape: (# of candidates, m)
+
+    weights = algorithm.objective_weights(weights)
+    cost = weights["U_3_1"] * np.abs(candidates - tail_target) + \
+           weights["U_3_2"] * np.maximum(staff_hours + candidates - data.target_total_future_hours, 0)
+    return candidates[np.argmin(cost, axis=0), np.arange(data.m)]
+
+def objective_terms(data, values, weights=None):
+    """Evaluates each term of the objective of algorithm.ScheduleTemplate for a solution, without a solver.
+
+    Args:
+        data (algorithm.AlgoData): data the solution is for
+        values (np.ndarray): (# of cells, ) value of each assignment variable
+        weights (dict, optional): objective weights to use instead of those in algorithm.py (see
+        algorithm.objective_weights). Defaults to None.
+
+    Returns:
+        dict: weighted value of each term, keyed "3.1" through "3.6"
+    """
+    m, n = data.m, data.n
+    weights = algorithm.objective_weights(weights)
+    X_slot = np.bincount(data.cell_week * data.slots + data.cell_slot, weights=values, minlength=n * data.slots)
+    X_week = np.bincount(data.cell_staff * n + data.cell_week, weights=values, minlength=m * n)
+    # Merged weeks count once per week merged into them
+    multiplicity = data.week_multiplicity
+    X = np.bincount(data.cell_staff, weights=values * multiplicity[data.cell_week], minlength=m)
+    H = tail_hours(data, X, weights)
+
+    term_3_1 = np.tile(multiplicity, m) @ np.abs(X_week - data.target_weekly_hours.repeat(n))
+    if data.n_tail:
+        term_3_1 += np.abs(H - data.n_tail * data.target_weekly_hours).sum()
+
+    # Pruned cells are never assigned, so look them up as 0
+    padded = np.append(values, 0)
+    term_3_5 = 0
+    past_cell_weights, past_constant = data.past_coefficients(weights)
+    term_3_5 += past_constant - past_cell_weights @ values
+    if data.future_rows.size:
+        term_3_5 += data.future_weights(weights) @ np.maximum(padded[data.future_current] - padded[data.future_future], 0)
+
+    blocks, block_staff, block_week = data.window_matrix(data.preferred_contig + 1)
+    term_3_6 = multiplicity[block_week] @ np.maximum(blocks @ values - data.preferred_contig[block_staff], 0)
+
+    return {
+        "3.1": weights["U_3_1"] * term_3_1,
+        "3.2": weights["U_3_2"] * np.maximum(X + H - data.target_total_future_hours, 0).sum(),
+        "3.3": weights["U_3_3"] * (multiplicity.repeat(data.slots) * np.abs(data.demand - data.coverage - X_slot))[data.demand != 0].sum(),
+        "3.4": data.displeasure(weights) @ values,
+        "3.5": term_3_5,
+        "3.6": weights["U_3_6"] * term_3_6,
+    }
+
+def objective_value(data, values, weights=None):
+    """
+    Args:
+        data (algorithm.AlgoData): data the solution is for
+        values (np.ndarray): (# of cells, ) value of each assignment variable
+        weights (dict, optional): objective weights to use instead of those in algorithm.py (see
+        algorithm.objective_weights). Defaults to None.
+
+    Returns:
+        float: objective value of algorithm.ScheduleTemplate for the solution
+    """
+    return float(np.sum(list(objective_terms(data, values, weights).values())))
+
+def repair(data, values):
+    """Greedily turns a 0/1 solution that may violate the hard constraints into one that satisfies them.
+    Assignments past a staff member's 2.2 or 2.4 limits are dropped, most displeasing first, and slots below
+    their 2.1/2.3 minimum are filled with the least displeasing available staff member who still has room
+    under 2.2 and 2.4, preferring staff members furthest below their weekly target.
+
+    Args:
+        data (algorithm.AlgoData): data the solution is for
+        values (np.ndarray): (# of cells, ) 0/1 value of each assignment variable
+
+    Returns:
+        (np.ndarray, bool): repaired values, and whether they satisfy every hard constraint
+    """
+    m, n = data.m, data.n
+    values = np.rint(values).astype(float)
+    displeasure = data.displeasure()
+    required = data.required_staff()
+    staff_week = data.cell_staff * n + data.cell_week
+    slot = data.cell_week * data.slots + data.cell_slot
+    limit = data.target_weekly_hours.repeat(n) + 1 # shape: (# of staff * # of scheduled weeks, )
+
+    X_week = np.bincount(staff_week, weights=values, minlength=m * n)
+    X_slot = np.bincount(slot, weights=values, minlength=n * data.slots)
+
+    # 2.2: drop the most displeasing assignments of every window with too many, from slots that can spare them first
+    windows, window_staff, _ = data.window_matrix(data.max_contig + 1)
+    window_limit = data.max_contig[window_staff]
+    for row in np.flatnonzero(windows @ values > window_limit):
+        window = windows.indices[windows.indptr[row]:windows.indptr[row + 1]]
+        assigned = window[values[window] > 0]
+        spare = X_slot[slot[assigned]] > required[slot[assigned]]
+        for k in assigned[np.lexsort((-displeasure[assigned], ~spare))][:assigned.size - window_limit[row]]:
+            values[k] = 0
+            X_slot[slot[k]] -= 1
+            X_week[staff_week[k]] -= 1
+
+    # 2.4: drop the most displeasing assignments of anyone over their limit, from slots that can spare them first
+    for group in np.flatnonzero(X_week > limit):
+        assigned = np.flatnonzero((staff_week == group) & (values > 0))
+        spare = X_slot[slot[assigned]] > required[slot[assigned]]
+        for k in assigned[np.lexsort((-displeasure[assigned], ~spare))][:int(X_week[group] - limit[group])]:
+            values[k] = 0
+            X_slot[slot[k]] -= 1
+        X_week[group] = limit[group]
+
+    # 2.1/2.3: fill slots below their minimum
+    cells_by_slot = np.split(np.argsort(slot, kind="stable"), np.cumsum(np.bincount(slot, minlength=n * data.slots))[:-1])
+    feasible = True
+    for s in np.flatnonzero(X_slot < required):
+        full_window = windows.T @ (windows @ values >= window_limit) > 0 # cells that would break 2.2
+        candidates = cells_by_slot[s]
+        candidates = candidates[(values[candidates] == 0) & ~full_window[candidates] & (X_week[staff_week[candidates]] < limit[staff_week[candidates]])]
+        missing = int(required[s] - X_slot[s])
+        if candidates.size < missing:
+            feasible = False
+        below_target = X_week[staff_week[candidates]] - limit[staff_week[candidates]]
+        for k in candidates[np.lexsort((below_target, displeasure[candidates]))][:missing]:
+            values[k] = 1
+            X_slot[s] += 1
+            X_week[staff_week[k]] += 1
+
+    return values, feasible
+
+def flip_deltas(data, values, H):
+    """Computes how much the objective changes if each assignment variable is flipped on its own, with the hours past
+    the horizon held at H (re-optimizing them afterwards can only lower the objective further).
+
+    Args:
+        data (algorithm.AlgoData): data the solution is for
+        values (np.ndarray): (# of cells, ) 0/1 value of each assignment variable
+        H (np.ndarray): (m, ) hours past the horizon
+
+    Returns:
+        np.ndarray: (# of cells, ) change in the objective from flipping each cell
+    """
+    m, n, num_cells = data.m, data.n, data.cells.size
+    staff_week = data.cell_staff * n + data.cell_week
+    slot = data.cell_week * data.slots + data.cell_slot
+    multiplicity = data.week_multiplicity[data.cell_week]
+    X_slot = np.bincount(slot, weights=values, minlength=n * data.slots)[slot]
+    X_week = np.bincount(staff_week, weights=values, minlength=m * n)[staff_week]
+    X = (np.bincount(data.cell_staff, weights=values * multiplicity, minlength=m) + H)[data.cell_staff]
+    change = 1 - 2 * values # +1 for cells that would be assigned, -1 for cells that would be unassigned
+
+    T = data.target_weekly_hours[data.cell_staff]
+    total = data.target_total_future_hours[data.cell_staff]
+    demand = (data.demand - data.coverage)[slot]
+    delta = algorithm.U_3_1 * multiplicity * (np.abs(X_week + change - T) - np.abs(X_week - T)) + \
+            algorithm.U_3_2 * (np.maximum(X + multiplicity * change - total, 0) - np.maximum(X - total, 0)) + \
+            algorithm.U_3_3 * multiplicity * (np.abs(demand - X_slot - change) - np.abs(demand - X_slot)) + \
+            data.displeasure() * change
+
+    # 3.5: assigning a cell saves its past weight
+    delta -= data.past_coefficients()[0] * change
+
+    # 3.5: a future row costs its weight while its current cell is assigned and its future cell isn't
+    if data.future_rows.size:
+        padded = np.append(values, 0)
+        weights = data.future_weights()
+        current, future = data.future_current, data.future_future
+        old = np.maximum(padded[current] - padded[future], 0)
+        delta += np.bincount(current, weights=weights * (np.maximum(1 - padded[current] - padded[future], 0) - old), minlength=num_cells)
+        has_future = future >= 0
+        delta += np.bincount(future[has_future], weights=(weights * (np.maximum(padded[current] - 1 + padded[future], 0) - old))[has_future],
+                             minlength=num_cells)
+
+    # 3.6: assigning a cell lengthens every block it is in, which costs wherever the block is already at its preferred
+    # length. Unassigning saves wherever the block is past it.
+    blocks, block_staff, block_week = data.window_matrix(data.preferred_contig + 1)
+    excess = blocks @ values - data.preferred_contig[block_staff]
+    block_weights = algorithm.U_3_6 * data.week_multiplicity[block_week]
+    delta += np.where(values > 0, -(blocks.T @ (block_weights * (excess >= 1))), blocks.T @ (block_weights * (excess >= 0)))
+    return delta
+
+def improve(data, values, max_passes=100):
+    """Local search on a solution that satisfies the hard constraints. Each pass flips the most improving
+    assignment of each staff member, keeping one flip per slot so that the flips don't interact, and only
+    flips that keep 2.1/2.3, 2.2 and 2.4 satisfied.
+
+    Args:
+        data (algorithm.AlgoData): data the solution is for
+        values (np.ndarray): (# of cells, ) 0/1 value of each assignment variable
+        max_passes (int, optional): maximum number of passes. Defaults to 100.
+
+    Returns:
+        np.ndarray: improved values
+    """
+    m, n = data.m, data.n
+    values = values.copy()
+    required = data.required_staff()
+    staff_week = data.cell_staff * n + data.cell_week
+    slot = data.cell_week * data.slots + data.cell_slot
+    limit = data.target_weekly_hours.repeat(n) + 1
+    windows, window_staff, _ = data.window_matrix(data.max_contig + 1)
+    window_limit = data.max_contig[window_staff]
+
+    for _ in range(max_passes):
+        X_slot = np.bincount(slot, weights=values, minlength=n * data.slots)
+        X_week = np.bincount(staff_week, weights=values, minlength=m * n)
+        H = tail_hours(data, np.bincount(data.cell_staff, weights=values * data.week_multiplicity[data.cell_week], minlength=m))
+        delta = flip_deltas(data, values, H)
+
+        full_window = windows.T @ (windows @ values >= window_limit) > 0
+        allowed = np.where(values > 0, X_slot[slot] > required[slot], (X_week[staff_week] < limit[staff_week]) & ~full_window)
+        candidates = np.flatnonzero(allowed & (delta < -1e-9))
+        if not candidates.size:
+            break
+
+        # Best candidate per staff member, then best of those per slot
+        candidates = candidates[np.argsort(delta[candidates], kind="stable")]
+        candidates = candidates[np.unique(data.cell_staff[candidates], return_index=True)[1]]
+        candidates = candidates[np.argsort(delta[candidates], kind="stable")]
+        candidates = candidates[np.unique(slot[candidates], return_index=True)[1]]
+        values[candidates] = 1 - values[candidates]
+
+    return values
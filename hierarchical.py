@@ -0,0 +1,214 @@
+import os
+import sys
+import cvxpy as cp
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from time import perf_counter
+import algorithm
+import heuristics
+import solvers
+
+# State of a worker process: the solver and its options
+_worker = {}
+
+
+def budget_hours(data, solver=None, solver_options=None):
+    """Decides how many hours each staff member works in each scheduled week, against terms 3.1 and 3.2, a per-week
+    version of 3.3 that compares the week's total hours with its total demand, and the 3.4 and past 3.5 costs of the
+    cheapest cells that could make up each budget. The last two ignore the slot constraints, so every term is a lower
+    bound on its value in the full problem. Each budget is at most the weekly target, so that the + 1 hour 2.4 allows
+    past a budget stays within 2.4, and at most the hours the staff member is available for with demand that week.
+
+    Args:
+        data (algorithm.AlgoData): data to decide budgets for
+        solver (string, optional): MILP solver. Defaults to None (most preferred installed).
+        solver_options (dict, optional): see solvers.solve_kwargs. Defaults to None.
+
+    Raises:
+        RuntimeError: The solver did not find budgets
+
+    Returns:
+        np.ndarray: (m, n) hours of each staff member in each scheduled week
+    """
+    m, n = data.m, data.n
+    T = data.target_weekly_hours.repeat(n)
+    staff_week = data.cell_staff * n + data.cell_week
+    available = np.bincount(staff_week, minlength=m * n)
+    # Demand beyond a slot's supply can't be met by any budget
+    coverable = np.minimum(data.demand, data.supply).reshape(n, data.slots).sum(axis=1)
+
+    B = cp.Variable(m * n, integer=True)       # hours of each (staff, week), flattened as staff * n + week
+    Z = cp.Variable(data.cells.size)           # cells making up the budgets, without the slot constraints
+    constraints = [B >= 0, B <= np.minimum(available, np.floor(T)),
+                   Z >= 0, Z <= 1, algorithm.incidence_matrix(staff_week, m * n) @ Z == B]
+    staff_hours = algorithm.incidence_matrix(np.arange(m).repeat(n), m) @ B
+    week_hours = algorithm.incidence_matrix(np.tile(np.arange(n), m), n) @ B
+    objective = algorithm.U_3_1 * cp.sum(cp.abs(B - T)) + \
+                algorithm.U_3_3 * cp.sum(cp.abs(week_hours - coverable)) + \
+                Z @ (data.displeasure() - data.past_coefficients()[0])
+    if data.n_tail:
+        H = cp.Variable(m, integer=True)
+        constraints += [H >= 0, H <= data.tail_capacity()]
+        objective += algorithm.U_3_1 * cp.sum(cp.abs(H - data.n_tail * data.target_weekly_hours))
+        staff_hours = staff_hours + H
+    objective += algorithm.U_3_2 * cp.sum(cp.pos(staff_hours - data.target_total_future_hours))
+
+    prob = cp.Problem(cp.Minimize(objective), constraints)
+    solvers.solve(prob, solver, solver_options)
+    if B.value is None:
+        raise RuntimeError(f"Hour budgets did not solve. Status: {prob.status}")
+    return np.rint(B.value).reshape(m, n)
+
+def week_inputs(inputs, week, budget):
+    """Builds the algorithm inputs of a single scheduled week, with budgets as the hour targets.
+
+    Args:
+        inputs (list): output of State.get_algo_inputs()
+        week (int): scheduled week
+        budget (np.ndarray): (m, ) hours of each staff member in the week
+
+    Returns:
+        list: algorithm inputs for the week on its own. Only the upcoming week keeps the past weeks of 3.5.
+    """
+    previous = np.asarray(inputs[1])
+    if week > 0 or previous.ndim < 2:
+        previous = np.zeros((inputs[3].shape[0] - inputs[8].shape[0], 0, *np.shape(inputs[0])[1:]))
+    return [np.asarray(inputs[0])[week:week + 1], previous, inputs[2], inputs[3], budget, budget,
+            inputs[6], inputs[7], inputs[8]]
+
+def _init_worker(solver, solver_options, relax, quiet=True):
+    """
+    Args:
+        solver (string): MILP solver for the weeks
+        solver_options (dict): see solvers.solve_kwargs
+        relax (bool): see algorithm.run_algorithm
+        quiet (bool, optional): silence the output of the worker. Defaults to True.
+    """
+    if quiet:
+        sys.stdout = open(os.devnull, "w")
+    _worker.update(solver=solver, solver_options=solver_options, relax=relax)
+
+def _solve_week(week, inputs, fallback_inputs):
+    """Solves the slot assignment of one week under its hour budgets. Templates are shared by weeks with the same
+    structure within a worker. If the budgets leave the week infeasible, it is solved again with the weekly
+    targets as budgets.
+
+    Args:
+        week (int): scheduled week
+        inputs (list): inputs of the week (see week_inputs)
+        fallback_inputs (list): inputs of the week with the weekly targets as budgets
+
+    Raises:
+        RuntimeError: The week is infeasible even without budgets, or the deadline in the solver options passed before
+        it could be solved
+
+    Returns:
+        (int, np.ndarray, string, float): week, (m, # of slots per week) assignments, status and solve time
+    """
+    elapsed = 0
+    for attempt in (inputs, fallback_inputs):
+        if solvers.past_deadline(_worker["solver_options"]):
+            raise RuntimeError(f"Week {week} was not solved before the deadline")
+        data = algorithm.AlgoData(attempt, relax=_worker["relax"])
+        if not data.cells.size:
+            return week, np.zeros((data.m, data.slots)), "optimal", elapsed
+        template = algorithm.get_template(data, _worker["solver"])
+        elapsed += solvers.solve(template.prob, _worker["solver"], _worker["solver_options"])
+        if template.A.value is not None:
+            return week, data.to_dense(np.rint(template.A.value)).reshape(data.m, data.slots), template.prob.status, elapsed
+        print(f"Week {week} is infeasible under its hour budgets. Solving it with the weekly targets instead.")
+    raise RuntimeError(f"Week {week} did not find a schedule. Status: {template.prob.status}")
+
+def run_hierarchical(inputs, horizon_weeks=None, previous_solution=None, solver=None, solver_options=None, relax=False,
+                     workers=None):
+    """Schedules the upcoming weeks in two levels. A small integer program first decides each staff member's hours in
+    each week (budget_hours). Each week's slots are then assigned on their own under those budgets, in parallel on a
+    process pool. The weeks' MILPs are a fraction of the size of the full one, so the time grows about linearly with
+    the number of weeks. The parts of 3.5 that compare weeks can't be seen by either level, so the combined
+    schedule is improved on the full problem with heuristics.improve at the end.
+
+    Args:
+        inputs (list): output of State.get_algo_inputs()
+        horizon_weeks (int, optional): see algorithm.run_algorithm. Defaults to None.
+        previous_solution (np.ndarray, optional): unused, accepted for compatibility with algorithm.run_algorithm. Defaults to None.
+        solver (string, optional): MILP solver for both levels (see solvers.SOLVER_OPTIONS). Defaults to None (most preferred installed).
+        solver_options (dict, optional): options for every solve. No week is started once the "deadline" has
+            passed. Defaults to None.
+        relax (bool, optional): see algorithm.run_algorithm. Defaults to False.
+        workers (int, optional): number of worker processes. 1 solves in this process. Defaults to None (# of CPUs).
+
+    Raises:
+        RuntimeError: The budgets or a week did not solve (before the deadline), or the joined weeks could not be repaired into a schedule
+        that satisfies the hard constraints
+
+    Returns:
+        np.ndarray: (# of all staff, # of days, # of slots per day) assignments for the upcoming week. The assignments for every
+        scheduled week, shape (# of all staff, # of scheduled weeks, # of days, # of slots per day), are saved to assignments.npy, and
+        the run's metrics to algorithm.METRICS_PATH.
+    """
+    data = algorithm.AlgoData(inputs, horizon_weeks, relax=relax)
+    m, n = data.m, data.n
+
+    print("Setting up hour budgets...")
+    if not data.cells.size:
+        print("No staff member is available for any slot with demand. Nothing to schedule.")
+        return np.zeros((m, *data.grid_shape))
+
+    phase_times = {}
+    phase_start = perf_counter()
+    solver = solvers.resolve_solver(solver)
+    budgets = budget_hours(data, solver, solver_options)
+    phase_start = algorithm.lap(phase_times, "budgets", phase_start)
+    print(f"Budgeted {budgets.sum():.0f} hours over {n} weeks")
+
+    workers = min(workers or os.cpu_count() or 1, n)
+    print(f"Solving {n} weeks on {workers} workers...")
+    weekly_targets = np.floor(data.target_weekly_hours)
+    tasks = ([week_inputs(inputs, week, budgets[:, week]) for week in range(n)],
+             [week_inputs(inputs, week, weekly_targets) for week in range(n)])
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(solver, solver_options, relax)) as executor:
+            results = list(executor.map(_solve_week, range(n), *tasks))
+    else:
+        _init_worker(solver, solver_options, relax, quiet=False)
+        results = list(map(_solve_week, range(n), *tasks))
+    phase_start = algorithm.lap(phase_times, "weeks", phase_start)
+
+    assignments = np.zeros((m, n, data.slots))
+    for week, week_assignments, status, elapsed in results:
+        assignments[:, week] = week_assignments
+        print(f"Week {week}: {status} in {elapsed:.3f}s")
+
+    # Join the weeks and improve the parts of the objective neither level saw
+    values, feasible = heuristics.repair(data, assignments.ravel()[data.cells])
+    metrics = {
+        "engine": "hierarchical",
+        "status": "infeasible",
+        "objective": None,
+        "staff": m,
+        "weeks": data.week_of.size,
+        "scheduled_weeks": n,
+        "cells": data.cells.size,
+        "size": {"workers": workers},
+        "phase_times": phase_times,
+        "week_statuses": [status for _, _, status, _ in results],
+        "week_solve_times": [elapsed for _, _, _, elapsed in results],
+        "terms": None,
+    }
+    if not feasible:
+        algorithm.lap(phase_times, "polish", phase_start)
+        algorithm.save_metrics(metrics)
+        raise RuntimeError("The weeks' schedules could not be joined into a schedule that satisfies the hard constraints.")
+    # improve keeps the hard constraints, so it needs a schedule that already satisfies them
+    joined_value = heuristics.objective_value(data, values)
+    values = heuristics.improve(data, values)
+    terms = heuristics.objective_terms(data, values)
+    objective = float(np.sum(list(terms.values())))
+    phase_start = algorithm.lap(phase_times, "polish", phase_start)
+    print(f"Hierarchical objective value: {objective} (before improving: {joined_value})")
+
+    metrics.update(status="feasible", objective=objective, terms=terms)
+    assignments = algorithm.save_assignments(data, values)
+    algorithm.lap(phase_times, "extraction", phase_start)
+    algorithm.save_metrics(metrics)
+    return assignments
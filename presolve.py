@@ -0,0 +1,94 @@
+import numpy as np
+import pandas as pd
+import algorithm
+import grid
+
+
+def slot_name(week, slot, time_grid=grid.DEFAULT_GRID):
+    """
+    Args:
+        week (int): week index into the future weeks (0 is the upcoming week)
+        slot (int): slot index into the flattened week
+        time_grid (grid.TimeGrid, optional): grid of the week. Defaults to grid.DEFAULT_GRID.
+
+    Returns:
+        string: readable name of the slot
+    """
+    return f"week {week}, {time_grid.slot_name(slot)}"
+
+def presolve(inputs, relax=False, staff_names=None, time_grid=grid.DEFAULT_GRID):
+    """Checks the algorithm inputs for problems that would make the MILP infeasible or unable to meet its
+    targets, before any model is built. Everything is computed with NumPy over all future weeks.
+
+    Errors:
+        - slots whose 2.1/2.3 minimum is more than the number of staff available for them. With relax, these
+          are reported as warnings instead and the MILP relaxes them to the available staff.
+        - weeks whose slot minimums add up to more hours than every available staff member together can work under 2.4
+    Warnings:
+        - staff members available for fewer hours than their weekly target in some week
+        - staff members who can't work their remaining hours in the remaining weeks
+
+    Args:
+        inputs (list): output of State.get_algo_inputs()
+        relax (bool, optional): accept understaffed slots, which the engines then relax (see algorithm.AlgoData).
+        Defaults to False.
+        staff_names (list, optional): name of each staff member for the report. Defaults to None (staff indices).
+        time_grid (grid.TimeGrid, optional): grid the inputs are laid out on. Hours in the inputs are in its slots
+        (see State.get_algo_inputs). Defaults to grid.DEFAULT_GRID.
+
+    Raises:
+        ValueError: The inputs have errors. The message lists every problem found.
+
+    Returns:
+        pd.DataFrame: one row per problem, with its severity, check, week, slot, staff member and details
+    """
+    S, hour = time_grid.size, time_grid.slots_per_hour
+    demand = np.asarray(inputs[0], dtype=float).reshape(-1, S)           # (# of future weeks, S)
+    available = np.asarray(inputs[2]).reshape(-1, S) < algorithm.UNAVAILABLE_RATING  # (# of staff, S)
+    target_total_future_hours = np.asarray(inputs[4], dtype=float)
+    target_weekly_hours = np.asarray(inputs[5], dtype=float)
+    staff_names = staff_names if staff_names is not None else [f"staff {i}" for i in range(available.shape[0])]
+
+    issues = {"severity": [], "check": [], "week": [], "slot": [], "staff": [], "detail": []}
+    def report(severity, check, week, slot, staff, detail):
+        issues["severity"].append(severity)
+        issues["check"].append(check)
+        issues["week"].append(week)
+        issues["slot"].append(slot_name(week, slot, time_grid) if slot is not None else None)
+        issues["staff"].append(staff_names[staff] if staff is not None else None)
+        issues["detail"].append(detail)
+
+    # Per slot: 2.1/2.3 minimum vs staff available
+    has_demand = demand > 0
+    supply = has_demand * available.sum(axis=0)[None, :]                 # (# of future weeks, S)
+    required = np.where(has_demand, np.maximum(demand - 3, 1), 0)
+    for week, slot in zip(*np.nonzero(required > supply)):
+        report("warning" if relax else "error", "slot supply", week, slot, None,
+               f"needs at least {required[week, slot]:.0f} staff (demand {demand[week, slot]:.0f}) but only {supply[week, slot]} are available")
+
+    # Per staff member and week: hours available vs weekly target
+    available_hours = (has_demand[None, :, :] & available[:, None, :]).sum(axis=2)  # (# of staff, # of future weeks)
+    for staff, week in zip(*np.nonzero(available_hours < target_weekly_hours[:, None])):
+        report("warning", "weekly hours", week, None, staff,
+               f"available for {available_hours[staff, week] / hour:g} hours with demand but has a weekly target of {target_weekly_hours[staff] / hour:g}")
+
+    # Per staff member: hours they can work in the remaining weeks under 2.4 vs their remaining hours
+    capacity = np.minimum(available_hours, target_weekly_hours[:, None] + 1)
+    for staff in np.flatnonzero(capacity.sum(axis=1) < target_total_future_hours):
+        report("warning", "total hours", None, None, staff,
+               f"can work at most {capacity[staff].sum() / hour:g} of their {target_total_future_hours[staff] / hour:g} remaining hours")
+
+    # Per week: hours the slots need vs hours all staff together can work
+    needed = np.minimum(required, supply).sum(axis=1)
+    for week in np.flatnonzero(needed > capacity.sum(axis=0)):
+        report("error", "weekly capacity", week, None, None,
+               f"slots need at least {needed[week] / hour:g} staff hours but staff can work at most {capacity[:, week].sum() / hour:g} under 2.4")
+
+    issues = pd.DataFrame(data=issues).astype({"week": "Int64"})
+    errors = issues[issues["severity"] == "error"]
+    if len(issues):
+        print(f"Presolve found {len(errors)} errors and {len(issues) - len(errors)} warnings:")
+        print(issues.to_string(index=False))
+    if len(errors):
+        raise ValueError(f"Presolve found {len(errors)} errors in the inputs:\n" + errors.to_string(index=False))
+    return issues
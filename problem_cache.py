@@ -0,0 +1,154 @@
+import hashlib
+import json
+import os
+import pickle
+import tempfile
+import time
+
+# Directory of the on-disk problem cache, relative to the working directory. None turns the cache off.
+CACHE_DIR = ".problem_cache"
+
+# Most bytes the cache may take on disk. Past it, the least recently used entries are evicted (see evict).
+MAX_CACHE_BYTES = 2 * 1024 ** 3
+
+# Kinds of entries: compiled problem templates, keyed by structure and solver, and solved schedules, keyed by the full
+# data of the problem, the weights, the solver and its options. Both are also keyed by the version of the model and of
+# cvxpy (see algorithm.FORMULATION_VERSION).
+KINDS = ("template", "solution")
+
+cache_stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+
+def configure(cache_dir=CACHE_DIR, max_megabytes=None):
+    """Sets where the cache is kept and how big it can get, for this process.
+
+    Args:
+        cache_dir (string, optional): cache directory. None or "" turns the cache off. Defaults to CACHE_DIR.
+        max_megabytes (float, optional): size cap in MB. Defaults to None (keep the current cap).
+    """
+    global CACHE_DIR, MAX_CACHE_BYTES
+    CACHE_DIR = cache_dir or None
+    if max_megabytes is not None:
+        MAX_CACHE_BYTES = int(max_megabytes * 1024 ** 2)
+
+def make_key(*parts):
+    """
+    Args:
+        parts: strings, or anything json can dump (e.g. solver options), identifying an entry
+
+    Returns:
+        string: hash of the parts
+    """
+    key = hashlib.sha1()
+    for part in parts:
+        key.update((part if isinstance(part, str) else json.dumps(part, sort_keys=True)).encode())
+        key.update(b"\0")
+    return key.hexdigest()
+
+def _path(kind, key):
+    return os.path.join(CACHE_DIR, f"{kind}-{key}.pkl")
+
+def load(kind, key):
+    """Reads an entry, and marks it as recently used.
+
+    Args:
+        kind (string): one of KINDS
+        key (string): key of the entry (see make_key)
+
+    Returns:
+        object: the stored object, or None if the cache is off, doesn't have it or can't read it
+    """
+    if CACHE_DIR is None:
+        return None
+    path = _path(kind, key)
+    try:
+        with open(path, "rb") as f:
+            value = pickle.load(f)
+    except FileNotFoundError:
+        cache_stats["misses"] += 1
+        return None
+    except Exception as e:
+        # A truncated or outdated entry is as good as none
+        print(f"WARNING: Couldn't read cached {kind} {key[:8]}: {e}. Dropping it.")
+        _remove(path)
+        cache_stats["misses"] += 1
+        return None
+    os.utime(path)
+    cache_stats["hits"] += 1
+    return value
+
+def store(kind, key, value):
+    """Writes an entry, then evicts least recently used entries until the cache is within MAX_CACHE_BYTES. The entry
+    is written to a temporary file and moved into place, so that concurrent runs never read half of it.
+
+    Args:
+        kind (string): one of KINDS
+        key (string): key of the entry (see make_key)
+        value (object): picklable object to store
+
+    Returns:
+        bool: whether the entry was stored. Entries larger than the cap aren't.
+    """
+    if CACHE_DIR is None:
+        return False
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    payload = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+    if len(payload) > MAX_CACHE_BYTES:
+        print(f"Not caching {kind} {key[:8]}: {len(payload) / 1024 ** 2:.1f} MB is over the cache's cap")
+        return False
+    handle, temporary = tempfile.mkstemp(dir=CACHE_DIR, suffix=".tmp")
+    with os.fdopen(handle, "wb") as f:
+        f.write(payload)
+    os.replace(temporary, _path(kind, key))
+    evict()
+    return True
+
+def evict(max_bytes=None):
+    """Eviction policy: entries are ordered by when they were last written or read (their modification time, which
+    load refreshes), and the least recently used are deleted until the cache takes at most max_bytes. Templates and
+    solutions share the cap. Leftover temporary files from interrupted writes are deleted too.
+
+    Args:
+        max_bytes (int, optional): size to shrink the cache to. Defaults to None (MAX_CACHE_BYTES).
+
+    Returns:
+        int: number of entries evicted
+    """
+    if CACHE_DIR is None or not os.path.isdir(CACHE_DIR):
+        return 0
+    max_bytes = MAX_CACHE_BYTES if max_bytes is None else max_bytes
+    entries = []
+    for name in os.listdir(CACHE_DIR):
+        path = os.path.join(CACHE_DIR, name)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            continue
+        if name.endswith(".tmp"):
+            # Another run may still be writing it
+            if stat.st_mtime < time.time() - 3600:
+                _remove(path)
+            continue
+        entries.append((stat.st_mtime, stat.st_size, path))
+
+    entries.sort()
+    total = sum(size for _, size, _ in entries)
+    evicted = 0
+    for _, size, path in entries:
+        if total <= max_bytes:
+            break
+        _remove(path)
+        total -= size
+        evicted += 1
+    cache_stats["evictions"] += evicted
+    return evicted
+
+def clear():
+    """Deletes every entry."""
+    evict(0)
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
@@ -0,0 +1,188 @@
+import os
+import sys
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from time import perf_counter
+import algorithm
+import heuristics
+import solvers
+
+# Number of rounded schedules to draw from the LP solution
+DEFAULT_SAMPLES = 16
+
+# LP values this close to 0 or 1 are taken as integral
+INTEGRALITY_TOLERANCE = 1e-6
+
+# State of a worker process: the data and the LP solution
+_worker = {}
+
+
+def dependent_round(data, fractional, rng):
+    """Rounds an LP solution to 0/1 by systematic sampling within each staff member's week. Every cell is assigned
+    with probability equal to its LP value, and each staff member's weekly hours are the LP hours rounded up or
+    down, so the 2.4 limit and the 3.1 target of the LP carry over. Cells are visited in a random order, so that
+    samples differ in which cells they pick.
+
+    Args:
+        data (algorithm.AlgoData): data the solution is for
+        fractional (np.ndarray): (# of cells, ) LP value of each assignment variable
+        rng (np.random.Generator): random number generator
+
+    Returns:
+        np.ndarray: (# of cells, ) 0/1 value of each assignment variable
+    """
+    staff_week = data.cell_staff * data.n + data.cell_week
+    order = rng.permutation(fractional.size)
+    order = order[np.argsort(staff_week[order], kind="stable")]
+    x = fractional[order]
+
+    # Running total of each staff week's LP hours, offset by a random shift per staff week. A cell is picked
+    # when its running total crosses an integer.
+    group_start = np.flatnonzero(np.diff(staff_week[order], prepend=-1))
+    cumulative = np.cumsum(x)
+    cumulative -= np.repeat(cumulative[group_start] - x[group_start], np.diff(np.append(group_start, x.size)))
+    shift = np.repeat(rng.random(group_start.size), np.diff(np.append(group_start, x.size)))
+
+    values = np.zeros(fractional.size)
+    values[order] = np.floor(cumulative + shift) - np.floor(cumulative - x + shift)
+    return np.clip(values, 0, 1)
+
+def _init_worker(inputs, horizon_weeks, relax, fractional, solver_options, quiet=True):
+    """Stores the data and LP solution in the worker process, so that each task only carries its seed.
+
+    Args:
+        inputs (list): output of State.get_algo_inputs()
+        horizon_weeks (int): see algorithm.run_algorithm
+        relax (bool): see algorithm.run_algorithm
+        fractional (np.ndarray): (# of cells, ) LP value of each assignment variable
+        solver_options (dict): see solvers.solve_kwargs. Only its "deadline" is used.
+        quiet (bool, optional): silence the output of the worker. Defaults to True.
+    """
+    if quiet:
+        sys.stdout = open(os.devnull, "w")
+    _worker.update(data=algorithm.AlgoData(inputs, horizon_weeks, relax=relax), fractional=fractional,
+                   solver_options=solver_options)
+
+def _round_sample(seed):
+    """Draws one rounding of the LP solution and repairs and improves it into a schedule.
+
+    Args:
+        seed (int): seed of the sample. None rounds the LP solution to its nearest integers instead.
+
+    Returns:
+        (np.ndarray, float, bool): values of the schedule, its objective value, and whether it satisfies every hard
+        constraint. Past the deadline in the solver options, random samples are skipped and return (None, None, False).
+    """
+    data, fractional = _worker["data"], _worker["fractional"]
+    if seed is not None and solvers.past_deadline(_worker["solver_options"]):
+        return None, None, False
+    if seed is None:
+        values = np.rint(fractional)
+    else:
+        values = dependent_round(data, fractional, np.random.default_rng(seed))
+    values, feasible = heuristics.repair(data, values)
+    if feasible:
+        values = heuristics.improve(data, values)
+    return values, heuristics.objective_value(data, values), feasible
+
+def run_rounding(inputs, horizon_weeks=None, previous_solution=None, solver=None, solver_options=None, relax=False,
+                 samples=DEFAULT_SAMPLES, workers=None, seed=None):
+    """Schedules the upcoming weeks by solving the LP relaxation of the scheduling MILP and rounding it.
+
+    The LP relaxation of algorithm.ScheduleTemplate is solved once. Its solution is rounded to its nearest integers
+    and with dependent_round for each sample, on a process pool. Every rounding is repaired into a schedule that
+    satisfies 2.1-2.4 with heuristics.repair (2.5 and 2.6 hold by construction) and improved with heuristics.improve.
+    The best schedule is returned, along with its gap to the LP bound. This is much faster than the MILP on large
+    rosters, at the cost of that gap.
+
+    Args:
+        inputs (list): output of State.get_algo_inputs()
+        horizon_weeks (int, optional): see algorithm.run_algorithm. Defaults to None.
+        previous_solution (np.ndarray, optional): unused, accepted for compatibility with algorithm.run_algorithm. Defaults to None.
+        solver (string, optional): solver for the LP (see solvers.SOLVER_OPTIONS). Defaults to None (most preferred installed).
+        solver_options (dict, optional): options for the LP solve. Random samples are skipped once the "deadline" has
+            passed. Defaults to None.
+        relax (bool, optional): see algorithm.run_algorithm. Defaults to False.
+        samples (int, optional): number of random roundings. Defaults to DEFAULT_SAMPLES.
+        workers (int, optional): number of worker processes. 1 rounds in this process. Defaults to None (# of CPUs).
+        seed (int, optional): seed of the first sample. Each later sample uses the next seed. Defaults to None (random).
+
+    Raises:
+        RuntimeError: The LP is infeasible, or no rounding could be repaired into a schedule that satisfies the hard constraints
+
+    Returns:
+        np.ndarray: (# of all staff, # of days, # of slots per day) assignments for the upcoming week. The assignments for every
+        scheduled week, shape (# of all staff, # of scheduled weeks, # of days, # of slots per day), are saved to assignments.npy, and
+        the run's metrics to algorithm.METRICS_PATH.
+    """
+    data = algorithm.AlgoData(inputs, horizon_weeks, relax=relax)
+    m, n = data.m, data.n
+
+    print("Setting up LP relaxation...")
+    if not data.cells.size:
+        print("No staff member is available for any slot with demand. Nothing to schedule.")
+        return np.zeros((m, *data.grid_shape))
+
+    phase_times = {}
+    phase_start = perf_counter()
+    solver = solvers.resolve_solver(solver)
+    template = algorithm.ScheduleTemplate(data, solver, relax_integrality=True)
+    phase_start = algorithm.lap(phase_times, "setup", phase_start)
+
+    print(f"Running LP relaxation with {solver}...")
+    solvers.solve(template.prob, solver, solver_options)
+    phase_start = algorithm.lap(phase_times, "lp", phase_start)
+    metrics = {
+        "engine": "rounding",
+        "status": template.prob.status,
+        "objective": None,
+        "staff": m,
+        "weeks": data.week_of.size,
+        "scheduled_weeks": n,
+        "cells": data.cells.size,
+        "size": template.size,
+        "phase_times": phase_times,
+        "solver_stats": solvers.solver_stats(template.prob),
+        "lower_bound": template.prob.value,
+        "gap": None,
+        "terms": None,
+    }
+    if template.A.value is None:
+        algorithm.save_metrics(metrics)
+        raise RuntimeError(f"LP relaxation did not solve. Status: {template.prob.status}")
+    fractional = np.clip(template.A.value, 0, 1)
+    lower_bound = template.prob.value
+    integral = (np.minimum(fractional, 1 - fractional) < INTEGRALITY_TOLERANCE).mean()
+    print(f"LP bound: {lower_bound}. {integral:.1%} of the assignment variables are integral.")
+
+    seed = seed if seed is not None else int(np.random.default_rng().integers(2 ** 31))
+    seeds = [None] + [seed + sample for sample in range(samples)]
+    workers = min(workers or os.cpu_count() or 1, len(seeds))
+    print(f"Rounding {len(seeds)} samples on {workers} workers...")
+    init_args = (inputs, horizon_weeks, relax, fractional, solver_options)
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=init_args) as executor:
+            results = list(executor.map(_round_sample, seeds))
+    else:
+        _init_worker(*init_args, quiet=False)
+        results = list(map(_round_sample, seeds))
+    phase_start = algorithm.lap(phase_times, "rounding", phase_start)
+
+    skipped = sum(values is None for values, _, _ in results)
+    if skipped:
+        print(f"Skipped {skipped} samples after the deadline")
+    feasible_results = [(value, values) for values, value, feasible in results if feasible]
+    print(f"{len(feasible_results)} of {len(seeds) - skipped} roundings repaired into schedules")
+    if not feasible_results:
+        metrics["status"] = "infeasible"
+        algorithm.save_metrics(metrics)
+        raise RuntimeError("No rounding of the LP relaxation could be repaired into a schedule that satisfies the hard constraints.")
+    best_value, best_values = min(feasible_results, key=lambda result: result[0])
+    gap = (best_value - lower_bound) / max(abs(best_value), 1)
+    print(f"Rounding objective value: {best_value} (LP bound {lower_bound}, gap {gap:.2%})")
+
+    metrics.update(status="feasible", objective=best_value, gap=gap, terms=heuristics.objective_terms(data, best_values))
+    assignments = algorithm.save_assignments(data, best_values)
+    algorithm.lap(phase_times, "extraction", phase_start)
+    algorithm.save_metrics(metrics)
+    return assignments
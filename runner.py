@@ -8,44 +8,71 @@ import numpy as np
 import shutil
 from datetime import timedelta
 import re
+import argparse
+import pickle
 from google.cloud import storage
 from google.api_core.exceptions import Forbidden, NotFound
 import validation
-import algorithm
+import engines
+import presolve
+import delta
+import problem_cache
+import grid
 import pandas as pd
 
-# The range of both spreadsheet. This should not change unless the forms/the demand spreadsheet has been edited.
-AVAILABILITIES_RANGE = 'Form Responses 1!B1:BP'
+# The sheets of both spreadsheets and the range of the demand spreadsheet. This should not change unless the forms/the
+# demand spreadsheet has been edited. The availabilities range has one column per slot of the time grid.
+AVAILABILITIES_SHEET = 'Form Responses 1'
 DEMAND_RANGE = 'Demand!A2:E'
 
+# Where the state each run was made from is saved, next to assignments.npy, for what-if runs to compare against
+STATE_PATH = "state.pkl"
+
 os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = "credentials.json"
 
 
-def main():
-    # Config Read
-    config = config_read.read_config("config.json")
-    validation.validate_config(config)
+def fetch_inputs(config, state_cache=None):
+    """Reads a course's sheets and latest saved state, and builds the state for the upcoming week.
+
+    Args:
+        config (dict): output of config_read.read_config, validated
+        state_cache (dict, optional): saved states already read, keyed by project, bucket, prefix and week. The
+        latest state is taken from it if it's there, and added to it if it isn't. Defaults to None (always read it).
+
+    Raises:
+        RuntimeError: The allotted # of weeks have already passed
+
+    Returns:
+        (State.State, np.ndarray): the upcoming week's state and the OH demand for every week, or None if the
+        algorithm has already been run for all weeks
+    """
+    time_grid = grid.TimeGrid.from_config(config["grid"])
 
     # Get availabilities data
     availabilities_id = config_read.get_google_sheets_id(config["availabilities_link"])
-    availabilities = utils.get_availabilities(availabilities_id, AVAILABILITIES_RANGE)
-    validation.validate_availabilities(availabilities)
+    availabilities = utils.get_availabilities(availabilities_id, utils.get_availabilities_range(AVAILABILITIES_SHEET, time_grid), time_grid)
+    validation.validate_availabilities(availabilities, time_grid)
 
     # Get OH demand data
     demand_id = config_read.get_google_sheets_id(config["demand_link"])
-    demand = utils.get_demand(demand_id, DEMAND_RANGE, config["weeks"])
+    demand = utils.get_demand(demand_id, DEMAND_RANGE, config["weeks"], time_grid)
 
     # Get last state
     prefix = f"{config['class']}-{config['semester']}/"
     latest_week = utils.get_latest_week(config["project_id"], config["bucket_name"], prefix)
     if latest_week > -1:
-        last_state = utils.deserialize(config.get("project_id"), config["bucket_name"], latest_week, config["weeks_skipped"], prefix)
+        key = (config["project_id"], config["bucket_name"], prefix, latest_week)
+        last_state = state_cache.get(key) if state_cache is not None else None
+        if last_state is None:
+            last_state = utils.deserialize(config.get("project_id"), config["bucket_name"], latest_week, config["weeks_skipped"], prefix)
+            if state_cache is not None:
+                state_cache[key] = last_state
     else:
         last_state = None
     
     if last_state and last_state.week_num == config["weeks"]:
         print(f"ERROR: The algorithm has already been run for all weeks. The last state was for week {config['weeks']}. Exiting.")
-        return
+        return None
 
     if latest_week == config['weeks']:
         raise RuntimeError("Allotted # of weeks have already passed. Exiting.")
@@ -58,14 +85,50 @@ def main():
                         config["semester"], 
                         config["weeks"], 
                         config["weekly_hour_multiplier"], 
-                        config["weeks_skipped"])
-    
+                        config["weeks_skipped"],
+                        time_grid)
+    return state, demand
+
+def solve(config, state, demand, previous_state=None):
+    """Runs the algorithm on a course's state for the upcoming week and saves the results to the working directory:
+    the assignments of every scheduled week (assignments.npy, which the next run warm starts from), the run's metrics
+    (metrics.json), the state it was made from (STATE_PATH), the demand (demand.npy) and the hours of each staff member
+    next week (hours_assigned.csv).
+
+    Args:
+        config (dict): output of config_read.read_config, validated
+        state (State.State): the upcoming week's state (see fetch_inputs)
+        demand (np.ndarray): OH demand for every week
+        previous_state (State.State, optional): state of the last run this week. If given, only the staff members who
+        changed since then are scheduled again, and everyone else keeps their assignments in assignments.npy (see
+        delta.run_delta). Defaults to None (schedule everyone).
+
+    Returns:
+        np.ndarray: (# of all staff, # of days, # of slots per day) assignments for the upcoming week
+    """
+    time_grid = state.grid
+    last_state = state.prev_state
+
+    problem_cache.configure(config["cache_dir"], config["cache_size_mb"])
+
     # Run algorithm
     inputs = state.get_algo_inputs()
-    assignments = algorithm.run_algorithm(inputs)
+    # Catch bad sheets before paying for a solve
+    presolve.presolve(inputs, config["presolve_relax"], [state.bi_mappings.inverse[i] for i in range(inputs[2].shape[0])], time_grid)
+    if previous_state is not None:
+        # This week's last run, which only the changed staff members are scheduled again against
+        assignments = delta.run_delta(previous_state, state, np.load("assignments.npy"), config["solver"], config["solver_options"],
+                                      config["presolve_relax"])
+    else:
+        # Last week's solution for the remaining weeks, used as a starting point for the solver
+        previous_solution = load_previous_solution(state) if last_state else None
+        assignments = engines.run_engine(inputs, config, previous_solution)
     # assignments = np.load("assignments.npy")[:, 0, :, :]
 
     np.save('demand.npy', demand)
+    # Before its staff members' hours left are updated with the assignments
+    with open(STATE_PATH, "wb") as f:
+        pickle.dump(state, f)
 
     state.set_assignments(assignments)
 
@@ -75,7 +138,7 @@ def main():
         if assignments[i].sum() != 0:
 
             export_dict['email'].append(state.bi_mappings.inverse[i])
-            export_dict['hours_assigned'].append(assignments[i].sum())
+            export_dict['hours_assigned'].append(assignments[i].sum() / time_grid.slots_per_hour)
 
     export_df = pd.DataFrame(data=export_dict)
     export_df.to_csv("hours_assigned.csv", index=False)
@@ -94,9 +157,72 @@ def main():
     #                           starting_monday, 
     #                           config["calendar_event_name"], 
     #                           config["calendar_event_location"], 
-    #                           config["calendar_event_description"])
+    #                           config["calendar_event_description"],
+    #                           time_grid)
     
+    # prefix = f"{config['class']}-{config['semester']}/"
     # state.serialize(config["project_id"], config["bucket_name"], prefix)    
+    return assignments
+
+def load_previous_solution(state):
+    """
+    Args:
+        state (State.State): the upcoming week's state
+
+    Returns:
+        np.ndarray: assignments.npy in the working directory if it is last week's run, to warm start from, or None.
+        A rerun of the same week, or a run further back, would shift the wrong weeks into place (see
+        algorithm.shift_previous_solution).
+    """
+    if not os.path.exists(STATE_PATH) or not os.path.exists("assignments.npy"):
+        return None
+    try:
+        with open(STATE_PATH, "rb") as f:
+            saved_week = pickle.load(f).week_num
+    except Exception as e:
+        print(f"WARNING: Couldn't read {STATE_PATH}: {e}. Solving without a warm start.")
+        return None
+    if saved_week != state.week_num - 1:
+        print(f"assignments.npy is from week {saved_week}, not last week ({state.week_num - 1}). Solving without a warm start.")
+        return None
+    return np.load("assignments.npy")
+
+def load_previous_state():
+    """
+    Raises:
+        RuntimeError: There is no run this week in the working directory
+
+    Returns:
+        State.State: state of this week's last run in the working directory, for a what-if run
+    """
+    if not os.path.exists(STATE_PATH) or not os.path.exists("assignments.npy"):
+        raise RuntimeError(f"A what-if run needs the {STATE_PATH} and assignments.npy of a run this week. Run without --what-if first.")
+    with open(STATE_PATH, "rb") as f:
+        return pickle.load(f)
+
+def main(config_path="config.json", what_if=False):
+    """
+    Args:
+        config_path (string, optional): path to config json file. Defaults to "config.json".
+        what_if (bool, optional): rerun this week after some staff members resubmitted the form, scheduling only
+        them again against the last run in the working directory. Defaults to False.
+    """
+    # Config Read
+    config = config_read.read_config(config_path)
+    validation.validate_config(config)
+
+    previous_state = load_previous_state() if what_if else None
+
+    course = fetch_inputs(config)
+    if course is None:
+        return
+    state, demand = course
+    solve(config, state, demand, previous_state)
 
 if __name__ == '__main__':
-    main()
+    parser = argparse.ArgumentParser(description="Schedule OH for the upcoming week.")
+    parser.add_argument("--config", default="config.json", help="path to the config (default: config.json)")
+    parser.add_argument("--what-if", action="store_true",
+                        help="only reschedule the staff members who changed their form responses since this week's last run")
+    args = parser.parse_args()
+    main(args.config, args.what_if)
@@ -4,6 +4,7 @@ from googleapiclient.discovery import build
 from google.oauth2 import service_account
 from dateutil.relativedelta import relativedelta, MO
 import utils
+import grid
 
 import os
 
@@ -16,7 +17,7 @@ from googleapiclient.errors import HttpError
 
 SCOPES = ["https://www.googleapis.com/auth/calendar"]
 
-def send_invites(email, np_array, start_date, calendar_name, calendar_location, calendar_description):
+def send_invites(email, np_array, start_date, calendar_name, calendar_location, calendar_description, time_grid=grid.DEFAULT_GRID):
     # Ensure start_date is a Monday
     if start_date.weekday() != 0:
         start_date = start_date + relativedelta(weekday=MO)
@@ -54,10 +55,10 @@ def send_invites(email, np_array, start_date, calendar_name, calendar_location,
             if np_array[i, j] == 1:
                 # Calculate date and time for the event
                 event_date = start_date + datetime.timedelta(days=i)
-                start_time = datetime.time(9+j, 0)
+                start_time = time_grid.slot_start(event_date, j)
                 while j < np_array.shape[1] and np_array[i, j] == 1:
                     j += 1
-                end_time = datetime.time(9+j, 0)
+                end_time = time_grid.slot_start(event_date, j)
 
                 # Create the event
                 event = {
@@ -65,11 +66,11 @@ def send_invites(email, np_array, start_date, calendar_name, calendar_location,
                     'location': calendar_location,
                     'description': calendar_description,
                     'start': {
-                        'dateTime': datetime.datetime.combine(event_date, start_time).isoformat(),
+                        'dateTime': start_time.isoformat(),
                         'timeZone': 'America/Los_Angeles',
                     },
                     'end': {
-                        'dateTime': datetime.datetime.combine(event_date, end_time).isoformat(),
+                        'dateTime': end_time.isoformat(),
                         'timeZone': 'America/Los_Angeles',
                     },
                     'attendees': [
@@ -88,7 +89,7 @@ def send_invites(email, np_array, start_date, calendar_name, calendar_location,
             
 
 if __name__ == "__main__":
-    timeslots = np.zeros((5, 12))  # Random example array
+    timeslots = np.zeros(grid.DEFAULT_GRID.shape)  # Random example array
     timeslots[1][1] = 1
     timeslots[1][2] = 1
 
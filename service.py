@@ -0,0 +1,334 @@
+import argparse
+import itertools
+import json
+import os
+import queue
+import threading
+import urllib.error
+import urllib.request
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from multiprocessing import get_context
+from time import perf_counter, sleep, time
+import batch
+import config_read
+import runner
+import solvers
+import validation
+
+# Address the service listens on. It has no authentication, so it only listens on this machine.
+HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+
+# Where each course's results are written, in a directory named after its config (see batch.run_batch)
+DEFAULT_OUTPUT_DIR = "service_output"
+
+# Jobs the service runs: "run" schedules the upcoming week like runner.py, "preview" schedules it with
+# PREVIEW_ENGINE in the course's preview directory, leaving its runs alone, and "what-if" schedules only the staff
+# members who changed since the course's last run again (see delta.py)
+JOB_TYPES = ("run", "preview", "what-if")
+PREVIEW_ENGINE = "flow"
+
+# Most jobs waiting to run. Jobs submitted past it are turned away.
+MAX_QUEUED_JOBS = 32
+
+# Config keys a job can override, to try other settings without editing the course's config
+OVERRIDABLE_KEYS = ("horizon_weeks", "solver", "solver_options", "engine", "engine_options", "presolve_relax",
+                    "deadline", "fallback_engines")
+
+
+def _init_worker():
+    """Loads the solvers in a new worker process, so that its first job doesn't.
+
+    Returns:
+        int: the worker's process id
+    """
+    solvers.installed_solvers()
+    return os.getpid()
+
+class SchedulerService:
+    """
+    A long-running scheduler for the courses in a directory of configs (see batch.read_course_configs). Its processes
+    stay up between jobs, so jobs don't pay for importing cvxpy, pandas and the Google libraries. Google clients are
+    built once per thread (see utils.sheets_service) and saved states read from Cloud Storage are kept, so a job only
+    reads its course's sheets. Jobs are queued and run at most workers at a time. Each job fetches its course's
+    inputs on its own thread and solves on a pool of workers processes, which keep their problem templates between
+    jobs. Jobs writing to the same directory run one at a time.
+    """
+
+    def __init__(self, config_dir, output_dir=DEFAULT_OUTPUT_DIR, workers=1):
+        """Starts the worker processes and the threads that run jobs.
+
+        Instance Attributes:
+            courses (dict): path of each course's config, keyed by course
+            jobs (dict): every job submitted, keyed by id (see submit)
+            state_cache (dict): saved states read so far (see runner.fetch_inputs)
+
+        Args:
+            config_dir (string): directory with one config.json-style file per course
+            output_dir (string, optional): where each course's results go. Defaults to DEFAULT_OUTPUT_DIR.
+            workers (int, optional): most jobs running at once, and number of solver processes. Defaults to 1.
+        """
+        self.courses = batch.read_course_configs(config_dir)
+        self.output_dir = os.path.abspath(output_dir)
+        self.jobs = {}
+        self.state_cache = {}
+        self._queue = queue.Queue(MAX_QUEUED_JOBS)
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._directory_locks = {}
+
+        # Spawned workers don't inherit the threads or the Google clients they hold. Start every worker now, so
+        # that the first jobs don't wait for them.
+        self._pool = ProcessPoolExecutor(max_workers=workers, mp_context=get_context("spawn"), initializer=_init_worker)
+        start = perf_counter()
+        warm_up = [self._pool.submit(_init_worker) for _ in range(workers)]
+        print(f"Started workers {sorted({future.result() for future in warm_up})} in {perf_counter() - start:.2f}s")
+        for _ in range(workers):
+            threading.Thread(target=self._run_jobs, daemon=True).start()
+
+    def submit(self, course, job_type="run", overrides=None):
+        """Queues a job.
+
+        Args:
+            course (string): course to run the job for, named after its config
+            job_type (string, optional): one of JOB_TYPES. Defaults to "run".
+            overrides (dict, optional): values of OVERRIDABLE_KEYS to use instead of the course config's. Overriding
+            the engine without its options runs it with its default options. Defaults to None.
+
+        Raises:
+            ValueError: The course, job type or overrides are unknown
+            queue.Full: MAX_QUEUED_JOBS jobs are already waiting
+
+        Returns:
+            dict: the job: its id, course, type, overrides, status ("queued", "running", "done", "failed" or "finished"
+            when every week has already been run), submission time, fetch and solve time, and the engine that found
+            the schedule, its status, objective value and gap, the fraction of the problem solved again by what-if
+            jobs, the output directory and the first line of its error, if any (in full in the directory's run.log)
+        """
+        if course not in self.courses:
+            raise ValueError(f"Unknown course {course}. Must be one of {list(self.courses)}")
+        if job_type not in JOB_TYPES:
+            raise ValueError(f"Unknown job type {job_type}. Must be one of {list(JOB_TYPES)}")
+        overrides = overrides or {}
+        unknown = set(overrides) - set(OVERRIDABLE_KEYS)
+        if unknown:
+            raise ValueError(f"Can't override {sorted(unknown)}. Can override {list(OVERRIDABLE_KEYS)}")
+
+        course_dir = os.path.join(self.output_dir, course)
+        with self._lock:
+            job = {"id": str(next(self._ids)), "course": course, "type": job_type, "overrides": overrides,
+                   "status": "queued", "submitted": datetime.now().isoformat(timespec="seconds"), "fetch_time": None,
+                   "solve_time": None, "engine": None, "engine_status": None, "objective": None, "gap": None,
+                   "resolved_fraction": None, "output_dir": os.path.join(course_dir, "preview") if job_type == "preview" else course_dir,
+                   "error": None}
+            # A worker thread may pick the job up before this returns
+            queued = dict(job)
+            self._queue.put_nowait(job)
+            self.jobs[job["id"]] = job
+        print(f"Job {job['id']}: {job_type} {course} queued")
+        return queued
+
+    def _run_jobs(self):
+        """Runs queued jobs one after another, forever."""
+        while True:
+            job = self._queue.get()
+            try:
+                self._run_job(job)
+            finally:
+                self._queue.task_done()
+
+    def _directory_lock(self, directory):
+        with self._lock:
+            return self._directory_locks.setdefault(directory, threading.Lock())
+
+    def _run_job(self, job):
+        """Fetches a job's inputs on this thread, then solves it on the worker pool. Updates the job as it goes.
+
+        Args:
+            job (dict): a queued job (see submit)
+        """
+        job["status"] = "running"
+        start = perf_counter()
+        try:
+            config = config_read.read_config(self.courses[job["course"]])
+            if job["type"] == "preview":
+                config.update(engine=PREVIEW_ENGINE, engine_options={})
+            if "engine" in job["overrides"]:
+                config["engine_options"] = {}
+            config.update(job["overrides"])
+            validation.validate_config(config)
+
+            fetched = runner.fetch_inputs(config, self.state_cache)
+            job["fetch_time"] = perf_counter() - start
+            if fetched is None:
+                job["status"] = "finished"
+                return
+            with self._directory_lock(job["output_dir"]):
+                started = time()
+                future = self._pool.submit(batch.solve_course, job["output_dir"], config, *fetched, job["type"] == "what-if")
+                job["solve_time"], job["engine_status"] = future.result()
+                # The engine may not write metrics (e.g. when there is nothing to schedule)
+                metrics = batch.read_metrics(job["output_dir"], started)
+        except Exception as e:
+            job.update(status="failed", error=batch.error_summary(e))
+            print(f"Job {job['id']}: {job['type']} {job['course']} failed: {job['error']}")
+            return
+        job.update(status="done", engine=metrics.get("engine"), objective=metrics.get("objective"), gap=metrics.get("gap"),
+                   resolved_fraction=metrics.get("resolved_fraction"))
+        print(f"Job {job['id']}: {job['type']} {job['course']} {job['engine_status']} in {perf_counter() - start:.2f}s")
+
+    def list_jobs(self):
+        """
+        Returns:
+            list: a copy of every job (see submit)
+        """
+        with self._lock:
+            return [dict(job) for job in self.jobs.values()]
+
+    def get_job(self, job_id):
+        """
+        Args:
+            job_id (string): id of a job
+
+        Returns:
+            dict: a copy of the job (see submit), or None if there is no such job
+        """
+        with self._lock:
+            job = self.jobs.get(job_id)
+            return None if job is None else dict(job)
+
+    def shutdown(self):
+        """Stops the worker processes once their jobs are done."""
+        self._pool.shutdown()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    """
+    JSON API of a SchedulerService (self.server.service):
+        GET /courses: list of courses
+        GET /jobs: every job
+        GET /jobs/<id>: one job
+        POST /jobs: submit a job, from {"course", "type" (optional), "overrides" (optional)} (see SchedulerService.submit)
+    """
+
+    def _reply(self, code, body):
+        payload = json.dumps(body, default=lambda value: value.item()).encode()
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        service = self.server.service
+        job = service.get_job(self.path[len("/jobs/"):]) if self.path.startswith("/jobs/") else None
+        if self.path == "/courses":
+            self._reply(200, list(service.courses))
+        elif self.path == "/jobs":
+            self._reply(200, service.list_jobs())
+        elif job is not None:
+            self._reply(200, job)
+        else:
+            self._reply(404, {"error": f"Not found: {self.path}"})
+
+    def do_POST(self):
+        if self.path != "/jobs":
+            self._reply(404, {"error": f"Not found: {self.path}"})
+            return
+        try:
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or "{}")
+            job = self.server.service.submit(body.get("course"), body.get("type", "run"), body.get("overrides"))
+        except (ValueError, AttributeError) as e:
+            self._reply(400, {"error": str(e)})
+        except queue.Full:
+            self._reply(503, {"error": f"{MAX_QUEUED_JOBS} jobs are already queued. Try again later."})
+        else:
+            self._reply(202, job)
+
+
+def serve(config_dir, output_dir=DEFAULT_OUTPUT_DIR, workers=1, port=DEFAULT_PORT):
+    """Runs a SchedulerService behind a local HTTP API (see _Handler) until interrupted.
+
+    Args:
+        config_dir (string): directory with one config.json-style file per course
+        output_dir (string, optional): where each course's results go. Defaults to DEFAULT_OUTPUT_DIR.
+        workers (int, optional): most jobs running at once. Defaults to 1.
+        port (int, optional): port to listen on. Defaults to DEFAULT_PORT.
+    """
+    service = SchedulerService(config_dir, output_dir, workers)
+    server = ThreadingHTTPServer((HOST, port), _Handler)
+    server.service = service
+    print(f"Serving {len(service.courses)} courses on http://{HOST}:{port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.shutdown()
+
+def request(path, body=None, port=DEFAULT_PORT):
+    """Calls the API of a running service.
+
+    Args:
+        path (string): e.g. "/jobs"
+        body (dict, optional): JSON body to POST. Defaults to None (GET).
+        port (int, optional): port the service listens on. Defaults to DEFAULT_PORT.
+
+    Raises:
+        RuntimeError: The service turned the request away
+
+    Returns:
+        the JSON response
+    """
+    data = None if body is None else json.dumps(body).encode()
+    req = urllib.request.Request(f"http://{HOST}:{port}{path}", data=data, headers={"Content-Type": "application/json"})
+    try:
+        with urllib.request.urlopen(req) as response:
+            return json.load(response)
+    except urllib.error.HTTPError as e:
+        raise RuntimeError(json.load(e).get("error", str(e)))
+
+def _parse_override(text):
+    """Parses KEY=VALUE, where VALUE is JSON or else a string."""
+    key, _, value = text.partition("=")
+    try:
+        return key, json.loads(value)
+    except ValueError:
+        return key, value
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Keep the scheduler running and send it jobs.")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help=f"port of the service (default: {DEFAULT_PORT})")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    serve_parser = commands.add_parser("serve", help="start the service")
+    serve_parser.add_argument("config_dir", help="directory with one config.json-style file per course")
+    serve_parser.add_argument("--output-dir", default=DEFAULT_OUTPUT_DIR, help=f"where results go (default: {DEFAULT_OUTPUT_DIR})")
+    serve_parser.add_argument("--workers", type=int, default=1, help="most jobs running at once (default: 1)")
+
+    submit_parser = commands.add_parser("submit", help="submit a job and wait for it")
+    submit_parser.add_argument("course", help="course to run the job for, named after its config")
+    submit_parser.add_argument("--type", choices=JOB_TYPES, default="run", help="job to run (default: run)")
+    submit_parser.add_argument("--override", action="append", default=[], type=_parse_override, metavar="KEY=VALUE",
+                               help=f"use VALUE (JSON) for a config key, one of {', '.join(OVERRIDABLE_KEYS)}")
+    submit_parser.add_argument("--no-wait", action="store_true", help="return once the job is queued")
+
+    commands.add_parser("jobs", help="list every job")
+    args = parser.parse_args()
+
+    if args.command == "serve":
+        serve(args.config_dir, args.output_dir, args.workers, args.port)
+    elif args.command == "submit":
+        job = request("/jobs", {"course": args.course, "type": args.type, "overrides": dict(args.override)}, args.port)
+        while not args.no_wait and job["status"] in ("queued", "running"):
+            sleep(1)
+            job = request(f"/jobs/{job['id']}", port=args.port)
+        print(json.dumps(job, indent=2))
+        if job["status"] == "failed":
+            raise SystemExit(1)
+    else:
+        for job in request("/jobs", port=args.port):
+            print(f"{job['id']:>4} {job['type']:<8} {job['course']:<16} {job['status']:<9} {job['engine_status'] or ''}")
@@ -0,0 +1,246 @@
+import cvxpy as cp
+import numpy as np
+import pandas as pd
+from time import perf_counter
+import algorithm
+
+# Each MILP solver's own name for the relative MIP gap, thread count and time limit (in seconds).
+# Options that cvxpy expects inside a dictionary are given as (dictionary name, option name).
+SOLVER_OPTIONS = {
+    "GUROBI": {"gap": "MIPGap", "threads": "Threads", "time_limit": "TimeLimit"},
+    "CPLEX": {"gap": ("cplex_params", "mip.tolerances.mipgap"), "threads": ("cplex_params", "threads"), "time_limit": ("cplex_params", "timelimit")},
+    "HIGHS": {"gap": "mip_rel_gap", "threads": "threads", "time_limit": "time_limit"},
+    "SCIP": {"gap": ("scip_params", "limits/gap"), "threads": ("scip_params", "parallel/maxnthreads"), "time_limit": ("scip_params", "limits/time")},
+    "CBC": {"gap": "allowableFractionGap", "threads": "numberThreads", "time_limit": "maximumSeconds"},
+    "GLPK_MI": {"gap": "mip_gap", "time_limit": "tm_lim"},
+    "SCIPY": {"gap": ("scipy_options", "mip_rel_gap"), "time_limit": ("scipy_options", "time_limit")},
+}
+
+# Attributes of the solver's own statistics (prob.solver_stats.extra_stats) holding the final relative MIP gap and the
+# number of branch and bound nodes, for solvers whose statistics cvxpy passes on as an object with attributes
+SOLVER_STATS = {
+    "GUROBI": {"gap": "MIPGap", "nodes": "NodeCount"},
+    "HIGHS": {"gap": "mip_gap", "nodes": "mip_node_count"},
+}
+
+# GLPK takes its time limit in milliseconds
+TIME_LIMIT_SCALE = {"GLPK_MI": 1000}
+
+# Shortest time limit given to a solve, so that a solve started at the deadline can still return a schedule
+MIN_TIME_LIMIT = 1
+
+# Order in which solvers are picked when config.json asks for "auto"
+SOLVER_PREFERENCE = ["GUROBI", "CPLEX", "HIGHS", "SCIP", "CBC", "GLPK_MI", "SCIPY"]
+
+
+def installed_solvers():
+    """
+    Returns:
+        list: names of the MILP solvers in SOLVER_OPTIONS that are installed, in order of preference
+    """
+    installed = cp.installed_solvers()
+    return [solver for solver in SOLVER_PREFERENCE if solver in installed]
+
+def resolve_solver(solver=None):
+    """Picks the solver to use.
+
+    Args:
+        solver (string, optional): solver name from config.json, or "auto"/None for the most preferred installed solver
+
+    Raises:
+        ValueError: The solver is unknown or not installed
+
+    Returns:
+        string: name of the solver
+    """
+    available = installed_solvers()
+    if not solver or solver == "auto":
+        if not available:
+            raise ValueError(f"No MILP solver installed. Install one of {SOLVER_PREFERENCE}.")
+        return available[0]
+    if solver not in SOLVER_OPTIONS:
+        raise ValueError(f"Unknown solver {solver}. Must be one of {list(SOLVER_OPTIONS)} or auto.")
+    if solver not in available:
+        raise ValueError(f"Solver {solver} is not installed. Installed MILP solvers: {available}")
+    return solver
+
+def time_left(solver_options=None):
+    """
+    Args:
+        solver_options (dict, optional): see solve_kwargs. Defaults to None.
+
+    Returns:
+        float: seconds left before solver_options["deadline"], or None if there is no deadline
+    """
+    deadline = (solver_options or {}).get("deadline")
+    return None if deadline is None else deadline - perf_counter()
+
+def past_deadline(solver_options=None):
+    """
+    Args:
+        solver_options (dict, optional): see solve_kwargs. Defaults to None.
+
+    Returns:
+        bool: whether solver_options has a deadline and it has passed
+    """
+    remaining = time_left(solver_options)
+    return remaining is not None and remaining <= 0
+
+def solve_kwargs(solver, solver_options=None):
+    """Translates the solver independent options in config.json into keyword arguments for cp.Problem.solve.
+
+    Args:
+        solver (string): name of the solver (see resolve_solver)
+        solver_options (dict, optional): any of "gap" (relative MIP gap), "threads" and "time_limit" (seconds), and
+            "deadline", the perf_counter() time by which an engine's solves must end (see engines.run_with_deadline).
+            The time limit is cut to the time left before the deadline, but not below MIN_TIME_LIMIT.
+
+    Returns:
+        dict: keyword arguments for cp.Problem.solve
+    """
+    solver_options = dict(solver_options or {})
+    remaining = time_left(solver_options)
+    solver_options.pop("deadline", None)
+    if remaining is not None:
+        solver_options["time_limit"] = max(min(solver_options.get("time_limit", remaining), remaining), MIN_TIME_LIMIT)
+    kwargs = {"solver": solver}
+    for option, value in solver_options.items():
+        name = SOLVER_OPTIONS[solver].get(option)
+        if name is None:
+            print(f"WARNING: {solver} doesn't support the {option} option. Ignoring it.")
+            continue
+        if option == "time_limit":
+            value = value * TIME_LIMIT_SCALE.get(solver, 1)
+        if isinstance(name, tuple):
+            kwargs.setdefault(name[0], {})[name[1]] = value
+        else:
+            kwargs[name] = value
+    return kwargs
+
+def set_highs_start(prob):
+    """cvxpy doesn't pass variable values to HiGHS. With warm_start it only hands HiGHS the solution of the
+    problem's previous solve, which it keeps in prob._solver_cache. This puts the current values of the problem's
+    boolean and integer variables there instead, as a MIP start: HiGHS fixes them and solves an LP for the
+    continuous variables, which are left undefined. Relies on cvxpy internals, so it's tied to the pinned cvxpy.
+
+    Args:
+        prob (cp.Problem): problem whose discrete variables all have values
+
+    Returns:
+        bool: whether the start was set
+    """
+    import highspy
+
+    param_prog = prob._cache.param_prog
+    if param_prog is None: # not compiled for a solver yet
+        param_prog = prob.get_problem_data("HIGHS")[0][cp.settings.PARAM_PROB]
+    col_value = np.full(param_prog.x.size, highspy.kHighsUndefined)
+    for variable in prob.variables():
+        if not (variable.attributes["boolean"] or variable.attributes["integer"]):
+            continue
+        if variable.value is None:
+            return False
+        column = param_prog.var_id_to_col[variable.id]
+        col_value[column:column + variable.size] = np.ravel(variable.value, order="F")
+    start = highspy.HighsSolution()
+    start.col_value = list(col_value)
+    start.value_valid = True
+    prob._solver_cache["HIGHS"] = (None, None, {"model_status": "kOptimal", "solution": start})
+    return True
+
+def solve(prob, solver=None, solver_options=None, warm_start=False):
+    """Solves a problem with the given solver and options.
+
+    Args:
+        prob (cp.Problem): problem to solve
+        solver (string, optional): solver name, or "auto"/None. Defaults to None.
+        solver_options (dict, optional): see solve_kwargs. Defaults to None.
+        warm_start (bool, optional): whether to start from the current values of the problem's variables. For
+            HiGHS, from those of its discrete variables (see set_highs_start). Defaults to False.
+
+    Returns:
+        float: seconds spent in prob.solve
+    """
+    solver = resolve_solver(solver)
+    kwargs = solve_kwargs(solver, solver_options)
+    if warm_start and solver == "HIGHS":
+        warm_start = set_highs_start(prob)
+    start = perf_counter()
+    prob.solve(verbose=False, warm_start=warm_start, **kwargs)
+    return perf_counter() - start
+
+def solver_stats(prob):
+    """Collects what the solver reported about its last solve of a problem.
+
+    Args:
+        prob (cp.Problem): solved problem
+
+    Returns:
+        dict: solver name, cvxpy's compilation time and the solver's own solve time (seconds), and the number of
+        iterations, relative MIP gap and number of branch and bound nodes. Statistics the solver didn't report are None.
+    """
+    stats = prob.solver_stats
+    result = {
+        "solver": stats.solver_name,
+        "compilation_time": prob.compilation_time,
+        "solve_time": stats.solve_time,
+        "iterations": stats.num_iters,
+    }
+    attributes = SOLVER_STATS.get(stats.solver_name, {})
+    for stat in ("gap", "nodes"):
+        try:
+            value = float(getattr(stats.extra_stats, attributes[stat]))
+        except Exception: # not reported by this solver, or not available after this solve
+            value = None
+        # Solvers report an infinite gap when there is no bound, which JSON can't hold
+        if value is not None and not np.isfinite(value):
+            value = None
+        result[stat] = int(value) if stat == "nodes" and value is not None else value
+    return result
+
+def benchmark(inputs, solvers=None, solver_options=None, horizon_weeks=None):
+    """Solves the same algorithm inputs with every installed MILP solver.
+
+    Args:
+        inputs (list): output of State.get_algo_inputs()
+        solvers (list, optional): solvers to compare. Defaults to every installed MILP solver.
+        solver_options (dict, optional): see solve_kwargs. Defaults to None.
+        horizon_weeks (int, optional): see algorithm.run_algorithm. Defaults to None.
+
+    Returns:
+        pd.DataFrame: one row per solver with its status, objective value and solve time
+    """
+    data = algorithm.AlgoData(inputs, horizon_weeks)
+    template = algorithm.get_template(data)
+
+    results = {"solver": [], "status": [], "objective": [], "time": []}
+    for solver in solvers or installed_solvers():
+        print(f"Solving with {solver}...")
+        try:
+            elapsed = solve(template.prob, solver, solver_options)
+            status, objective = template.prob.status, template.prob.value
+        except cp.error.SolverError as e:
+            elapsed, status, objective = np.nan, f"error: {e}", np.nan
+
+        results["solver"].append(solver)
+        results["status"].append(status)
+        results["objective"].append(objective)
+        results["time"].append(elapsed)
+
+    return pd.DataFrame(data=results)
+
+if __name__ == '__main__':
+    import config_read
+    import utils
+
+    config = config_read.read_config("config.json")
+    prefix = f"{config['class']}-{config['semester']}/"
+
+    # Benchmark on the inputs of the latest saved state
+    latest_week = utils.get_latest_week(config["project_id"], config["bucket_name"], prefix)
+    if latest_week == -1:
+        raise RuntimeError("No saved state to benchmark on.")
+    last_state = utils.deserialize(config["project_id"], config["bucket_name"], latest_week, config["weeks_skipped"], prefix)
+
+    results = benchmark(last_state.get_algo_inputs(), solver_options=config["solver_options"], horizon_weeks=config["horizon_weeks"])
+    print(results.to_string(index=False))
@@ -0,0 +1,224 @@
+import os
+import sys
+import itertools
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+import algorithm
+import heuristics
+import solvers
+
+# Objective weights a sweep can vary, named after their module-level constants in algorithm.py
+WEIGHTS = algorithm.WEIGHT_NAMES
+
+# Weights the per-term breakdown is reported under, so that rows of a sweep are comparable: every term in its own
+# units (hours, staff, displeasure ratings, ...) with 3.5 decaying as it does by default
+UNIT_WEIGHTS = {"U_3_1": 1, "U_3_2": 1, "U_3_3": 1, "U_3_4": 1, "U_3_5": 1, "U_3_6": 1, "DECAY_RATE": algorithm.DECAY_RATE}
+
+# State of a worker process: the shared inputs, their data and the problem template
+_worker = {}
+
+
+def check_weights(weights):
+    """
+    Args:
+        weights (iterable): names of weights
+
+    Raises:
+        ValueError: A weight isn't in WEIGHTS
+    """
+    unknown = set(weights) - set(WEIGHTS)
+    if unknown:
+        raise ValueError(f"Unknown weights {sorted(unknown)}. Options are {WEIGHTS}.")
+
+def weight_grid(**values):
+    """Builds every combination of the given weights.
+
+    Example: weight_grid(U_3_1=[200, 400], U_3_4=[25, 50]) gives 4 weight settings.
+
+    Args:
+        values (list): values to try for each weight in WEIGHTS. Weights left out keep their value in algorithm.py.
+
+    Raises:
+        ValueError: A weight isn't in WEIGHTS
+
+    Returns:
+        list: one dict of weights per combination
+    """
+    check_weights(values)
+    return [dict(zip(values, combination)) for combination in itertools.product(*values.values())]
+
+def _share(inputs):
+    """Copies the algorithm inputs into shared memory, so that worker processes can read them without a copy each.
+
+    Args:
+        inputs (list): output of State.get_algo_inputs()
+
+    Returns:
+        (list, list): shared memory blocks to release once the workers are done, and a picklable description of
+        each input: (block name, shape, dtype), or the input itself if it can't be shared
+    """
+    blocks, specs = [], []
+    for value in inputs:
+        array = np.ascontiguousarray(value)
+        if array.dtype.hasobject:
+            specs.append(value)
+            continue
+        block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+        np.ndarray(array.shape, array.dtype, buffer=block.buf)[...] = array
+        blocks.append(block)
+        specs.append((block.name, array.shape, array.dtype.str))
+    return blocks, specs
+
+def _attach(specs):
+    """Reads inputs shared by _share.
+
+    Args:
+        specs (list): input descriptions returned by _share
+
+    Returns:
+        (list, list): shared memory blocks, which must stay open while the inputs are used, and the inputs
+    """
+    blocks, inputs = [], []
+    for spec in specs:
+        if not isinstance(spec, tuple):
+            inputs.append(spec)
+            continue
+        name, shape, dtype = spec
+        block = shared_memory.SharedMemory(name=name)
+        blocks.append(block)
+        inputs.append(np.ndarray(shape, np.dtype(dtype), buffer=block.buf))
+    return blocks, inputs
+
+def _init_worker(specs, horizon_weeks, solver, solver_options, relax, merge_tolerance, quiet=True):
+    """Builds the data and problem template once per worker process. Every weight setting reuses them.
+
+    Args:
+        specs (list): inputs, as described by _share
+        horizon_weeks (int): see algorithm.run_algorithm
+        solver (string): MILP solver
+        solver_options (dict): see solvers.solve_kwargs
+        relax (bool): see algorithm.run_algorithm
+        merge_tolerance (float): see algorithm.run_algorithm
+        quiet (bool, optional): silence the output of the worker. Defaults to True.
+    """
+    if quiet:
+        sys.stdout = open(os.devnull, "w")
+    blocks, inputs = _attach(specs)
+    data = algorithm.AlgoData(inputs, horizon_weeks, merge_tolerance, relax=relax)
+    _worker.update(blocks=blocks, data=data, solver=solver, solver_options=solver_options,
+                   template=algorithm.get_template(data, solver) if data.cells.size else None)
+
+def _solve_weights(weights):
+    """Solves the problem under one weight setting.
+
+    Args:
+        weights (dict): value of some of the weights in WEIGHTS. The others keep their value in algorithm.py.
+
+    Returns:
+        (string, float, float, dict): status, objective value, solve time and per-term breakdown under UNIT_WEIGHTS
+    """
+    data, template = _worker["data"], _worker["template"]
+    # Weights are passed down rather than set in algorithm.py, which other code in the process may be using
+    if template is None:
+        values, status, objective, elapsed = np.zeros(0), "optimal", heuristics.objective_value(data, np.zeros(0), weights), 0.0
+    else:
+        template.set_parameters(data, weights)
+        elapsed = solvers.solve(template.prob, _worker["solver"], _worker["solver_options"], warm_start=template.A.value is not None)
+        status, objective = template.prob.status, template.prob.value
+        values = None if template.A.value is None else np.rint(template.A.value)
+
+    terms = heuristics.objective_terms(data, values, UNIT_WEIGHTS) if values is not None else {}
+    return status, objective, elapsed, terms
+
+def pareto_front(terms):
+    """
+    Args:
+        terms (np.ndarray): (# of rows, # of terms) per-term values, NaN for rows without a solution
+
+    Returns:
+        np.ndarray: (# of rows, ) whether each row is solved and no other row is at least as good on every term
+        and better on one
+    """
+    solved = ~np.isnan(terms).any(axis=1)
+    at_least_as_good = (terms[:, None, :] <= terms[None, :, :]).all(axis=2)
+    better = (terms[:, None, :] < terms[None, :, :]).any(axis=2)
+    dominated = ((at_least_as_good & better) & solved[:, None]).any(axis=0)
+    return solved & ~dominated
+
+def run_sweep(inputs, grid, horizon_weeks=None, solver=None, solver_options=None, relax=False, merge_tolerance=None,
+              workers=None):
+    """Solves the same algorithm inputs under every weight setting of a grid, on a process pool. The inputs are
+    shared with the workers through shared memory, and each worker builds the problem template once: weights are
+    parameters, so every other setting only updates them and re-solves.
+
+    Args:
+        inputs (list): output of State.get_algo_inputs()
+        grid (list): one dict of weights per setting (see weight_grid). Weights left out keep their value in algorithm.py.
+        horizon_weeks (int, optional): see algorithm.run_algorithm. Defaults to None.
+        solver (string, optional): MILP solver to use (see solvers.SOLVER_OPTIONS). Defaults to None (most preferred installed).
+        solver_options (dict, optional): see solvers.solve_kwargs. Defaults to None.
+        relax (bool, optional): see algorithm.run_algorithm. Defaults to False.
+        merge_tolerance (float, optional): see algorithm.run_algorithm. Defaults to None.
+        workers (int, optional): number of worker processes. 1 solves in this process. Defaults to None (# of CPUs).
+
+    Raises:
+        ValueError: A setting has a weight that isn't in WEIGHTS
+
+    Returns:
+        pd.DataFrame: one row per setting with its weights, status, objective value, solve time, each term of the
+        objective under UNIT_WEIGHTS, and whether the setting is on the Pareto front of those terms
+    """
+    for weights in grid:
+        check_weights(weights)
+    solver = solvers.resolve_solver(solver)
+    workers = min(workers or os.cpu_count() or 1, max(len(grid), 1))
+    print(f"Sweeping {len(grid)} weight settings on {workers} workers...")
+
+    if workers > 1:
+        blocks, specs = _share(inputs)
+        try:
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                     initargs=(specs, horizon_weeks, solver, solver_options, relax, merge_tolerance)) as executor:
+                results = list(executor.map(_solve_weights, grid))
+        finally:
+            for block in blocks:
+                block.close()
+                block.unlink()
+    else:
+        _init_worker(inputs, horizon_weeks, solver, solver_options, relax, merge_tolerance, quiet=False)
+        results = list(map(_solve_weights, grid))
+
+    terms = ["3.1", "3.2", "3.3", "3.4", "3.5", "3.6"]
+    table = pd.DataFrame(data=[algorithm.objective_weights(weights) for weights in grid], columns=list(WEIGHTS))
+    table["status"] = [status for status, _, _, _ in results]
+    table["objective"] = [objective for _, objective, _, _ in results]
+    table["time"] = [elapsed for _, _, elapsed, _ in results]
+    for term in terms:
+        table[term] = [breakdown.get(term, np.nan) for _, _, _, breakdown in results]
+    table["pareto"] = pareto_front(table[terms].to_numpy(dtype=float))
+    return table
+
+if __name__ == '__main__':
+    import json
+    import config_read
+    import utils
+
+    if len(sys.argv) != 2:
+        raise SystemExit("Usage: python sweep.py <grid.json>, where grid.json maps weight names to lists of values to try")
+    with open(sys.argv[1]) as f:
+        grid = weight_grid(**json.load(f))
+
+    config = config_read.read_config("config.json")
+    prefix = f"{config['class']}-{config['semester']}/"
+
+    # Sweep on the inputs of the latest saved state
+    latest_week = utils.get_latest_week(config["project_id"], config["bucket_name"], prefix)
+    if latest_week == -1:
+        raise RuntimeError("No saved state to sweep on.")
+    last_state = utils.deserialize(config["project_id"], config["bucket_name"], latest_week, config["weeks_skipped"], prefix)
+
+    results = run_sweep(last_state.get_algo_inputs(), grid, config["horizon_weeks"], config["solver"], config["solver_options"],
+                        config["presolve_relax"], config["engine_options"].get("merge_tolerance"))
+    print(results.to_string(index=False))
@@ -0,0 +1,45 @@
+import json
+import os
+import sys
+import numpy as np
+import pytest
+
+# The modules live at the root of the repository
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import algorithm
+import benchmark
+import heuristics
+import problem_cache
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    """Runs a test in a scratch directory, where engines save assignments.npy and metrics.json, with the on-disk
+    problem cache off."""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(problem_cache, "CACHE_DIR", None)
+    return tmp_path
+
+@pytest.fixture
+def small_inputs():
+    """Small synthetic inputs (see benchmark.synthetic_inputs) with enough available staff for every slot."""
+    return benchmark.synthetic_inputs(staff=12, weeks=2, past_weeks=2, density=0.8)
+
+@pytest.fixture
+def failing_repair(monkeypatch):
+    """Makes heuristics.repair report every schedule infeasible."""
+    monkeypatch.setattr(heuristics, "repair", lambda data, values: (np.rint(values), False))
+
+@pytest.fixture
+def run_milp(workdir):
+    """
+    Returns:
+        function: runs algorithm.run_algorithm to optimality on the given inputs and keyword arguments in workdir,
+        and returns the run's metrics
+    """
+    def run(inputs, **kwargs):
+        algorithm.run_algorithm(inputs, solver_options={"gap": 0}, **kwargs)
+        with open(algorithm.METRICS_PATH) as f:
+            return json.load(f)
+    return run
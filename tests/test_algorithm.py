@@ -0,0 +1,147 @@
+import cvxpy as cp
+import numpy as np
+import pytest
+import algorithm
+import benchmark
+import grid
+import solvers
+
+
+def window_matrix(size, n, time_grid=grid.DEFAULT_GRID):
+    """
+    Returns:
+        np.ndarray: (# of windows, n * S) 0/1 matrix of every size consecutive slots within a day of every week
+    """
+    days, day_slots = time_grid.shape
+    rows = []
+    for week in range(n):
+        for day in range(days):
+            for start in range(day_slots - size + 1):
+                row = np.zeros(n * time_grid.size)
+                first = week * time_grid.size + day * day_slots + start
+                row[first:first + size] = 1
+                rows.append(row)
+    return np.array(rows).reshape(-1, n * time_grid.size)
+
+def reference_objective(inputs, time_grid=grid.DEFAULT_GRID):
+    """Solves the original dense formulation: one variable per (staff, week, slot) and every term written out
+    with cp.abs and cp.pos, as algorithm.py had it before it was vectorized, pruned and given explicit slacks. It
+    has the later changes to the model itself: 2.2 is enforced, 3.6 is in the objective and unavailable slots
+    can't be assigned (2.6) instead of costing 1e8.
+
+    Returns:
+        float: optimal objective value
+    """
+    demand, previous, availabilities, max_contig, total_targets, weekly_targets, preferred, changed, non_day_ones = inputs
+    n, S = demand.shape[0], time_grid.size
+    m = availabilities.shape[0]
+    m_day_ones, p = m - non_day_ones.size, previous.shape[1]
+    demand = demand.reshape(n * S).astype(float)
+    ratings = availabilities.reshape(m, S)
+    previous = previous.reshape(m_day_ones, p, S)
+
+    A = cp.Variable((m, n * S), boolean=True)
+    allowed = (demand[None, :] > 0) & (np.tile(ratings, n) < algorithm.UNAVAILABLE_RATING)
+    X_slot = cp.sum(A, axis=0)
+    X_week = A @ np.kron(np.eye(n), np.ones((S, 1)))
+    supply = allowed.sum(axis=0)
+    nonzero = np.flatnonzero(demand != 0)
+    assert (np.maximum(demand - 3, 1)[nonzero] <= supply[nonzero]).all(), "the reference has no relaxation of 2.1/2.3"
+
+    constraints = [A <= allowed.astype(float),                      # 2.5, 2.6
+                   X_slot[nonzero] >= 1,                            # 2.1
+                   demand[nonzero] - X_slot[nonzero] <= 3,          # 2.3
+                   X_week - weekly_targets[:, None] <= 1]           # 2.4
+    term_3_6 = 0
+    for staff in range(m):
+        if max_contig[staff] + 1 <= time_grid.slots_per_day:       # 2.2
+            constraints.append(window_matrix(max_contig[staff] + 1, n, time_grid) @ A[staff] <= max_contig[staff])
+        if preferred[staff] + 1 <= time_grid.slots_per_day:
+            term_3_6 += cp.sum(cp.pos(window_matrix(preferred[staff] + 1, n, time_grid) @ A[staff] - preferred[staff]))
+
+    displeasure = np.vectorize(lambda rating: algorithm.RATE_TO_DISPLEASURE_MAPPING.get(rating, 0))(np.tile(ratings, n))
+    current = A[:m_day_ones, :S]
+    term_3_5 = 0
+    for week in range(p):
+        weights = np.maximum(algorithm.lambda_func(p - week) * (1 - changed), 0)
+        term_3_5 += cp.sum(weights @ cp.pos(previous[:, week] - current))
+    for week in range(1, n):
+        term_3_5 += algorithm.lambda_func(week + 1) * cp.sum(cp.pos(current - A[:m_day_ones, week * S:(week + 1) * S]))
+
+    objective = algorithm.U_3_1 * cp.sum(cp.abs(X_week - weekly_targets[:, None])) + \
+                algorithm.U_3_2 * cp.sum(cp.pos(cp.sum(A, axis=1) - total_targets)) + \
+                algorithm.U_3_3 * cp.sum(cp.abs(demand[nonzero] - X_slot[nonzero])) + \
+                algorithm.U_3_4 * cp.sum(cp.multiply(displeasure, A)) + \
+                algorithm.U_3_5 * term_3_5 + \
+                algorithm.U_3_6 * term_3_6
+    prob = cp.Problem(cp.Minimize(objective), constraints)
+    solvers.solve(prob, solvers.resolve_solver(), {"gap": 0})
+    assert prob.status == cp.OPTIMAL
+    return prob.value
+
+
+@pytest.mark.parametrize("seed", [0, 1])
+@pytest.mark.parametrize("past_weeks", [0, 2])
+def test_milp_matches_reference_formulation(run_milp, seed, past_weeks):
+    inputs = benchmark.synthetic_inputs(staff=10, weeks=2, past_weeks=past_weeks, density=0.8, seed=seed)
+    metrics = run_milp(inputs)
+    assert metrics["status"] == cp.OPTIMAL
+    assert metrics["objective"] == pytest.approx(reference_objective(inputs), rel=1e-6)
+
+def test_milp_matches_reference_on_another_grid(run_milp):
+    time_grid = grid.TimeGrid(days=3, start="10:00 AM", slot_minutes=30, slots_per_day=8)
+    inputs = benchmark.synthetic_inputs(staff=10, weeks=2, past_weeks=1, density=0.8, time_grid=time_grid)
+    assert inputs[0].shape[1:] == time_grid.shape
+    metrics = run_milp(inputs)
+    assert metrics["status"] == cp.OPTIMAL
+    assert metrics["objective"] == pytest.approx(reference_objective(inputs, time_grid), rel=1e-6)
+
+def test_template_is_linear(small_inputs):
+    # Every absolute value and max(x, 0) of the objective is modeled with explicit slack variables
+    template = algorithm.ScheduleTemplate(algorithm.AlgoData(small_inputs))
+    assert template.prob.objective.expr.is_affine()
+    assert all(constraint.expr.is_affine() for constraint in template.prob.constraints)
+
+def test_cells_are_the_assignable_slots(small_inputs):
+    data = algorithm.AlgoData(small_inputs)
+    demand = data.demand.reshape(data.n, data.slots)
+    assignable = (demand[None] > 0) & (data.staff_availabilities[:, None] < algorithm.UNAVAILABLE_RATING)
+    assert np.array_equal(data.cells, np.flatnonzero(assignable))
+    assert algorithm.ScheduleTemplate(data).A.size == data.cells.size
+
+@pytest.mark.skipif(len(solvers.installed_solvers()) < 2, reason="needs two MILP solvers")
+def test_templates_are_kept_per_solver(small_inputs, monkeypatch):
+    monkeypatch.setattr(algorithm, "_template_cache", type(algorithm._template_cache)())
+    data = algorithm.AlgoData(small_inputs)
+    first, second = solvers.installed_solvers()[:2]
+    template = algorithm.get_template(data)
+    assert algorithm.get_template(data, first) is template
+    assert algorithm.get_template(data, second) is not template
+
+def test_slot_minimums_are_required_staff(small_inputs):
+    # Slot 0 of the upcoming week needs more staff than are available for it
+    small_inputs[0] = small_inputs[0].copy()
+    small_inputs[0].reshape(small_inputs[0].shape[0], -1)[0, 0] = 100
+    data = algorithm.AlgoData(small_inputs, relax=True)
+    template = algorithm.ScheduleTemplate(data)
+    assert np.array_equal(template.min_staff.value, data.required_staff()[template.nonzero_slots])
+    assert data.understaffed_slots().tolist() == [0]
+    assert data.required_staff()[0] == data.supply[0]
+
+def test_understaffed_slots_are_only_relaxed_with_relax(workdir, small_inputs):
+    small_inputs[0] = small_inputs[0].copy()
+    small_inputs[0].reshape(small_inputs[0].shape[0], -1)[0, 0] = 100
+    with pytest.raises(ValueError, match="presolve_relax"):
+        algorithm.run_algorithm(small_inputs)
+    algorithm.run_algorithm(small_inputs, relax=True)
+
+def test_past_consistency_is_linear_in_the_assignments(small_inputs):
+    data = algorithm.AlgoData(small_inputs)
+    values = (np.random.default_rng(0).random(data.cells.size) < 0.5).astype(float)
+    current = data.to_dense(values).reshape(data.m, data.n, data.slots)[:data.m_day_ones, 0]
+    previous = np.asarray(small_inputs[1], dtype=float).reshape(data.m_day_ones, data.p, data.slots)
+    changed = np.asarray(small_inputs[7], dtype=float)
+    expected = sum(np.maximum(algorithm.lambda_func(data.p - week) * (1 - changed), 0) @ np.maximum(previous[:, week] - current, 0)
+                   for week in range(data.p))
+    cell_weights, constant = data.past_coefficients()
+    assert constant - cell_weights @ values == pytest.approx(algorithm.U_3_5 * expected.sum())
@@ -0,0 +1,35 @@
+import json
+import os
+import time
+import pytest
+
+# batch imports runner, which needs the Google client libraries
+pytest.importorskip("google.cloud.storage")
+import batch
+
+
+def test_read_course_configs(tmp_path):
+    with pytest.raises(ValueError):
+        batch.read_course_configs(str(tmp_path))
+    for course in ("cs61a", "cs61b"):
+        (tmp_path / f"{course}.json").write_text("{}")
+    (tmp_path / "notes.txt").write_text("")
+    assert batch.read_course_configs(str(tmp_path)) == {course: str(tmp_path / f"{course}.json") for course in ("cs61a", "cs61b")}
+
+def test_budgeted_config_keeps_course_time_limit():
+    config = {"solver_options": {"gap": 0.01}}
+    budgeted, budget = batch.budgeted_config(config, 60)
+    assert budgeted["solver_options"] == {"gap": 0.01, "time_limit": 60} and budget == 60
+    assert config["solver_options"] == {"gap": 0.01}
+    assert batch.budgeted_config({"solver_options": {"time_limit": 10}}, 60)[1] == 10
+
+def test_read_metrics_ignores_earlier_runs(tmp_path):
+    assert batch.read_metrics(str(tmp_path), 0) == {}
+    (tmp_path / "metrics.json").write_text(json.dumps({"status": "optimal"}))
+    assert batch.read_metrics(str(tmp_path), 0) == {"status": "optimal"}
+    past = time.time() - 100
+    os.utime(tmp_path / "metrics.json", (past, past))
+    assert batch.read_metrics(str(tmp_path), time.time()) == {}
+
+def test_error_summary():
+    assert batch.error_summary(ValueError("bad config\nmore detail")) == "ValueError: bad config"
@@ -0,0 +1,40 @@
+import json
+import pandas as pd
+import benchmark
+
+
+def results(**measures):
+    row = {"scenario": "tiny", "engine": "milp", "status": "optimal", "objective": 100.0, "time": 1.0, "peak_memory_mb": 150.0}
+    return pd.DataFrame([{**row, **measures}])
+
+
+BASELINES = {benchmark.CALIBRATION_KEY: 0.1,
+             "tiny/milp": {"status": "optimal", "objective": 100.0, "time": 1.0, "peak_memory_mb": 150.0}}
+
+
+def test_matching_run_has_no_regression():
+    assert benchmark.compare_baselines(results(), BASELINES, 0.1)["regression"][0] == ""
+
+def test_run_without_baseline():
+    assert benchmark.compare_baselines(results(engine="flow"), BASELINES)["regression"][0] is None
+
+def test_objective_and_status_must_match():
+    # A better objective is flagged too: the baseline is out of date
+    assert "objective" in benchmark.compare_baselines(results(objective=99.0), BASELINES)["regression"][0]
+    assert benchmark.compare_baselines(results(objective=100.0 + 1e-9), BASELINES)["regression"][0] == ""
+    assert "status" in benchmark.compare_baselines(results(status="feasible"), BASELINES)["regression"][0]
+
+def test_times_are_scaled_by_calibration():
+    slow = results(time=4.0)
+    assert "time" in benchmark.compare_baselines(slow, BASELINES, 0.1)["regression"][0]
+    # The same run on a machine that takes three times as long to calibrate
+    assert benchmark.compare_baselines(slow, BASELINES, 0.3)["regression"][0] == ""
+
+def test_saving_scales_kept_baselines(tmp_path):
+    path = tmp_path / "baselines.json"
+    path.write_text(json.dumps(BASELINES))
+    benchmark.save_baselines(results(engine="flow", time=0.5), 0.2, path)
+    baselines = benchmark.load_baselines(path)
+    assert baselines[benchmark.CALIBRATION_KEY] == 0.2
+    assert baselines["tiny/milp"]["time"] == 2.0
+    assert baselines["tiny/flow"] == {"status": "optimal", "objective": 100.0, "time": 0.5, "peak_memory_mb": 150.0}
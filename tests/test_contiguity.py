@@ -0,0 +1,32 @@
+import numpy as np
+import pytest
+import algorithm
+import heuristics
+
+
+def longest_blocks(assignments):
+    """
+    Returns:
+        np.ndarray: (# of staff, ) longest run of consecutive assigned slots within a day of any week
+    """
+    runs = np.zeros(assignments.shape[:-1], dtype=int)
+    longest = np.zeros(assignments.shape[:-1], dtype=int)
+    for slot in range(assignments.shape[-1]):
+        runs = np.where(assignments[..., slot] > 0, runs + 1, 0)
+        longest = np.maximum(longest, runs)
+    return longest.reshape(assignments.shape[0], -1).max(axis=1)
+
+def test_blocks_are_at_most_max_contig(run_milp, small_inputs):
+    run_milp(small_inputs)
+    assert longest_blocks(np.load("assignments.npy")).max() > 1
+    small_inputs[3] = np.ones(small_inputs[3].shape, dtype=int)
+    run_milp(small_inputs)
+    assert (longest_blocks(np.load("assignments.npy")) <= 1).all()
+
+def test_preferred_block_term_matches_solver(run_milp, small_inputs):
+    # 3.6 prices every block longer than the preferred length
+    small_inputs[6] = np.ones(small_inputs[6].shape, dtype=int)
+    metrics = run_milp(small_inputs)
+    data = algorithm.AlgoData(small_inputs)
+    values = np.load("assignments.npy").reshape(data.m, -1).ravel()[data.cells]
+    assert heuristics.objective_terms(data, values)["3.6"] == pytest.approx(metrics["terms"]["3.6"])
@@ -0,0 +1,54 @@
+import json
+from time import perf_counter
+import numpy as np
+import algorithm
+import benchmark
+import engines
+import heuristics
+import solvers
+
+
+def engine_config(engine, deadline, **engine_options):
+    """
+    Returns:
+        dict: the engine keys of config_read.read_config
+    """
+    return {"horizon_weeks": 0, "solver": "auto", "solver_options": {}, "engine": engine, "engine_options": engine_options,
+            "presolve_relax": False, "deadline": deadline, "fallback_engines": ["milp"]}
+
+def read_metrics():
+    with open(algorithm.METRICS_PATH) as f:
+        return json.load(f)
+
+
+def test_time_limit_is_cut_to_the_time_left():
+    solver = solvers.resolve_solver()
+    name = solvers.SOLVER_OPTIONS[solver]["time_limit"]
+    def time_limit(solver_options):
+        kwargs = solvers.solve_kwargs(solver, solver_options)
+        return kwargs[name[0]][name[1]] if isinstance(name, tuple) else kwargs[name]
+
+    scale = solvers.TIME_LIMIT_SCALE.get(solver, 1)
+    assert time_limit({"time_limit": 100, "deadline": perf_counter() + 10}) <= 10 * scale
+    assert time_limit({"time_limit": 5, "deadline": perf_counter() + 10}) == 5 * scale
+    assert time_limit({"deadline": perf_counter() - 10}) == solvers.MIN_TIME_LIMIT * scale
+
+def test_decomposition_stops_at_the_deadline(workdir):
+    # Far more iterations than fit in the deadline, and a gap that is never reached
+    inputs = benchmark.synthetic_inputs(staff=12, weeks=4, past_weeks=1, density=0.8)
+    config = engine_config("decomposition", 3, iterations=10 ** 6, workers=1)
+    config["solver_options"] = {"gap": 0}
+    engines.run_engine(inputs, config)
+    metrics = read_metrics()
+    assert metrics["engine"] == "decomposition"
+    assert metrics["iterations"] > 1
+    # The deadline can be overrun by a solve started just before it
+    assert metrics["deadline"]["elapsed"] < 3 + solvers.MIN_TIME_LIMIT + 1
+
+def test_deadline_falls_back_when_repair_fails(workdir, small_inputs, monkeypatch):
+    monkeypatch.setattr(heuristics, "repair", lambda data, values: (np.rint(values), False))
+    engines.run_engine(small_inputs, engine_config("flow", 60))
+    metrics = read_metrics()
+    assert metrics["engine"] == "milp"
+    assert [attempt["engine"] for attempt in metrics["deadline"]["attempts"]] == ["flow", "milp"]
+    assert metrics["deadline"]["attempts"][0]["error"]
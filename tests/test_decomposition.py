@@ -0,0 +1,31 @@
+import json
+import numpy as np
+import pytest
+import algorithm
+import decomposition
+import heuristics
+
+
+def read_metrics():
+    with open(algorithm.METRICS_PATH) as f:
+        return json.load(f)
+
+
+def test_bound_and_schedule_bracket_the_optimum(run_milp, small_inputs):
+    optimum = run_milp(small_inputs)["objective"]
+    decomposition.run_decomposition(small_inputs, solver_options={"gap": 0}, iterations=20, workers=1)
+    metrics = read_metrics()
+    assert metrics["status"] == "feasible"
+    assert metrics["lower_bound"] <= optimum * (1 + 1e-6) <= metrics["objective"] * (1 + 2e-6)
+
+@pytest.mark.filterwarnings("error::RuntimeWarning")
+def test_decomposition_has_no_gap_before_a_schedule(workdir, small_inputs, monkeypatch):
+    # The first iterations find no schedule, so there is no gap to report yet
+    repair, calls = heuristics.repair, []
+    def late_repair(data, values):
+        calls.append(None)
+        repaired, feasible = repair(data, values)
+        return repaired, feasible and len(calls) > 2
+    monkeypatch.setattr(heuristics, "repair", late_repair)
+    decomposition.run_decomposition(small_inputs, solver_options={"gap": 0}, iterations=4, workers=1)
+    assert read_metrics()["gap"] is not None
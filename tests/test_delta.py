@@ -0,0 +1,54 @@
+import json
+from types import SimpleNamespace
+import numpy as np
+import pytest
+import algorithm
+import delta
+
+
+def fake_state(inputs, week_num=0):
+    """
+    Returns:
+        SimpleNamespace: the parts of a State.State that delta.py reads, for the staff of the algorithm inputs
+    """
+    emails = [f"staff{i}@berkeley.edu" for i in range(inputs[2].shape[0])]
+    staff = {email: SimpleNamespace(availabilities=inputs[2][i], weekly_oh_hours=inputs[5][i],
+                                    preferred_contiguous_hours=inputs[6][i]) for i, email in enumerate(emails)}
+    return SimpleNamespace(week_num=week_num, course_staff_dict=staff, bi_mappings={email: i for i, email in enumerate(emails)},
+                           oh_demand=inputs[0], get_algo_inputs=lambda: inputs)
+
+def changed_inputs(inputs, staff):
+    """
+    Returns:
+        list: copy of inputs where staff can't make their first available slot
+    """
+    inputs = list(inputs)
+    inputs[2] = inputs[2].copy()
+    ratings = inputs[2][staff].reshape(-1)
+    ratings[np.flatnonzero(ratings < 5)[0]] = 5
+    return inputs
+
+
+def test_diff_finds_changed_staff(small_inputs):
+    previous, current = fake_state(small_inputs), fake_state(changed_inputs(small_inputs, 3))
+    changes = delta.diff_states(previous, current)
+    assert changes["availabilities"] == ["staff3@berkeley.edu"]
+    assert not changes["demand"]
+    assert delta.affected_staff(changes, current).tolist() == [3]
+
+    demand_changed = list(small_inputs)
+    demand_changed[0] = small_inputs[0] + 1
+    assert delta.affected_staff(delta.diff_states(previous, fake_state(demand_changed)), current).size == small_inputs[2].shape[0]
+    with pytest.raises(ValueError):
+        delta.diff_states(previous, fake_state(small_inputs, week_num=1))
+
+def test_only_changed_staff_are_rescheduled(run_milp, small_inputs):
+    run_milp(small_inputs)
+    previous_solution = np.load("assignments.npy")
+    # Held fixed, the others may not be able to cover what staff member 3 leaves
+    delta.run_delta(fake_state(small_inputs), fake_state(changed_inputs(small_inputs, 3)), previous_solution, relax=True)
+    with open(algorithm.METRICS_PATH) as f:
+        assert json.load(f)["resolved_staff"] == 1
+    assignments = np.load("assignments.npy")
+    others = np.arange(small_inputs[2].shape[0]) != 3
+    assert np.array_equal(assignments[others], previous_solution[others])
@@ -0,0 +1,31 @@
+import json
+import numpy as np
+import pytest
+import algorithm
+import flow
+
+
+def read_metrics():
+    with open(algorithm.METRICS_PATH) as f:
+        return json.load(f)
+
+
+def test_flow_finds_feasible_schedule(workdir, small_inputs):
+    assignments = flow.run_flow(small_inputs)
+    assert assignments.shape == small_inputs[2].shape
+    assert read_metrics()["status"] == "feasible"
+
+def test_flow_raises_when_repair_fails(workdir, small_inputs, failing_repair):
+    with pytest.raises(RuntimeError):
+        flow.run_flow(small_inputs)
+    assert read_metrics()["status"] == "infeasible"
+
+def test_flow_meets_slot_minimums_and_weekly_targets(workdir, small_inputs):
+    # The network's node demands and arc capacities are the hard constraints other than 2.2
+    data = algorithm.AlgoData(small_inputs)
+    incidence, capacity, cost, demand, cell_arcs, constant = flow.build_network(data)
+    flow.run_flow(small_inputs)
+    values = np.load("assignments.npy").reshape(data.m, data.n, data.slots)
+    assert (values.sum(axis=0).ravel() >= data.required_staff()).all()
+    assert (values.sum(axis=2) <= data.target_weekly_hours[:, None] + 1).all()
+    assert (cell_arcs >= 0).all() and np.unique(cell_arcs).size == data.cells.size
@@ -0,0 +1,22 @@
+import numpy as np
+import pytest
+import grid
+
+
+def test_grid_shape_and_names():
+    time_grid = grid.TimeGrid(days=3, start="10:00 AM", slot_minutes=30, slots_per_day=4)
+    assert time_grid.shape == (3, 4)
+    assert time_grid.slots_per_hour == 2
+    assert time_grid.slot_name(5) == "Tuesday 10:30 AM"
+    assert grid.TimeGrid.from_config({"days": 3, "start": "10:00 AM", "slot_minutes": 30, "slots_per_day": 4}) == time_grid
+
+@pytest.mark.parametrize("arguments", [{"days": 8}, {"slot_minutes": 45}, {"start": "8:00 PM", "slots_per_day": 5}])
+def test_invalid_grids(arguments):
+    with pytest.raises(ValueError):
+        grid.TimeGrid(**arguments)
+
+def test_regrid_to_half_hours():
+    hourly = grid.TimeGrid(days=2, start="9:00 AM", slots_per_day=2)
+    half_hourly = grid.TimeGrid(days=3, start="8:30 AM", slot_minutes=30, slots_per_day=4)
+    values = np.array([[1, 2], [3, 4]])
+    assert grid.regrid(values, hourly, half_hourly, fill=-1).tolist() == [[-1, 1, 1, 2], [-1, 3, 3, 4], [-1, -1, -1, -1]]
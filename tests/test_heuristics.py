@@ -0,0 +1,23 @@
+import numpy as np
+import pytest
+import algorithm
+import heuristics
+
+
+def test_objective_terms_match_solver(run_milp, small_inputs):
+    metrics = run_milp(small_inputs)
+    data = algorithm.AlgoData(small_inputs)
+    values = np.load("assignments.npy").reshape(data.m, -1)
+    terms = heuristics.objective_terms(data, values.ravel()[data.cells])
+    for term, value in metrics["terms"].items():
+        assert terms[term] == pytest.approx(value, rel=1e-6, abs=1e-6), term
+    assert heuristics.objective_value(data, values.ravel()[data.cells]) == pytest.approx(metrics["objective"], rel=1e-6)
+
+def test_improve_keeps_schedules_feasible(small_inputs):
+    data = algorithm.AlgoData(small_inputs)
+    values = (np.random.default_rng(0).random(data.cells.size) < 0.3).astype(float)
+    repaired, feasible = heuristics.repair(data, values)
+    assert feasible
+    improved = heuristics.improve(data, repaired)
+    assert heuristics.objective_value(data, improved) <= heuristics.objective_value(data, repaired)
+    assert np.array_equal(heuristics.repair(data, improved)[0], improved)
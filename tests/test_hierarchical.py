@@ -0,0 +1,30 @@
+import json
+import numpy as np
+import pytest
+import algorithm
+import hierarchical
+
+
+def read_metrics():
+    with open(algorithm.METRICS_PATH) as f:
+        return json.load(f)
+
+
+def test_budgets_are_within_weekly_targets(small_inputs):
+    data = algorithm.AlgoData(small_inputs)
+    budgets = hierarchical.budget_hours(data, solver_options={"gap": 0})
+    assert budgets.shape == (data.m, data.n)
+    assert (budgets >= 0).all()
+    assert (budgets <= np.floor(data.target_weekly_hours)[:, None]).all()
+
+def test_hierarchical_finds_feasible_schedule(run_milp, small_inputs):
+    optimum = run_milp(small_inputs)["objective"]
+    hierarchical.run_hierarchical(small_inputs, solver_options={"gap": 0}, workers=1)
+    metrics = read_metrics()
+    assert metrics["status"] == "feasible"
+    assert metrics["objective"] >= optimum * (1 - 1e-6)
+
+def test_hierarchical_raises_when_repair_fails(workdir, small_inputs, failing_repair):
+    with pytest.raises(RuntimeError):
+        hierarchical.run_hierarchical(small_inputs, workers=1)
+    assert read_metrics()["status"] == "infeasible"
@@ -0,0 +1,28 @@
+import numpy as np
+import pytest
+import algorithm
+import benchmark
+import heuristics
+import solvers
+
+
+@pytest.fixture
+def four_weeks():
+    return benchmark.synthetic_inputs(staff=12, weeks=4, past_weeks=1, density=0.8)
+
+
+def test_weeks_past_the_horizon_are_aggregated(four_weeks):
+    data = algorithm.AlgoData(four_weeks, 2)
+    assert (data.n, data.n_tail) == (2, 2)
+    template = algorithm.ScheduleTemplate(data)
+    assert template.H.size == data.m
+    solvers.solve(template.prob, None, {"gap": 0})
+    assert (template.H.value >= -1e-6).all()
+    assert (template.H.value <= data.tail_capacity() + 1e-6).all()
+
+def test_objective_terms_match_solver_with_horizon(run_milp, four_weeks):
+    metrics = run_milp(four_weeks, horizon_weeks=2)
+    assert metrics["scheduled_weeks"] == 2
+    data = algorithm.AlgoData(four_weeks, 2)
+    values = np.load("assignments.npy").reshape(data.m, -1)
+    assert heuristics.objective_value(data, values.ravel()[data.cells]) == pytest.approx(metrics["objective"], rel=1e-6)
@@ -0,0 +1,51 @@
+import numpy as np
+import algorithm
+import benchmark
+import heuristics
+
+
+def test_only_weeks_with_the_same_nonzero_slots_merge():
+    inputs = benchmark.synthetic_inputs(staff=12, weeks=4, past_weeks=1, density=0.8)
+    inputs[0] = inputs[0][[0, 1, 1, 1]].astype(float)
+    # Week 3 differs from week 1 by one slot that only it has demand in
+    empty = np.flatnonzero(inputs[0][1] == 0)[0]
+    inputs[0][3].flat[empty] = 1
+    data = algorithm.AlgoData(inputs, merge_tolerance=0)
+    assert data.week_of.tolist() == [0, 1, 1, 2]
+    assert data.week_multiplicity.tolist() == [1, 2, 1]
+    # The upcoming week is never merged
+    assert algorithm.AlgoData(inputs, merge_tolerance=100).week_of[0] == 0
+
+def test_merged_weeks_are_no_better_than_unmerged(run_milp):
+    # Weeks after the first with the same demand. Merging them forces them to share a schedule, which restricts
+    # the model: scored on the unmerged problem, the merged optimum can't beat the unmerged one.
+    inputs = benchmark.synthetic_inputs(staff=12, weeks=4, past_weeks=1, density=0.8)
+    inputs[0] = inputs[0][[0, 1, 1, 1]]
+    full = run_milp(inputs)["objective"]
+    merged = run_milp(inputs, merge_tolerance=0)
+    assert merged["scheduled_weeks"] == 2
+
+    data = algorithm.AlgoData(inputs)
+    values = np.load("assignments.npy").reshape(data.m, -1).ravel()[data.cells]
+    assert heuristics.objective_value(data, values) >= full - 1e-6 * abs(full)
+    assert heuristics.repair(data, values)[1]
+
+def test_merged_weeks_meet_every_weeks_minimum(run_milp):
+    # Week 3 needs more staff than week 1 in some slots, within the merge tolerance. The shared schedule has to
+    # meet week 3's minimums, not those of the two weeks' average demand.
+    inputs = benchmark.synthetic_inputs(staff=12, weeks=4, past_weeks=1, density=0.8)
+    inputs[0] = inputs[0][[0, 1, 2, 1]].astype(float)
+    busy = np.flatnonzero(inputs[0][1])[:3]
+    inputs[0][1].flat[busy] = 4
+    inputs[0][3].flat[busy] = 6
+    merged = algorithm.AlgoData(inputs, merge_tolerance=2)
+    assert merged.n == 3
+    full = algorithm.AlgoData(inputs)
+    weekly_required = full.required_staff().reshape(full.n, -1)
+    assert np.array_equal(merged.required_staff().reshape(merged.n, -1)[merged.week_of].max(axis=0),
+                          weekly_required.max(axis=0))
+    assert np.array_equal(merged.required_staff().reshape(merged.n, -1)[1], weekly_required[[1, 3]].max(axis=0))
+
+    run_milp(inputs, merge_tolerance=2)
+    X_slot = np.load("assignments.npy").reshape(full.m, -1).sum(axis=0)
+    assert (X_slot >= full.required_staff()).all()
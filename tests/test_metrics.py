@@ -0,0 +1,12 @@
+import pytest
+import solvers
+
+
+def test_milp_run_metrics(run_milp, small_inputs):
+    metrics = run_milp(small_inputs)
+    assert metrics["engine"] == "milp"
+    assert {"solve", "extraction"} <= set(metrics["phase_times"])
+    assert all(seconds >= 0 for seconds in metrics["phase_times"].values())
+    assert metrics["solver_stats"]["solver"] == solvers.resolve_solver()
+    assert set(metrics["solver_stats"]) == {"solver", "compilation_time", "solve_time", "iterations", "gap", "nodes"}
+    assert sum(metrics["terms"].values()) == pytest.approx(metrics["objective"], rel=1e-6)
@@ -0,0 +1,35 @@
+import numpy as np
+import pytest
+import algorithm
+import presolve
+
+
+@pytest.fixture
+def understaffed_inputs(small_inputs):
+    """small_inputs with slot 0 of the upcoming week needing more staff than are available for it."""
+    small_inputs[0] = small_inputs[0].copy()
+    small_inputs[0].reshape(small_inputs[0].shape[0], -1)[0, 0] = 100
+    return small_inputs
+
+
+def test_clean_inputs_have_no_errors(small_inputs):
+    issues = presolve.presolve(small_inputs)
+    assert (issues["severity"] != "error").all()
+
+def test_understaffed_slot_is_an_error(understaffed_inputs):
+    with pytest.raises(ValueError, match="slot supply"):
+        presolve.presolve(understaffed_inputs)
+
+def test_relax_reports_understaffed_slot_as_warning(understaffed_inputs):
+    issues = presolve.presolve(understaffed_inputs, relax=True)
+    slot_supply = issues[issues["check"] == "slot supply"]
+    assert slot_supply["severity"].tolist() == ["warning"]
+    assert slot_supply["week"].tolist() == [0]
+
+def test_unavailable_rating_counts_as_unavailable(small_inputs):
+    # Nobody is available for slot 0, which has demand
+    small_inputs[2] = small_inputs[2].copy()
+    small_inputs[2].reshape(small_inputs[2].shape[0], -1)[:, 0] = algorithm.UNAVAILABLE_RATING
+    small_inputs[0] = np.maximum(small_inputs[0], 1)
+    with pytest.raises(ValueError, match="but only 0 are available"):
+        presolve.presolve(small_inputs)
@@ -0,0 +1,68 @@
+import json
+import os
+import time
+import pytest
+import algorithm
+import problem_cache
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(problem_cache, "CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.setattr(problem_cache, "MAX_CACHE_BYTES", problem_cache.MAX_CACHE_BYTES)
+    return tmp_path / "cache"
+
+
+def test_store_and_load(cache):
+    key = problem_cache.make_key("structure", "HIGHS")
+    assert problem_cache.load("template", key) is None
+    assert problem_cache.store("template", key, {"value": 1})
+    assert problem_cache.load("template", key) == {"value": 1}
+
+def test_keys_differ_by_part():
+    assert problem_cache.make_key("structure", "HIGHS", 1) != problem_cache.make_key("structure", "HIGHS", 2)
+
+def test_evicts_least_recently_used(cache):
+    keys = [problem_cache.make_key(str(i)) for i in range(3)]
+    for i, key in enumerate(keys):
+        problem_cache.store("solution", key, b"x" * 1000)
+        # Order the entries' modification times without sleeping
+        past = time.time() - 100 + i
+        os.utime(os.path.join(cache, f"solution-{key}.pkl"), (past, past))
+    # Reading the oldest entry makes it the most recently used
+    assert problem_cache.load("solution", keys[0]) is not None
+
+    size = os.path.getsize(os.path.join(cache, f"solution-{keys[0]}.pkl"))
+    assert problem_cache.evict(2 * size) == 1
+    assert problem_cache.load("solution", keys[1]) is None
+    assert problem_cache.load("solution", keys[0]) is not None
+    assert problem_cache.load("solution", keys[2]) is not None
+
+def test_unreadable_entry_is_dropped(cache):
+    key = problem_cache.make_key("broken")
+    problem_cache.store("template", key, 1)
+    path = os.path.join(cache, f"template-{key}.pkl")
+    with open(path, "wb") as f:
+        f.write(b"not a pickle")
+    assert problem_cache.load("template", key) is None
+    assert not os.path.exists(path)
+
+def test_cache_keys_depend_on_formulation_version(small_inputs, monkeypatch):
+    data = algorithm.AlgoData(small_inputs)
+    key = data.data_key("HIGHS", {"gap": 0})
+    monkeypatch.setattr(algorithm, "FORMULATION_VERSION", algorithm.FORMULATION_VERSION + 1)
+    assert data.data_key("HIGHS", {"gap": 0}) != key
+
+def test_optimal_schedules_are_reused(cache, small_inputs, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    def run(inputs):
+        algorithm.run_algorithm(inputs, solver_options={"gap": 0})
+        with open(algorithm.METRICS_PATH) as f:
+            return json.load(f)
+
+    first = run(small_inputs)
+    second = run(small_inputs)
+    assert second["cache"] == "solution"
+    assert second["objective"] == first["objective"]
+    small_inputs[5] = small_inputs[5] + 1
+    assert run(small_inputs)["cache"] != "solution"
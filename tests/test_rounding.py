@@ -0,0 +1,24 @@
+import json
+import numpy as np
+import algorithm
+import rounding
+
+
+def test_dependent_round_keeps_weekly_hours(small_inputs):
+    data = algorithm.AlgoData(small_inputs)
+    rng = np.random.default_rng(0)
+    fractional = rng.random(data.cells.size)
+    lp_hours = np.bincount(data.cell_staff * data.n + data.cell_week, weights=fractional, minlength=data.m * data.n)
+    for _ in range(5):
+        values = rounding.dependent_round(data, fractional, rng)
+        assert np.isin(values, [0, 1]).all()
+        hours = np.bincount(data.cell_staff * data.n + data.cell_week, weights=values, minlength=data.m * data.n)
+        assert (hours >= np.floor(lp_hours - 1e-9)).all() and (hours <= np.ceil(lp_hours + 1e-9)).all()
+
+def test_rounding_is_bounded_by_the_lp(run_milp, small_inputs):
+    optimum = run_milp(small_inputs)["objective"]
+    rounding.run_rounding(small_inputs, samples=4, workers=1, seed=0)
+    with open(algorithm.METRICS_PATH) as f:
+        metrics = json.load(f)
+    assert metrics["status"] == "feasible"
+    assert metrics["lower_bound"] <= optimum * (1 + 1e-6) <= metrics["objective"] * (1 + 1e-6)
@@ -0,0 +1,55 @@
+import threading
+from http.server import ThreadingHTTPServer
+from time import sleep
+import pytest
+
+# service imports runner, which needs the Google client libraries
+pytest.importorskip("google.cloud.storage")
+import service
+
+
+@pytest.fixture
+def api(tmp_path):
+    """Runs a one-worker service for a course whose config can't be read, behind the HTTP API on a free port.
+
+    Returns:
+        function: service.request on the service's port
+    """
+    configs = tmp_path / "configs"
+    configs.mkdir()
+    (configs / "cs61a.json").write_text("not json")
+    scheduler = service.SchedulerService(str(configs), str(tmp_path / "output"))
+    server = ThreadingHTTPServer((service.HOST, 0), service._Handler)
+    server.service = scheduler
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield lambda path, body=None: service.request(path, body, port=server.server_address[1])
+    server.shutdown()
+    server.server_close()
+    scheduler.shutdown()
+
+
+def test_api_rejects_unknown_jobs(api):
+    assert api("/courses") == ["cs61a"]
+    for body in ({"course": "cs61b"}, {"course": "cs61a", "type": "rerun"}, {"course": "cs61a", "overrides": {"weeks": 3}}):
+        with pytest.raises(RuntimeError):
+            api("/jobs", body)
+    with pytest.raises(RuntimeError, match="Not found"):
+        api("/jobs/1")
+    assert api("/jobs") == []
+
+def test_failed_job_reports_its_error(api):
+    job = api("/jobs", {"course": "cs61a", "type": "preview", "overrides": {"horizon_weeks": 1}})
+    assert job["status"] == "queued"
+    for _ in range(100):
+        job = api(f"/jobs/{job['id']}")
+        if job["status"] not in ("queued", "running"):
+            break
+        sleep(0.05)
+    assert job["status"] == "failed"
+    assert "JSONDecodeError" in job["error"]
+    assert job["output_dir"].endswith("preview")
+
+def test_parse_override():
+    assert service._parse_override("horizon_weeks=2") == ("horizon_weeks", 2)
+    assert service._parse_override('solver_options={"gap": 0.01}') == ("solver_options", {"gap": 0.01})
+    assert service._parse_override("engine=flow") == ("engine", "flow")
@@ -0,0 +1,35 @@
+import cvxpy as cp
+import numpy as np
+import pytest
+import algorithm
+import solvers
+
+
+@pytest.mark.skipif("HIGHS" not in cp.installed_solvers(), reason="HiGHS isn't installed")
+def test_highs_starts_from_variable_values(small_inputs):
+    data = algorithm.AlgoData(small_inputs)
+    template = algorithm.ScheduleTemplate(data, "HIGHS")
+    solvers.solve(template.prob, "HIGHS", {"gap": 0})
+    objective, values = template.prob.value, np.rint(template.A.value)
+
+    template = algorithm.ScheduleTemplate(data, "HIGHS")
+    assert not solvers.set_highs_start(template.prob)
+    template.A.value = values
+    if template.H is not None:
+        template.H.value = np.minimum(template.tail_target.value, template.tail_capacity.value)
+    assert solvers.set_highs_start(template.prob)
+    start = template.prob._solver_cache["HIGHS"][2]["solution"].col_value
+    assert np.count_nonzero(np.isin(start, [0, 1])) >= values.size
+    solvers.solve(template.prob, "HIGHS", {"gap": 0}, warm_start=True)
+    assert template.prob.value == pytest.approx(objective, rel=1e-6)
+
+def test_options_are_translated_per_solver():
+    assert solvers.solve_kwargs("HIGHS", {"gap": 0.01, "time_limit": 5}) == {"solver": "HIGHS", "mip_rel_gap": 0.01, "time_limit": 5}
+    assert solvers.solve_kwargs("SCIP", {"gap": 0.01, "threads": 2}) == \
+        {"solver": "SCIP", "scip_params": {"limits/gap": 0.01, "parallel/maxnthreads": 2}}
+    assert solvers.solve_kwargs("GLPK_MI", {"time_limit": 5, "threads": 2}) == {"solver": "GLPK_MI", "tm_lim": 5000}
+
+def test_resolve_solver():
+    assert solvers.resolve_solver("auto") == solvers.installed_solvers()[0]
+    with pytest.raises(ValueError):
+        solvers.resolve_solver("NOT_A_SOLVER")
@@ -0,0 +1,29 @@
+import numpy as np
+import pytest
+import algorithm
+import heuristics
+import sweep
+
+
+def test_weight_grid_is_every_combination():
+    grid = sweep.weight_grid(U_3_1=[200, 400], U_3_4=[25, 50])
+    assert len(grid) == 4
+    assert {"U_3_1": 400, "U_3_4": 25} in grid
+    with pytest.raises(ValueError):
+        sweep.weight_grid(U_9=[1])
+
+def test_sweep_leaves_module_weights_alone(workdir, small_inputs, monkeypatch):
+    # A value set by someone else in this process, which the sweep must neither use for its settings' weights nor reset
+    monkeypatch.setattr(algorithm, "U_3_6", 1000)
+    grid = [{"U_3_4": 0}, {"U_3_4": 200, "U_3_6": 25}]
+    results = sweep.run_sweep(small_inputs, grid, solver_options={"gap": 0}, workers=1)
+    assert algorithm.U_3_6 == 1000
+    assert results["U_3_6"].tolist() == [1000, 25]
+    assert (results["status"] == "optimal").all()
+
+    # Without 3.4, the schedule is at least as displeasing as with it weighted up
+    assert results["3.4"][0] >= results["3.4"][1]
+
+def test_pareto_front():
+    terms = np.array([[1, 2], [2, 1], [2, 2], [np.nan, 0]])
+    assert sweep.pareto_front(terms).tolist() == [True, True, False, False]
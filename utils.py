@@ -5,6 +5,7 @@ from google.oauth2 import service_account
 from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
 import collections
+import threading
 import numpy as np
 import pickle
 from bidict import bidict
@@ -13,11 +14,44 @@ import State
 import io
 from google.cloud import storage
 import config_read
+import grid
 
 # Service Account Scopes
 SCOPES = ['https://www.googleapis.com/auth/spreadsheets.readonly',
          'https://www.googleapis.com/auth/calendar']
 
+# Google API clients of the current thread, built on first use and reused after (see sheets_service and
+# storage_client). The Sheets client isn't thread safe, so each thread gets its own.
+_clients = threading.local()
+
+
+def sheets_service():
+    """
+    Returns:
+        googleapiclient.discovery.Resource: Sheets API service of this thread. Building it reads the credentials and
+        fetches the API's discovery document, so it's only built once per thread.
+    """
+    if getattr(_clients, "sheets", None) is None:
+        creds = service_account.Credentials.from_service_account_file(
+            "credentials.json", scopes=SCOPES
+        )
+        _clients.sheets = build('sheets', 'v4', credentials = creds)
+    return _clients.sheets
+
+def storage_client(project_id=None):
+    """
+    Args:
+        project_id (str, optional): id of the google project. Defaults to None (the credentials' project).
+
+    Returns:
+        storage.Client: Cloud Storage client of this thread for the project, built once per thread and project
+    """
+    if not hasattr(_clients, "storage"):
+        _clients.storage = {}
+    if project_id not in _clients.storage:
+        _clients.storage[project_id] = storage.Client(project=project_id)
+    return _clients.storage[project_id]
+
 
 def get_sheet_values(spread_sheet_id, range):
     """ Reads items from a google sheet.
@@ -30,12 +64,7 @@ def get_sheet_values(spread_sheet_id, range):
        list: Returns a list of lists, where each list is a row in the sheet. The first row is the header row.
     """
 
-    # Creating credentials
-    creds = service_account.Credentials.from_service_account_file(
-        "credentials.json", scopes=SCOPES
-    )
-
-    service = build('sheets', 'v4', credentials = creds)
+    service = sheets_service()
 
     # Calling the Sheets API for values (if this errors, that's fine, the Cloud Function will just crash)
     sheet = service.spreadsheets()
@@ -44,15 +73,16 @@ def get_sheet_values(spread_sheet_id, range):
 
     return values
 
-def get_demand(sheet_id, range, total_weeks):
+def get_demand(sheet_id, range, total_weeks, time_grid=grid.DEFAULT_GRID):
     """
     Gets the demand for OH from the spreadsheet, for every week. There should be a row for
-    every single week from 1 -> total weeks (inclusive on both ends). If there isn't, this errors.
+    every single week from 1 -> total weeks (inclusive on both ends), day and slot of the grid. If there isn't, this errors.
 
     Args:
         sheet_id (string): google sheet ID to read from
         range (string): range to read from
         total_weeks (int): total number of weeks in instruction
+        time_grid (grid.TimeGrid, optional): grid of the demand sheet. Defaults to grid.DEFAULT_GRID.
 
     Raises:
         Exception: No OH demand was found for this link/range
@@ -64,10 +94,11 @@ def get_demand(sheet_id, range, total_weeks):
     if values == [[]]:
         raise Exception('No OH demand information found.')
     
-    output = np.full((total_weeks, 5, 12), -1)
-    weekday_mapping = {"Monday": 0, "Tuesday": 1, "Wednesday": 2, "Thursday": 3, "Friday": 4}
-    hours_mapping = {"9:00 AM": 0, "10:00 AM": 1, "11:00 AM": 2, "12:00 PM": 3, "1:00 PM": 4, "2:00 PM": 5, "3:00 PM": 6, "4:00 PM": 7, "5:00 PM": 8, "6:00 PM": 9, "7:00 PM": 10, "8:00 PM": 11}
-    next_hour_validation = {"9:00 AM": "10:00 AM", "10:00 AM": "11:00 AM", "11:00 AM": "12:00 PM", "12:00 PM": "1:00 PM", "1:00 PM": "2:00 PM", "2:00 PM": "3:00 PM", "3:00 PM": "4:00 PM", "4:00 PM": "5:00 PM", "5:00 PM": "6:00 PM", "6:00 PM": "7:00 PM", "7:00 PM": "8:00 PM", "8:00 PM": "9:00 PM"}
+    output = np.full((total_weeks, *time_grid.shape), -1)
+    weekday_mapping = {day: i for i, day in enumerate(time_grid.days)}
+    hours_mapping = {time_grid.time_label(i): i for i in range(time_grid.slots_per_day)}
+    next_hour_validation = {time_grid.time_label(i): time_grid.time_label(i + 1) for i in range(time_grid.slots_per_day)}
+    first_start, last_start, last_end = time_grid.time_label(0), time_grid.time_label(time_grid.slots_per_day - 1), time_grid.time_label(time_grid.slots_per_day)
 
     for row in values:
         if row[0]: # Ensure merged cells (empty cells after merged value) use the correct week
@@ -80,29 +111,28 @@ def get_demand(sheet_id, range, total_weeks):
         
         if row[1]: # Ensure merged cells (empty cells after merged value) use the correct day
             day = row[1]
-            valid_day = re.compile(r"(Monday)||(Tuesday)||(Wednesday)||(Thursday)||(Friday)")
-            if not valid_day.match(day):
-                raise ValueError(f"Error: {day} is not in the correct format (e.g. Monday, Tuesday).")
+            if day not in weekday_mapping:
+                raise ValueError(f"Error: {day} is not in the correct format. Must be one of {', '.join(time_grid.days)}.")
             day_index = weekday_mapping[day]
         
         if not row[2]:
-            raise ValueError(f"Error: {row[2]} doesn't exist. Must be a string for an hour between 9:00 AM and 8:00 PM.")
+            raise ValueError(f"Error: {row[2]} doesn't exist. Must be a string for a time between {first_start} and {last_start}.")
         
         if not row[3]:
-            raise ValueError(f"Error: {row[3]} doesn't exist. Must be a string for an hour between 10:00 AM and 9:00 PM.")
+            raise ValueError(f"Error: {row[3]} doesn't exist. Must be a string for a time between {time_grid.time_label(1)} and {last_end}.")
         
         starting_hour = row[2]
         ending_hour = row[3]
-        valid_hour = re.compile(r"([0-9]+:00 [AP]M)")
+        valid_hour = re.compile(r"([0-9]+:[0-9]{2} [AP]M)")
 
         if not (valid_hour.match(starting_hour) and valid_hour.match(ending_hour)):
-            raise ValueError(f"Error: time inputs for row {row} are wrong. Must be a string for an hour between 9:00 AM and 9:00 PM.")
+            raise ValueError(f"Error: time inputs for row {row} are wrong. Must be a string for a time between {first_start} and {last_end}.")
         
         if starting_hour not in hours_mapping.keys():
-            raise ValueError(f"Error: starting time for row {row} is invalid. Must be 9:00 AM to 8:00 PM.")
+            raise ValueError(f"Error: starting time for row {row} is invalid. Must be the start of a {time_grid.slot_minutes} minute slot from {first_start} to {last_start}.")
         
         if ending_hour != next_hour_validation[starting_hour]:
-            raise ValueError(f"Error: ending time for row {row} is invalid. Must be 1 hour after starting hour.")
+            raise ValueError(f"Error: ending time for row {row} is invalid. Must be {time_grid.slot_minutes} minutes after starting time.")
         
         hour_index = hours_mapping[starting_hour]
 
@@ -116,21 +146,22 @@ def get_demand(sheet_id, range, total_weeks):
             if week_index < 1 or week_index > total_weeks:
                 raise ValueError(f"Error: Week {week_index} is not a valid week. Must be between 1 and total_weeks ({total_weeks}) (inclusive).")
             if output[week_index - 1][day_index][hour_index] != -1:
-                raise ValueError(f"Error: Week {week_index}, {day} {starting_hour} is already filled. Is there a duplicate week/day/hour?")
+                raise ValueError(f"Error: Week {week_index}, {day} {starting_hour} is already filled. Is there a duplicate week/day/time?")
             output[week_index - 1][day_index][hour_index] = int(num_staff)
 
     if np.any(output == -1):
         raise ValueError("Invalid array. Some values were not filled. Ensure that there is an entry in the oh demand spreadsheet has for every week from 1 to total weeks, " + \
-                         "for each day, and for all hours 9:00 AM to 9:00 PM, and that there are no duplicate weeks/days/hours.")
+                         f"for each day, and for all slots {first_start} to {last_end}, and that there are no duplicate weeks/days/times.")
     return output
 
-def get_availabilities(sheet_id, range):
+def get_availabilities(sheet_id, range, time_grid=grid.DEFAULT_GRID):
     """
     Gets a list of lists representing each course staff in the availabilities spreadsheet.
 
     Args:
         sheet_id (string): ID of the google sheet to read from. 
         range (string): google sheets range string to read from
+        time_grid (grid.TimeGrid, optional): grid of the availabilities form. Defaults to grid.DEFAULT_GRID.
         
     Returns:
         values (list): list of lists each representing a row in the sheet.
@@ -148,30 +179,50 @@ def get_availabilities(sheet_id, range):
         row[State.StaffMember.WEEKLY_OH_HOURS_INDEX] = int(row[State.StaffMember.WEEKLY_OH_HOURS_INDEX])
         row[State.StaffMember.PREFERRED_CONTIGUOUS_HOURS_INDEX] = int(row[State.StaffMember.PREFERRED_CONTIGUOUS_HOURS_INDEX])
 
-        for i in State.StaffMember.AVAILABILITIES_INDICES:
+        for i in State.StaffMember.availabilities_indices(time_grid):
             preference = extract_preference(row[i])
             row[i] = preference
     return rows
 
-def create_5x12_np_array(input_list):
+def get_availabilities_range(sheet_name, time_grid=grid.DEFAULT_GRID):
     """
-    This function takes a list of 60 numbers, validates that the list contains exactly 60 elements and
-    each element is a number from 1 to 5. It then creates a 5x12 numpy array from the list.
+    Args:
+        sheet_name (string): name of the sheet with the form responses
+        time_grid (grid.TimeGrid, optional): grid of the availabilities form. Defaults to grid.DEFAULT_GRID.
+
+    Returns:
+        string: google sheets range from the email address column (B) to the column of the last slot,
+        e.g. 'Form Responses 1!B1:BP' for the default grid
+    """
+    # Row index 0 is column B, and column A is column 0
+    column = 1 + State.StaffMember.AVAILABILITIES_START_INDEX + time_grid.size - 1
+    letters = ""
+    while column >= 0:
+        column, remainder = divmod(column, 26)
+        letters = chr(ord("A") + remainder) + letters
+        column -= 1
+    return f"{sheet_name}!B1:{letters}"
+
+def create_grid_np_array(input_list, time_grid=grid.DEFAULT_GRID):
+    """
+    This function takes a list of one number per slot of the grid, validates that the list contains exactly that many
+    elements and each element is a number from 1 to 5. It then creates a (# of days, # of slots per day) numpy array from the list.
 
     Args:
         input_list (list): A list of integers, each of which is a number from 1 to 5.
+        time_grid (grid.TimeGrid, optional): grid the list is laid out on, day by day. Defaults to grid.DEFAULT_GRID.
 
     Returns:
-        array (numpy.ndarray): A 5x12 numpy array created from the input list.
+        array (numpy.ndarray): A (# of days, # of slots per day) numpy array created from the input list.
 
     Raises:
-        ValueError: If the input list does not contain exactly 60 elements.
+        ValueError: If the input list does not contain exactly one element per slot.
         ValueError: If any element in the input list is not an integer between 1 and 5.
     """
 
-    # Check that the length of the list is 60
-    if len(input_list) != 60:
-        raise ValueError('Input list must contain exactly 60 elements.')
+    # Check that the list has one element per slot
+    if len(input_list) != time_grid.size:
+        raise ValueError(f'Input list must contain exactly {time_grid.size} elements.')
 
     # Check that each value is an integer between 1 and 5
     for value in input_list:
@@ -181,8 +232,8 @@ def create_5x12_np_array(input_list):
     # Convert the list into a 1D numpy array
     array = np.array(input_list)
     
-    # Reshape the array into a 5x12 numpy array
-    array = array.reshape((5, 12))
+    # Reshape the array into the shape of the grid
+    array = array.reshape(time_grid.shape)
 
     return array
 
@@ -260,7 +311,7 @@ def deserialize(project_id, bucket_name, week_num, weeks_skipped, prefix=None):
     # Check each file and only deserialize all states below or equal to week_num
     deserialized_objects = [None] * (week_num - weeks_skipped)
 
-    client = storage.Client(project=project_id)
+    client = storage_client(project_id)
     bucket = client.bucket(bucket_name)
 
     target_filename = '{}/{}.pkl'.format(prefix, week_num)
@@ -296,7 +347,7 @@ def get_latest_week(project_id, bucket_name, prefix=None):
     Returns:
         int: The largest week number found.
     """
-    client = storage.Client(project=project_id)
+    client = storage_client(project_id)
     bucket = client.bucket(bucket_name)
     blobs = bucket.list_blobs(prefix=prefix)
     
@@ -405,10 +456,8 @@ def list_blobs_with_prefix(bucket_name, prefix, delimiter=None):
         a/b/
     """
 
-    storage_client = storage.Client()
-
     # Note: Client.list_blobs requires at least package version 1.17.0.
-    blobs = storage_client.list_blobs(bucket_name, prefix=prefix, delimiter=delimiter)
+    blobs = storage_client().list_blobs(bucket_name, prefix=prefix, delimiter=delimiter)
 
     # Note: The call returns a response only when the iterator is consumed.
     print("Blobs:")
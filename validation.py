@@ -1,4 +1,8 @@
 import State
+import solvers
+import engines
+import grid
+import utils
 import re
 from google.cloud import storage
 from google.api_core.exceptions import Forbidden, NotFound
@@ -36,7 +40,7 @@ def validate_config(config):
             raise ValueError(f"Config field {key} is empty")
         
     # Check if google project exists and if we have permission
-    client = storage.Client(project=config["project_id"])
+    client = utils.storage_client(config["project_id"])
     
     # Check if bucket exists and we have permission
     try:
@@ -57,16 +61,55 @@ def validate_config(config):
     
     if config["weeks_skipped"] >= config["weeks"]:
         raise ValueError("Weeks skipped must be less than the total number of weeks")
+
+    if config["horizon_weeks"] < 0:
+        raise ValueError("Horizon weeks must be at least 0")
+
+    solvers.resolve_solver(config["solver"])
+    for option, value in config["solver_options"].items():
+        if option not in ("gap", "threads", "time_limit"):
+            raise ValueError(f"Unknown solver option {option}. Must be gap, threads or time_limit")
+        if value < 0:
+            raise ValueError(f"Solver option {option} must be at least 0")
+
+    if config["engine"] not in engines.ENGINES:
+        raise ValueError(f"Unknown engine {config['engine']}. Must be one of {list(engines.ENGINES)}")
+    for option, value in config["engine_options"].items():
+        allowed = engines.ENGINE_OPTIONS[config["engine"]]
+        if option not in allowed:
+            raise ValueError(f"Unknown option {option} for the {config['engine']} engine. Must be one of {list(allowed)}")
+        if value < allowed[option]:
+            raise ValueError(f"Engine option {option} must be at least {allowed[option]}")
+
+    if not isinstance(config["presolve_relax"], bool):
+        raise ValueError("presolve_relax must be true or false")
+
+    for option in config["grid"]:
+        if option not in ("days", "start", "slot_minutes", "slots_per_day"):
+            raise ValueError(f"Unknown grid option {option}. Must be days, start, slot_minutes or slots_per_day")
+    grid.TimeGrid.from_config(config["grid"])
+
+    if not isinstance(config["cache_dir"], str):
+        raise ValueError("cache_dir must be a directory, or \"\" to turn the cache off")
+    if config["cache_size_mb"] <= 0:
+        raise ValueError("Cache size must be more than 0 MB")
+
+    if config["deadline"] < 0:
+        raise ValueError("Deadline must be at least 0 seconds")
+    for engine in config["fallback_engines"]:
+        if engine not in engines.ENGINES:
+            raise ValueError(f"Unknown fallback engine {engine}. Must be one of {list(engines.ENGINES)}")
     
     # Make sure all keys are in dictionary
     assert set(CONFIG_KEYS) - set(config.keys()) == set(), f"config.json is missing the following keys: {set(CONFIG_KEYS) - set(config.keys())}"
 
     
-def validate_availabilities(sheet):
+def validate_availabilities(sheet, time_grid=grid.DEFAULT_GRID):
     """Validates that the availabilities sheet has all the required fields and that the values are valid
 
     Args:
         sheet (list): output of config_read
+        time_grid (grid.TimeGrid, optional): grid of the availabilities form. Defaults to grid.DEFAULT_GRID.
 
     Returns:
         None
@@ -92,12 +135,12 @@ def validate_availabilities(sheet):
         
         # Check total availabilities
         num_not_available = 0
-        for i in State.StaffMember.AVAILABILITIES_INDICES:
+        for i in State.StaffMember.availabilities_indices(time_grid):
             if row[i] < 1 or row[i] > 5:
                 raise ValueError(f"Invalid availability for email {email}. Must start with a number between 1 and 5")
             if row[i] == 5:
                 num_not_available += 1
 
-        if (5 * 12 - num_not_available) < target_weekly_hours:
+        if (time_grid.size - num_not_available) < target_weekly_hours * time_grid.slots_per_hour:
             raise ValueError(f"Email {email} has less than {target_weekly_hours} available hours")
     
\ No newline at end of file